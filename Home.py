@@ -3,12 +3,12 @@ import streamlit as st
 # Must come first
 st.set_page_config(page_title="Privagator | FHE Demo", layout="centered")
 
-from theme_loader import load_theme
+from theme_loader import asset, load_theme
 load_theme()
 
 # Header section
 
-st.image("https://cdn-icons-png.flaticon.com/512/3064/3064197.png", width=100)
+st.image(asset("logo"), width=100)
 st.title("🔐 Welcome to Privagator")
 st.subheader("Your interactive Fully Homomorphic Encryption (FHE) demo lab")
 
@@ -36,28 +36,28 @@ def goto_demo(feature_key):
         st.rerun()
 
 with col1:
-    st.image("https://cdn-icons-png.flaticon.com/512/3649/3649461.png", width=80)
+    st.image(asset("multiply"), width=80)
     st.markdown("### 🔢 Secure Multiplication")
     st.caption("Run encrypted arithmetic using FHE — your data stays private.")
     if st.button("Try Secure Multiplication"):
         goto_demo("multiply")
 
 with col2:
-    st.image("https://cdn-icons-png.flaticon.com/512/1006/1006555.png", width=80)
+    st.image(asset("add"), width=80)
     st.markdown("### ➕ Encrypted Addition")
     st.caption("Compute sums on encrypted inputs.")
     if st.button("Try Encrypted Addition"):
         goto_demo("add")
 
 with col3:
-    st.image("https://cdn-icons-png.flaticon.com/512/3867/3867605.png", width=80)
+    st.image(asset("compare"), width=80)
     st.markdown("### ⚖️ Private Comparison")
     st.caption("Compare two encrypted numbers without revealing them.")
     if st.button("Try Private Comparison"):
         goto_demo("compare")
 
 with col4:
-    st.image("https://cdn-icons-png.flaticon.com/512/3416/3416076.png", width=80)
+    st.image(asset("aggregate"), width=80)
     st.markdown("### 💰 Aggregate Balances")
     st.caption("Compute total & average of balances privately.")
     if st.button("Try Aggregate Balances"):
@@ -1,16 +1,21 @@
 # app.py
 import streamlit as st
-import requests
 import time
-import json
 
-SERVER_URL = "http://127.0.0.1:8765/compute"
+from fhe_client import FHEClient, FHEClientError
+
+SERVER_URL = "http://127.0.0.1:8765"
 
 st.set_page_config(page_title="🔢 Secure FHE Computation Lab", page_icon="🔐", layout="centered")
 
 st.title("🔢 Secure FHE Computation Demo Lab")
 st.caption("Powered by Zama’s Concrete FHE — Privacy-Preserving Computation in Action")
 
+@st.cache_resource
+def get_client():
+    """One pooled keep-alive client shared by every rerun and session."""
+    return FHEClient(SERVER_URL)
+
 # Sidebar navigation
 operation = st.sidebar.selectbox(
     "🧮 Choose Operation",
@@ -29,23 +34,20 @@ if operation == "Square":
     x = st.number_input("Enter x", value=5, step=1)
 
     if st.button("Run Secure Computation"):
-        payload = {"operation": "square", "x": x}
         try:
             start = time.time()
-            response = requests.post(SERVER_URL, json=payload)
+            result, metrics = get_client().compute_with_metrics("square", [x])
             end = time.time()
-            data = response.json()
-
-            if "error" in data:
-                st.error(f"❌ Error: {data['error']}")
-            else:
-                st.success(f"✅ Result: {data['result']}")
-                st.write("### 📊 Metrics")
-                st.json({
-                    "Computation time (s)": round(end - start, 4),
-                    "Server time (s)": round(data.get("server_time", 0), 4),
-                    "Payload size (KB)": round(len(json.dumps(payload)) / 1024, 3),
-                })
+
+            st.success(f"✅ Result: {result}")
+            st.write("### 📊 Metrics")
+            st.json({
+                "Computation time (s)": round(end - start, 4),
+                "Server time (s)": round(metrics["server"] or 0, 4),
+                "Payload size (KB)": round(metrics["request_bytes"] / 1024, 3),
+            })
+        except FHEClientError as e:
+            st.error(f"❌ Error: {e}")
         except Exception as e:
             st.error(f"Server error: {e}")
 
@@ -56,23 +58,20 @@ elif operation == "Addition":
     y = st.number_input("Enter y", value=4, step=1)
 
     if st.button("Run Secure Computation"):
-        payload = {"operation": "add", "x": x, "y": y}
         try:
             start = time.time()
-            response = requests.post(SERVER_URL, json=payload)
+            result, metrics = get_client().compute_with_metrics("add", [x, y])
             end = time.time()
-            data = response.json()
-
-            if "error" in data:
-                st.error(f"❌ Error: {data['error']}")
-            else:
-                st.success(f"✅ Result: {data['result']}")
-                st.write("### 📊 Metrics")
-                st.json({
-                    "Computation time (s)": round(end - start, 4),
-                    "Server time (s)": round(data.get("server_time", 0), 4),
-                    "Payload size (KB)": round(len(json.dumps(payload)) / 1024, 3),
-                })
+
+            st.success(f"✅ Result: {result}")
+            st.write("### 📊 Metrics")
+            st.json({
+                "Computation time (s)": round(end - start, 4),
+                "Server time (s)": round(metrics["server"] or 0, 4),
+                "Payload size (KB)": round(metrics["request_bytes"] / 1024, 3),
+            })
+        except FHEClientError as e:
+            st.error(f"❌ Error: {e}")
         except Exception as e:
             st.error(f"Server error: {e}")
 
@@ -83,22 +82,19 @@ elif operation == "Comparison":
     y = st.number_input("Enter y", value=4, step=1)
 
     if st.button("Run Secure Computation"):
-        payload = {"operation": "compare", "x": x, "y": y}
         try:
             start = time.time()
-            response = requests.post(SERVER_URL, json=payload)
+            result, metrics = get_client().compute_with_metrics("compare", [x, y])
             end = time.time()
-            data = response.json()
-
-            if "error" in data:
-                st.error(f"❌ Error: {data['error']}")
-            else:
-                st.success(f"✅ Result: {data['result']}")
-                st.write("### 📊 Metrics")
-                st.json({
-                    "Computation time (s)": round(end - start, 4),
-                    "Server time (s)": round(data.get("server_time", 0), 4),
-                    "Payload size (KB)": round(len(json.dumps(payload)) / 1024, 3),
-                })
+
+            st.success(f"✅ Result: {result}")
+            st.write("### 📊 Metrics")
+            st.json({
+                "Computation time (s)": round(end - start, 4),
+                "Server time (s)": round(metrics["server"] or 0, 4),
+                "Payload size (KB)": round(metrics["request_bytes"] / 1024, 3),
+            })
+        except FHEClientError as e:
+            st.error(f"❌ Error: {e}")
         except Exception as e:
             st.error(f"Server error: {e}")
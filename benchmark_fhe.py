@@ -0,0 +1,464 @@
+"""
+Benchmark every FHE operation on every backend.
+
+Covers the ops of `modules.fhe_core.run_circuit` (square, multiply, add,
+compare, aggregate) and of `fhe_utils.run_fhe_operation` (add, subtract,
+multiply), on the Concrete, FHE-simulation ("fhe-sim", the compiled circuit
+evaluated on clear values) and simulated backends, across input bit-widths.
+For each case (and, on Concrete, each compile profile from
+modules/compile_profiles.py) it records compile time, keygen time,
+encrypt/run/decrypt latency distributions, ciphertext sizes and the process's
+peak RSS so far (a running high-water mark, not a per-case figure),
+and writes JSON with environment metadata.
+
+    python benchmark_fhe.py --bits 4 6 --reps 20 --output bench.json
+    python benchmark_fhe.py --compare bench_baseline.json --threshold 0.25
+    python benchmark_fhe.py --backends concrete --profiles low-latency balanced high-accuracy
+    python benchmark_fhe.py --backends concrete --emit-profile profiles/simulated_latency.json
+    python benchmark_fhe.py --sweep-parallelism --sweep-threads 1 2 4 8 --bits 6
+
+`--compare` exits with status 1 when any tracked metric regressed by more
+than the threshold against the baseline file. `--emit-profile` writes the
+measured encrypt/run/decrypt distributions in the format the simulated
+backend's cost model replays (see modules/sim_backend.py).
+
+`--sweep-parallelism` instead times the tensor-shaped circuits (the batched
+ops and the aggregate chunk) under every parallelism mode and thread count
+(see modules/parallelism.py) and prints the speedup over one thread. Each
+point runs in a fresh process because the runtime reads its thread count once.
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+import fhe_utils
+from modules import fhe_core, parallelism
+from modules.circuit_cache import concrete_version
+from modules.circuit_registry import load_concrete
+from modules.compile_profiles import DEFAULT_PROFILE, PROFILES, get_profile
+
+
+CORE_OPS = ("square", "multiply", "add", "compare", "aggregate", "histogram", *fhe_core.RANKING_OPS)
+UTILS_OPS = ("add", "subtract", "multiply")
+BACKENDS = ("concrete", "fhe-sim", "simulated")
+
+# metrics compared against a baseline (lower is better for all of them); the
+# NumPy "simulated" backend runs in microseconds and is too noisy to gate on
+TRACKED = ("compile_s", "keygen_s", "encrypt.p50", "run.p50", "decrypt.p50", "simulate.p50")
+UNGATED_BACKENDS = ("simulated",)
+# a slowdown must also be at least this many seconds to count as a regression
+DEFAULT_MIN_DELTA = 0.002
+TOPK_K = 3
+
+# input bit-widths of the circuits the app serves most (fhe_core's smallest
+# tier, fhe_utils' 0..15 inputset); profiles use the benchmarked width closest to these
+SERVED_BITS = {"fhe_core": fhe_core.TIERS[0], "fhe_utils": 4}
+
+
+# -----------------------------
+# Helpers
+# -----------------------------
+def peak_rss_mb():
+    """Highest RSS of this process since it started (covers every case run so far)."""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def distribution(samples):
+    arr = np.asarray(samples, dtype=float)
+    return {
+        "n": int(arr.size),
+        "mean": float(arr.mean()),
+        "min": float(arr.min()),
+        "p50": float(np.percentile(arr, 50)),
+        "p90": float(np.percentile(arr, 90)),
+        "p99": float(np.percentile(arr, 99)),
+        "max": float(arr.max()),
+    }
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except Exception:
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "concrete": concrete_version(),
+        "git_commit": commit,
+    }
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    out = fn(*args, **kwargs)
+    return out, time.perf_counter() - start
+
+
+# -----------------------------
+# Cases
+# -----------------------------
+def case_spec(suite, op, bits, profile=None, shape=None):
+    """
+    (func, encryption statuses, inputset, sample-input generator) for one case;
+    `shape` makes every argument a tensor of that shape.
+    """
+    profile = profile or get_profile()
+    hi = 2 ** bits - 1
+    rng = np.random.default_rng(bits)
+    if suite == "fhe_core" and op == "aggregate":
+        size = fhe_core.AGG_CHUNK
+        inputset = profile.inputset([(0, hi)], shape=(size,))
+        return None, None, inputset, lambda: (rng.integers(0, hi + 1, size),)
+    if suite == "fhe_core" and op == "histogram":
+        # one chunk_counts call on the default edges; the bucket table fixes the range, not `bits`
+        size = fhe_core.AGG_CHUNK
+        ramp = np.linspace(0, fhe_core.PAD, size).astype(np.int64)
+        inputset = profile.inputset([(0, fhe_core.PAD)], shape=(size,)) + [(ramp,)]
+        return None, None, inputset, lambda: (rng.integers(0, fhe_core.AGG_MAX_BALANCE + 1, size),)
+    if suite == "fhe_core" and op in fhe_core.RANKING_OPS:
+        size = fhe_core.RANK_SIZE
+        func = {"rank_matrix": fhe_core._rank_matrix, "argmax": fhe_core._argmax,
+                "topk": fhe_core._topk_function(TOPK_K)}[op]
+        ramp = np.linspace(0, hi, size).astype(np.int64)
+        inputset = profile.inputset([(0, hi)], (size,)) + [(ramp,), (ramp[::-1].copy(),)]
+        return func, {"x": "encrypted"}, inputset, lambda: (rng.integers(0, hi + 1, size),)
+    if suite == "fhe_core":
+        func, encryption = fhe_core.BATCH_OPS[op]
+    else:
+        entry = fhe_utils.CIRCUITS.entry(op)
+        func, encryption = entry.func, entry.encryption
+    arity = len(encryption)
+    inputset = profile.inputset([(0, hi)] * arity, shape)
+    if shape is not None:
+        return func, encryption, inputset, lambda: tuple(rng.integers(0, hi + 1, shape) for _ in range(arity))
+    return func, encryption, inputset, \
+        lambda: tuple(int(v) for v in rng.integers(0, hi + 1, arity))
+
+
+def compile_case(fhe, suite, op, func, encryption, inputset, configuration=None):
+    if suite == "fhe_core" and op == "aggregate":
+        module = fhe_core._aggregate_module(fhe).compile(
+            {"chunk_total": inputset, "combine": [(0, 0), (1, 1)]}, configuration)
+        return module, "chunk_total"
+    if suite == "fhe_core" and op == "histogram":
+        edges = fhe_core.histogram_edges()
+        none = np.zeros(len(edges) - 1, dtype=np.int64)
+        module = fhe_core._histogram_module(fhe, edges).compile(
+            {"chunk_counts": inputset, "combine": [(none, none), (none + 1, none + 1)]}, configuration)
+        return module, "chunk_counts"
+    return fhe.Compiler(func, encryption).compile(inputset, configuration), None
+
+
+def bench_concrete(suite, op, bits, reps, profile=None):
+    fhe = load_concrete()
+    profile = profile or get_profile()
+    func, encryption, inputset, sample = case_spec(suite, op, bits, profile)
+    (circuit, fn_name), compile_s = timed(compile_case, fhe, suite, op, func, encryption, inputset,
+                                          profile.configuration(fhe))
+    client, server = circuit.client, circuit.server
+    _, keygen_s = timed(client.keys.generate, force=True)
+    kw = {"function_name": fn_name} if fn_name else {}
+
+    enc_t, run_t, dec_t = [], [], []
+    input_bytes = output_bytes = 0
+    for _ in range(reps):
+        args = sample()
+        enc, t = timed(client.encrypt, *args, **kw)
+        enc_t.append(t)
+        enc = enc if isinstance(enc, tuple) else (enc,)
+        out, t = timed(server.run, *enc, evaluation_keys=client.evaluation_keys, **kw)
+        run_t.append(t)
+        # argmax and topk return (indices, values)
+        outs = out if isinstance(out, tuple) else (out,)
+        _, t = timed(client.decrypt, *outs, **kw)
+        dec_t.append(t)
+        input_bytes = sum(len(v.serialize()) for v in enc)
+        output_bytes = sum(len(v.serialize()) for v in outs)
+    return {
+        "compile_s": compile_s,
+        "inputset_size": len(inputset),
+        "keygen_s": keygen_s,
+        "encrypt": distribution(enc_t),
+        "run": distribution(run_t),
+        "decrypt": distribution(dec_t),
+        "input_bytes": input_bytes,
+        "output_bytes": output_bytes,
+        "evaluation_key_bytes": len(client.evaluation_keys.serialize()),
+    }
+
+
+def bench_fhe_sim(suite, op, bits, reps, profile=None):
+    fhe = load_concrete()
+    profile = profile or get_profile()
+    func, encryption, inputset, sample = case_spec(suite, op, bits, profile)
+    configuration = profile.configuration(fhe, fhe_simulation=True, fhe_execution=False)
+    (circuit, fn_name), compile_s = timed(compile_case, fhe, suite, op, func, encryption, inputset, configuration)
+    simulate = getattr(circuit, fn_name).simulate if fn_name else circuit.simulate
+    times = []
+    for _ in range(reps):
+        _, t = timed(simulate, *sample())
+        times.append(t)
+    return {"compile_s": compile_s, "inputset_size": len(inputset), "simulate": distribution(times)}
+
+
+def bench_simulated(suite, op, bits, reps):
+    _, _, _, sample = case_spec(suite, op, bits)
+    if suite == "fhe_core" and op in fhe_core.RANKING_OPS:
+        run = lambda args: fhe_core._simulate_ranking(op, args[0], TOPK_K)
+    elif suite == "fhe_core" and op == "histogram":
+        edges = fhe_core.histogram_edges()
+        run = lambda args: fhe_core._histogram(args[0], edges)
+    elif suite == "fhe_core":
+        run = lambda args: fhe_core._simulate(op, list(np.ravel(args)) if op == "aggregate" else args)
+    else:
+        func = fhe_utils.CIRCUITS.entry(op).func
+        run = lambda args: func(*args)
+    times = []
+    for _ in range(reps):
+        args = sample()
+        _, t = timed(run, args)
+        times.append(t)
+    return {"simulate": distribution(times)}
+
+
+def run_suite(args):
+    results = []
+    cases = [("fhe_core", op) for op in args.core_ops] + [("fhe_utils", op) for op in args.utils_ops]
+    for backend in args.backends:
+        if backend in ("concrete", "fhe-sim") and load_concrete() is None:
+            print(f"⚠️  concrete-python not available — skipping the {backend} backend")
+            continue
+        # compile profiles only matter when something is compiled
+        profiles = args.profiles if backend in ("concrete", "fhe-sim") else [None]
+        for suite, op in cases:
+            for bits in args.bits:
+                for profile in profiles:
+                    label = f"{suite}.{op} [{backend}, {bits}-bit" + (f", {profile}]" if profile else "]")
+                    case = {"suite": suite, "op": op, "backend": backend, "bits": bits, "profile": profile}
+                    try:
+                        if backend == "concrete":
+                            metrics = bench_concrete(suite, op, bits, args.reps, get_profile(profile))
+                        elif backend == "fhe-sim":
+                            metrics = bench_fhe_sim(suite, op, bits, args.reps, get_profile(profile))
+                        else:
+                            metrics = bench_simulated(suite, op, bits, args.reps)
+                    except Exception as e:
+                        print(f"❌ {label}: {e}")
+                        results.append({**case, "error": str(e)})
+                        continue
+                    metrics.update(case, process_peak_rss_mb=peak_rss_mb())
+                    results.append(metrics)
+                    headline = metrics.get("run", metrics.get("simulate"))["p50"]
+                    compiled = f", compile {metrics['compile_s']:.2f} s" if "compile_s" in metrics else ""
+                    print(f"✅ {label}: p50 {headline * 1000:.3f} ms{compiled}")
+    return results
+
+
+# -----------------------------
+# Parallelism sweep
+# -----------------------------
+SWEEP_OPS = (*fhe_core.BATCH_OPS, "aggregate")
+
+
+def sweep_point(op, bits, mode, reps, profile=None):
+    """Compile the tensor-shaped `op` with parallelism `mode` and time its runs (in this process)."""
+    fhe = load_concrete()
+    profile = get_profile(profile)
+    shape = None if op == "aggregate" else (fhe_core.BATCH_SIZE,)
+    func, encryption, inputset, sample = case_spec("fhe_core", op, bits, profile, shape)
+    (circuit, fn_name), compile_s = timed(compile_case, fhe, "fhe_core", op, func, encryption, inputset,
+                                          profile.configuration(fhe, **parallelism.options(mode)))
+    circuit.client.keys.generate()
+    kw = {"function_name": fn_name} if fn_name else {}
+    enc = circuit.client.encrypt(*sample(), **kw)
+    enc = enc if isinstance(enc, tuple) else (enc,)
+    run_t = []
+    for _ in range(reps):
+        _, t = timed(circuit.server.run, *enc, evaluation_keys=circuit.client.evaluation_keys, **kw)
+        run_t.append(t)
+    return {"compile_s": compile_s, "run": distribution(run_t)}
+
+
+def run_sweep(args):
+    if load_concrete() is None:
+        print("⚠️  concrete-python not available — the parallelism sweep needs the concrete backend")
+        return []
+    results = []
+    ops = [op for op in args.core_ops if op in SWEEP_OPS]
+    for op in ops:
+        for bits in args.bits:
+            for mode in args.sweep_modes:
+                base = None
+                for threads in args.sweep_threads:
+                    case = {"op": op, "bits": bits, "mode": mode, "threads": threads}
+                    point = json.dumps({"op": op, "bits": bits, "mode": mode, "reps": args.reps,
+                                        "profile": args.profiles[0]})
+                    env = {**os.environ, "OMP_NUM_THREADS": str(threads), "PRIVAGATOR_THREADS": str(threads)}
+                    proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--sweep-point", point],
+                                          env=env, capture_output=True, text=True)
+                    label = f"{op} [{bits}-bit, {mode}, {threads} threads]"
+                    if proc.returncode != 0:
+                        error = (proc.stderr.strip().splitlines() or ["failed"])[-1]
+                        print(f"❌ {label}: {error}")
+                        results.append({**case, "error": error})
+                        continue
+                    metrics = json.loads(proc.stdout.strip().splitlines()[-1])
+                    p50 = metrics["run"]["p50"]
+                    base = base or p50
+                    metrics.update(case, speedup=round(base / p50, 3) if p50 else None)
+                    results.append(metrics)
+                    print(f"✅ {label}: run p50 {p50 * 1000:.3f} ms, speedup ×{metrics['speedup']}")
+    return results
+
+
+# -----------------------------
+# Baseline comparison
+# -----------------------------
+def _case_id(r):
+    # results written before compile profiles existed were all "balanced"
+    profile = r.get("profile", DEFAULT_PROFILE if r["backend"] == "concrete" else None)
+    return (r["suite"], r["op"], r["backend"], r["bits"], profile or "-")
+
+
+def _metric(result, path):
+    value = result
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+
+def compare(current, baseline, threshold, min_delta=DEFAULT_MIN_DELTA):
+    """
+    List of regressions: metric more than `threshold` (fraction) and at least
+    `min_delta` seconds slower than baseline. UNGATED_BACKENDS are skipped.
+    """
+    base = {_case_id(r): r for r in baseline["results"] if "error" not in r}
+    regressions = []
+    for result in current["results"]:
+        old = base.get(_case_id(result))
+        if old is None or "error" in result or result["backend"] in UNGATED_BACKENDS:
+            continue
+        for path in TRACKED:
+            new_v, old_v = _metric(result, path), _metric(old, path)
+            if new_v is None or not old_v:
+                continue
+            change = (new_v - old_v) / old_v
+            if change > threshold and new_v - old_v >= min_delta:
+                regressions.append({"case": "/".join(map(str, _case_id(result))), "metric": path,
+                                    "baseline": old_v, "current": new_v, "change": round(change, 3)})
+    return regressions
+
+
+# -----------------------------
+# Simulated latency profile
+# -----------------------------
+def latency_profile(report, profile_name=DEFAULT_PROFILE):
+    """Per-op encrypt/run/decrypt distributions from the concrete results of `report`."""
+    chosen = {}
+    for r in report["results"]:
+        if r["backend"] != "concrete" or "error" in r or r.get("profile", DEFAULT_PROFILE) != profile_name:
+            continue
+        # fhe_core wins for ops both suites have; it is what the server runs
+        rank = (r["suite"] != "fhe_core", abs(r["bits"] - SERVED_BITS[r["suite"]]))
+        if r["op"] not in chosen or rank < chosen[r["op"]][0]:
+            chosen[r["op"]] = (rank, r)
+    ops = {
+        op: {stage: {k: r[stage][k] for k in ("min", "p50", "p90", "p99", "max")}
+             for stage in ("encrypt", "run", "decrypt")}
+        for op, (_, r) in sorted(chosen.items())
+    }
+    meta = {"source": "benchmark_fhe", **report["meta"], "compile_profile": profile_name,
+            "cases": {op: f"{r['suite']} {r['bits']}-bit" for op, (_, r) in sorted(chosen.items())}}
+    return {"meta": meta, "ops": ops}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Benchmark Privagator FHE operations")
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument("--bits", nargs="+", type=int, default=[4, 6, 8],
+                        help="Input bit-widths to compile and sample for")
+    parser.add_argument("--core-ops", nargs="*", choices=CORE_OPS, default=list(CORE_OPS))
+    parser.add_argument("--utils-ops", nargs="*", choices=UTILS_OPS, default=list(UTILS_OPS))
+    parser.add_argument("--profiles", nargs="+", choices=list(PROFILES), default=[DEFAULT_PROFILE],
+                        help="Compile profiles to compare on the concrete backend")
+    parser.add_argument("--reps", type=int, default=10, help="Samples per latency distribution")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", metavar="BASELINE", help="Flag regressions against this results file")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Allowed slowdown fraction before a metric counts as a regression")
+    parser.add_argument("--min-delta", type=float, default=DEFAULT_MIN_DELTA,
+                        help="Smallest slowdown in seconds that can count as a regression")
+    parser.add_argument("--emit-profile", metavar="PATH",
+                        help="Also write a simulated-backend latency profile from the concrete results")
+    parser.add_argument("--sweep-parallelism", action="store_true",
+                        help="Time the tensor-shaped ops across parallelism modes and thread counts instead")
+    parser.add_argument("--sweep-modes", nargs="+", choices=parallelism.MODES, default=list(parallelism.MODES))
+    parser.add_argument("--sweep-threads", nargs="+", type=int,
+                        default=sorted({1, 2, 4, len(parallelism.available_cpus())}))
+    parser.add_argument("--sweep-point", help=argparse.SUPPRESS)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.sweep_point:
+        point = json.loads(args.sweep_point)
+        print(json.dumps(sweep_point(point["op"], point["bits"], point["mode"], point["reps"], point["profile"])))
+        return 0
+    if args.sweep_parallelism:
+        report = {"meta": environment(), "sweep": run_sweep(args)}
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"📄 Sweep written to {args.output}")
+        return 0
+
+    report = {"meta": environment(), "results": run_suite(args)}
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"📄 Results written to {args.output}")
+
+    if args.emit_profile:
+        # replay the profile the server compiles with by default, else the first benchmarked one
+        profile_name = DEFAULT_PROFILE if DEFAULT_PROFILE in args.profiles else args.profiles[0]
+        profile = latency_profile(report, profile_name)
+        if not profile["ops"]:
+            print("⚠️  No concrete results — latency profile not written")
+        else:
+            os.makedirs(os.path.dirname(args.emit_profile) or ".", exist_ok=True)
+            with open(args.emit_profile, "w") as f:
+                json.dump(profile, f, indent=2)
+            print(f"📄 Latency profile for {len(profile['ops'])} ops written to {args.emit_profile}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold, args.min_delta)
+        for r in regressions:
+            print(f"🔻 {r['case']} {r['metric']}: {r['baseline']:.6g} → {r['current']:.6g} "
+                  f"(+{r['change'] * 100:.0f}%)")
+        if regressions:
+            return 1
+        print("✅ No regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
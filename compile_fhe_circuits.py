@@ -1,58 +1,46 @@
-from concrete import fhe
-import os
-import json
-import base64
-import pickle
-
-print("🔄 Compiling FHE circuits...")
-
-os.makedirs("compiled_circuits", exist_ok=True)
-
+"""
+Export compiled circuits for the client/server split.
 
-# ----------------------
-# Define circuits
-# ----------------------
-def square(x):
-    return x * x
+For every op and bit-width tier (fhe_core.TIERS) this writes, into `circuits/`:
 
+    <op>_<bits>bit_circuit.zip     server artifact, loaded by fhe_server.py
+    <op>_<bits>bit_client.specs    client specs, loaded by fhe_client.py
 
-def add(x, y):
-    return x + y
+The client picks the smallest tier that holds its inputs, the same way
+fhe_core.run_circuit does.
 
+The circuits come from modules.fhe_core, so the exported artifacts match
+what the server compiles (and are served from the on-disk circuit cache
+when they were compiled before).
+"""
 
-def compare(x, y):
-    return x > y
+import os
 
+from modules import fhe_core
 
-# ----------------------
-# Helper function to save safely
-# ----------------------
-def compile_and_save(func, name, sample_inputs, encrypted_params):
-    path = f"compiled_circuits/{name}.json"
-    try:
-        compiler = fhe.Compiler(func, parameter_encryption_statuses=encrypted_params)
-        circuit = compiler.compile(sample_inputs)
+CIRCUIT_DIR = os.environ.get("PRIVAGATOR_CIRCUIT_DIR", "circuits")
+OPS = ("square", "multiply", "add", "compare")
 
-        # ✅ Use __getstate__() to serialize safely
-        state = circuit.__getstate__()
-        encoded = base64.b64encode(pickle.dumps(state)).decode("utf-8")
+print("🔄 Compiling FHE circuits...")
 
-        with open(path, "w") as f:
-            json.dump({"name": name, "data": encoded}, f, indent=2)
+os.makedirs(CIRCUIT_DIR, exist_ok=True)
 
-        print(f"✅ Saved {name} successfully at {path}")
 
+def export(op):
+    try:
+        circuit = fhe_core.CIRCUITS.get(op)
+        server_path = os.path.join(CIRCUIT_DIR, f"{op}_circuit.zip")
+        specs_path = os.path.join(CIRCUIT_DIR, f"{op}_client.specs")
+        circuit.server.save(server_path)
+        with open(specs_path, "wb") as f:
+            f.write(circuit.client.specs.serialize())
+        print(f"✅ Saved {op} successfully at {server_path}")
     except Exception as e:
-        print(f"❌ Failed to save {name}: {e}")
+        print(f"❌ Failed to save {op}: {e}")
 
 
-# ----------------------
-# Compile all circuits
-# ----------------------
-compile_and_save(square, "square_circuit", [i for i in range(10)], {"x": "encrypted"})
-compile_and_save(add, "add_circuit", [(x, y) for x in range(10) for y in range(10)],
-                 {"x": "encrypted", "y": "encrypted"})
-compile_and_save(compare, "compare_circuit", [(x, y) for x in range(10) for y in range(10)],
-                 {"x": "encrypted", "y": "encrypted"})
+for op in OPS:
+    for bits in fhe_core.TIERS:
+        export(fhe_core.tier_circuit_name(op, bits))
 
 print("🎯 Compilation finished successfully!")
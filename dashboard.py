@@ -1,8 +1,8 @@
 import streamlit as st
 from theme_loader import load_theme
 load_theme()
-from fhe_utils import run_fhe_operation
-import time
+from fhe_utils import BOUNDS, run_fhe_operation
+from shared_circuits import current_pool, render_pool_stats
 
 # -----------------------------
 # Streamlit Page Config
@@ -12,6 +12,11 @@ st.set_page_config(page_title="Privagator - Encrypted Computation", layout="cent
 st.title("🔐 Privagator: Privacy-Preserving Computations")
 st.caption("Powered by Zama’s Fully Homomorphic Encryption (FHE)")
 
+# Circuits are shared by every session; start compiling them in the
+# background while the user picks inputs
+pool = current_pool()
+pool.warm_up("fhe_utils")
+
 # Sidebar for selecting operations
 st.sidebar.header("Demo Options")
 operation = st.sidebar.selectbox(
@@ -22,24 +27,28 @@ operation = st.sidebar.selectbox(
 # -----------------------------
 # Input Fields
 # -----------------------------
-a = st.number_input("Enter first number:", min_value=0, max_value=100, value=3)
-b = st.number_input("Enter second number:", min_value=0, max_value=100, value=5)
+# the circuits are compiled for BOUNDS; anything outside would not decrypt correctly
+(a_lo, a_hi), (b_lo, b_hi) = BOUNDS
+a = st.number_input(f"Enter first number ({a_lo}–{a_hi}):", min_value=a_lo, max_value=a_hi, value=3)
+b = st.number_input(f"Enter second number ({b_lo}–{b_hi}):", min_value=b_lo, max_value=b_hi, value=5)
+in_range = a_lo <= a <= a_hi and b_lo <= b <= b_hi
 
 # -----------------------------
 # Run Button
 # -----------------------------
 if st.button("Run Encrypted Computation", type="primary"):
-    with st.spinner("Encrypting your inputs 🔐..."):
-        time.sleep(1.2)
-    with st.spinner("Performing encrypted computation securely ⚙️..."):
-        time.sleep(1.8)
-        result = run_fhe_operation(a, b, operation)
-    with st.spinner("Decrypting result 🔓..."):
-        time.sleep(1.2)
-
-    st.success("✅ Secure computation completed successfully!")
-    st.metric(label="Decrypted Result", value=result)
-    st.info(f"Operation performed: **{operation}**")
+    if not in_range:
+        st.error(f"⚠️ Inputs must be within {a_lo}–{a_hi} and {b_lo}–{b_hi}: the circuits are compiled for that range.")
+    else:
+        # encrypt, evaluate and decrypt all happen inside run_fhe_operation
+        with st.spinner("Encrypting, computing and decrypting securely ⚙️..."):
+            result = run_fhe_operation(a, b, operation, pool=pool)
+
+        st.success("✅ Secure computation completed successfully!")
+        st.metric(label="Decrypted Result", value=result)
+        st.info(f"Operation performed: **{operation}**")
+
+render_pool_stats(pool)
 
 # -----------------------------
 # Footer
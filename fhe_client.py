@@ -1,48 +1,590 @@
-import requests, time, json, sys
-from concrete import fhe
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
 
-def run_operation(operation, x, y=None):
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from modules import fhe_core, wire
+from modules.aio_http import AsyncConnectionPool
+from modules.circuit_cache import CachedCircuit
+from modules.circuit_registry import load_concrete
+from modules.keyset import KeysetManager, keyset_fingerprint
+
+SERVER_URL = os.environ.get("PRIVAGATOR_SERVER_URL", "http://127.0.0.1:8765")
+CIRCUIT_DIR = os.environ.get("PRIVAGATOR_CIRCUIT_DIR", "circuits")
+
+DEFAULT_TIMEOUT = 30.0
+# Per-op read timeouts in seconds; large aggregations legitimately take longer
+DEFAULT_OP_TIMEOUTS = {"aggregate": 120.0, "histogram": 120.0}
+# GETs are retried on these statuses. A POST is retried only on 503: the
+# server turned it away before running it. A 504 means the computation ran past
+# the server's timeout and its worker is still busy, so resending runs it again.
+RETRY_STATUSES = (502, 503)
+POST_RETRY_STATUSES = (503,)
+
+
+class FHEClientError(Exception):
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class FHETimeout(FHEClientError):
+    pass
+
+
+def _error_message(status, body):
     try:
-        start_total = time.time()
+        return json.loads(body).get("error") or f"HTTP {status}"
+    except (ValueError, AttributeError):
+        return f"HTTP {status}"
+
+
+def _retry_after(headers):
+    try:
+        return max(float(headers.get("retry-after", 0)), 0.0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class _Retry(Retry):
+    """urllib3 Retry that only resends a POST on POST_RETRY_STATUSES."""
+
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if method.upper() == "POST" and status_code not in POST_RETRY_STATUSES:
+            return False
+        return super().is_retry(method, status_code, has_retry_after)
+
+
+class StageTimings:
+    """Running count/total/max per stage (encode, request, server, network, decode)."""
+
+    def __init__(self):
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def record(self, metrics):
+        with self._lock:
+            for stage, seconds in metrics.items():
+                if seconds is None:
+                    continue
+                count, total, worst = self._stages.get(stage, (0, 0.0, 0.0))
+                self._stages[stage] = (count + 1, total + seconds, max(worst, seconds))
+
+    def summary(self):
+        with self._lock:
+            return {
+                stage: {"count": c, "mean": round(t / c, 6), "max": round(m, 6)}
+                for stage, (c, t, m) in self._stages.items()
+            }
+
+
+def _compute_body(op, inputs, k=None, edges=None, backend=None):
+    body = {"op": op, "inputs": [int(v) for v in inputs]}
+    if k is not None:
+        body["k"] = int(k)
+    if edges is not None:
+        body["edges"] = [int(e) for e in edges]
+    if backend is not None:
+        body["backend"] = backend
+    return body
+
+
+def _stage_metrics(encode, request, server_time, decode):
+    return {
+        "encode": encode,
+        "request": request,
+        "server": server_time,
+        "network": max(request - server_time, 0.0) if server_time is not None else None,
+        "decode": decode,
+    }
+
+
+class FHEClient:
+    """
+    Pooled, keep-alive client for the compute server.
+
+    One `requests.Session` keeps TCP/TLS connections open across calls;
+    connection failures and 503 replies (502 too, for GETs) are retried with
+    exponential backoff, honouring Retry-After; a 504 never is. Timeouts are
+    per op (`op_timeouts`, falling back to `timeout`).
+    """
+
+    def __init__(self, base_url=SERVER_URL, pool_size=10, retries=3, backoff=0.3,
+                 timeout=DEFAULT_TIMEOUT, op_timeouts=None, connect_timeout=5.0):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.op_timeouts = {**DEFAULT_OP_TIMEOUTS, **(op_timeouts or {})}
+        self.connect_timeout = connect_timeout
+        self.timings = StageTimings()
+        # POSTs are retried only when the server never ran them (connect errors,
+        # 503); read timeouts are not, or a slow op would be re-run `retries` times
+        retry = _Retry(total=retries, connect=retries, read=0, status=retries,
+                      backoff_factor=backoff, status_forcelist=RETRY_STATUSES,
+                      allowed_methods=frozenset({"GET", "POST"}), raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def timeout_for(self, op):
+        return self.op_timeouts.get(op, self.timeout)
+
+    def _post(self, path, op, **kwargs):
+        start = time.perf_counter()
+        try:
+            res = self.session.post(f"{self.base_url}{path}",
+                                    timeout=(self.connect_timeout, self.timeout_for(op)), **kwargs)
+        except requests.exceptions.Timeout:
+            raise FHETimeout(f"'{op}' timed out after {self.timeout_for(op)}s")
+        except requests.exceptions.RequestException as e:
+            raise FHEClientError(f"Connection failed: {e}")
+        elapsed = time.perf_counter() - start
+        if res.status_code != 200:
+            raise FHEClientError(_error_message(res.status_code, res.content), res.status_code)
+        return res, elapsed
+
+    def compute_with_metrics(self, op, inputs, k=None, edges=None, backend=None):
+        """
+        Returns (result, metrics) with per-stage seconds and exact byte counts.
+        `k` is the number of values a "topk" request returns, `edges` the
+        bucket edges of a "histogram" request.
+        """
+        start = time.perf_counter()
+        body = json.dumps(_compute_body(op, inputs, k, edges, backend)).encode("utf-8")
+        encode = time.perf_counter() - start
+        res, request = self._post("/compute", op, data=body,
+                                  headers={"Content-Type": "application/json"})
+        start = time.perf_counter()
+        reply = res.json()
+        decode = time.perf_counter() - start
+        metrics = _stage_metrics(encode, request, reply.get("server_time"), decode)
+        self.timings.record(metrics)
+        metrics.update(request_bytes=len(body), response_bytes=len(res.content))
+        return reply["result"], metrics
+
+    def compute(self, op, inputs, k=None, edges=None, backend=None):
+        return self.compute_with_metrics(op, inputs, k, edges, backend)[0]
+
+    def batch(self, op, rows):
+        res, _ = self._post("/batch", op, json={"op": op, "rows": [list(r) for r in rows]})
+        return res.json()["results"]
+
+    def compute_frame(self, op, body):
+        """POST a binary frame (see modules/wire.py); returns the raw reply body."""
+        res, request = self._post("/compute", op, data=body, headers={
+            "Content-Type": wire.CONTENT_TYPE, "Accept": wire.CONTENT_TYPE})
+        return res.content, request
+
+    def _get(self, path, timeout, **kwargs):
+        try:
+            res = self.session.get(f"{self.base_url}{path}", timeout=(self.connect_timeout, timeout), **kwargs)
+        except requests.exceptions.Timeout:
+            raise FHETimeout(f"GET {path} timed out after {timeout}s")
+        except requests.exceptions.RequestException as e:
+            raise FHEClientError(f"Connection failed: {e}")
+        if res.status_code != 200:
+            raise FHEClientError(_error_message(res.status_code, res.content), res.status_code)
+        return res
+
+    def health(self, timeout=5.0):
+        return self._get("/health", timeout).json()
+
+    def config(self, timeout=5.0):
+        """The server's accepted ops and histogram edge sets."""
+        return self._get("/config", timeout).json()
+
+    # ---------- Jobs ----------
+    def submit_job(self, op, inputs=None, rows=None, k=None, edges=None, backend=None):
+        """Start `op` on the server without waiting for it; returns the job id."""
+        body = {"op": op, "rows": [list(r) for r in rows]} if rows is not None else \
+            _compute_body(op, inputs, k, edges, backend)
+        try:
+            res = self.session.post(f"{self.base_url}/jobs", json=body,
+                                    timeout=(self.connect_timeout, self.timeout))
+        except requests.exceptions.RequestException as e:
+            raise FHEClientError(f"Connection failed: {e}")
+        if res.status_code != 202:
+            raise FHEClientError(_error_message(res.status_code, res.content), res.status_code)
+        return res.json()["job_id"]
+
+    def job(self, job_id, timeout=10.0):
+        """{"state", "stage", "stages", "percent", "result"/"error", ...}"""
+        return self._get(f"/jobs/{job_id}", timeout).json()
+
+    def wait_job(self, job_id, poll_interval=0.5, timeout=None, on_progress=None):
+        """
+        Poll until the job finishes and return its result; `on_progress(status)`
+        sees every poll. Raises FHEClientError if the job failed.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            status = self.job(job_id)
+            if on_progress is not None:
+                on_progress(status)
+            if status["state"] == "done":
+                return status["result"]
+            if status["state"] == "failed":
+                raise FHEClientError(status.get("error") or "Job failed")
+            if deadline is not None and time.monotonic() > deadline:
+                raise FHETimeout(f"Job {job_id} still {status['state']} after {timeout}s")
+            time.sleep(poll_interval)
+
+    def job_events(self, job_id, timeout=60.0):
+        """Yield the job's status dicts as the server streams them, ending when it finishes."""
+        res = self._get(f"/jobs/{job_id}/events", timeout, stream=True)
+        try:
+            data = []
+            for line in res.iter_lines(decode_unicode=True):
+                if line.startswith("data:"):
+                    data.append(line[5:].strip())
+                elif not line and data:
+                    yield json.loads("\n".join(data))
+                    data = []
+        finally:
+            res.close()
+
+    # ---------- Sessions ----------
+    def open_session(self, keys_blob, label=None):
+        """Upload serialized evaluation keys once; returns the session id to send instead."""
+        header = {"evaluation_keys": True, **({"client": label} if label else {})}
+        body = wire.encode_frame(header, [keys_blob])
+        try:
+            res = self.session.post(f"{self.base_url}/sessions", data=body,
+                                    headers={"Content-Type": wire.CONTENT_TYPE},
+                                    timeout=(self.connect_timeout, self.timeout))
+        except requests.exceptions.RequestException as e:
+            raise FHEClientError(f"Connection failed: {e}")
+        if res.status_code != 201:
+            raise FHEClientError(_error_message(res.status_code, res.content), res.status_code)
+        return res.json()["session_id"]
+
+    def close_session(self, session_id):
+        try:
+            res = self.session.delete(f"{self.base_url}/sessions/{session_id}",
+                                      timeout=(self.connect_timeout, self.timeout))
+        except requests.exceptions.RequestException as e:
+            raise FHEClientError(f"Connection failed: {e}")
+        if res.status_code not in (200, 404):
+            raise FHEClientError(_error_message(res.status_code, res.content), res.status_code)
+
+    def close(self):
+        self.session.close()
+
 
-        # Load circuit
-        circuit_file = f"circuits/{operation}_circuit.zip"
-        circuit = fhe.load(circuit_file)
+class AsyncFHEClient:
+    """
+    asyncio variant of FHEClient: many computations in flight at once over
+    a shared pool of keep-alive connections (`max_in_flight`).
+    """
+
+    def __init__(self, base_url=SERVER_URL, max_in_flight=32, retries=3, backoff=0.3,
+                 timeout=DEFAULT_TIMEOUT, op_timeouts=None):
+        self.pool = AsyncConnectionPool(base_url, max_connections=max_in_flight)
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.op_timeouts = {**DEFAULT_OP_TIMEOUTS, **(op_timeouts or {})}
+        self.timings = StageTimings()
+
+    def timeout_for(self, op):
+        return self.op_timeouts.get(op, self.timeout)
+
+    async def _request(self, method, path, op, body=b"", headers=None):
+        statuses = POST_RETRY_STATUSES if method == "POST" else RETRY_STATUSES
+        for attempt in range(self.retries + 1):
+            delay = self.backoff * (2 ** attempt)
+            start = time.perf_counter()
+            try:
+                res = await self.pool.request(method, path, body, headers, timeout=self.timeout_for(op))
+            except asyncio.TimeoutError:
+                raise FHETimeout(f"'{op}' timed out after {self.timeout_for(op)}s")
+            except (ConnectionError, OSError, asyncio.IncompleteReadError) as e:
+                if attempt == self.retries:
+                    raise FHEClientError(f"Connection failed: {e}")
+            else:
+                if res.status not in statuses or attempt == self.retries:
+                    break
+                delay = max(delay, _retry_after(res.headers))
+            await asyncio.sleep(delay)
+        elapsed = time.perf_counter() - start
+        if res.status != 200:
+            raise FHEClientError(_error_message(res.status, res.body), res.status)
+        return res, elapsed
+
+    async def compute_with_metrics(self, op, inputs, k=None, edges=None, backend=None):
+        start = time.perf_counter()
+        body = json.dumps(_compute_body(op, inputs, k, edges, backend)).encode("utf-8")
+        encode = time.perf_counter() - start
+        res, request = await self._request("POST", "/compute", op, body,
+                                           {"Content-Type": "application/json"})
+        start = time.perf_counter()
+        reply = res.json()
+        decode = time.perf_counter() - start
+        metrics = _stage_metrics(encode, request, reply.get("server_time"), decode)
+        self.timings.record(metrics)
+        metrics.update(request_bytes=len(body), response_bytes=len(res.body))
+        return reply["result"], metrics
+
+    async def compute(self, op, inputs, k=None, edges=None, backend=None):
+        return (await self.compute_with_metrics(op, inputs, k, edges, backend))[0]
+
+    async def compute_many(self, op, inputs_list):
+        """Run every input tuple concurrently; results come back in order."""
+        return await asyncio.gather(*(self.compute(op, inputs) for inputs in inputs_list))
+
+    async def batch(self, op, rows):
+        body = json.dumps({"op": op, "rows": [list(r) for r in rows]}).encode("utf-8")
+        res, _ = await self._request("POST", "/batch", op, body, {"Content-Type": "application/json"})
+        return res.json()["results"]
+
+    async def health(self):
+        res, _ = await self._request("GET", "/health", "health")
+        return res.json()
+
+    async def config(self):
+        res, _ = await self._request("GET", "/config", "config")
+        return res.json()
+
+    async def submit_job(self, op, inputs=None, rows=None, k=None, edges=None, backend=None):
+        body = {"op": op, "rows": [list(r) for r in rows]} if rows is not None else \
+            _compute_body(op, inputs, k, edges, backend)
+        res = await self.pool.request("POST", "/jobs", json.dumps(body).encode("utf-8"),
+                                      {"Content-Type": "application/json"}, timeout=self.timeout)
+        if res.status != 202:
+            raise FHEClientError(_error_message(res.status, res.body), res.status)
+        return res.json()["job_id"]
+
+    async def job(self, job_id):
+        res, _ = await self._request("GET", f"/jobs/{job_id}", "job")
+        return res.json()
+
+    async def wait_job(self, job_id, poll_interval=0.5, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            status = await self.job(job_id)
+            if status["state"] == "done":
+                return status["result"]
+            if status["state"] == "failed":
+                raise FHEClientError(status.get("error") or "Job failed")
+            if deadline is not None and time.monotonic() > deadline:
+                raise FHETimeout(f"Job {job_id} still {status['state']} after {timeout}s")
+            await asyncio.sleep(poll_interval)
+
+    async def close(self):
+        await self.pool.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+
+_default_client = None
+
+
+def default_client():
+    """Process-wide FHEClient for SERVER_URL."""
+    global _default_client
+    if _default_client is None:
+        _default_client = FHEClient(SERVER_URL)
+    return _default_client
+
+
+# The client owns the secret keys; they persist like the server's keysets,
+# under their own tenant.
+CLIENT_KEYS = KeysetManager(tenant="client")
+
+
+class ClientCircuitCache:
+    """
+    Bounded LRU of loaded client circuits, keyed by artifact path and mtime.
+    A changed artifact (new mtime) is reloaded on its next use.
+    """
+
+    def __init__(self, maxsize=16):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self._entries = OrderedDict()  # path -> (mtime_ns, client)
+        self._lock = threading.Lock()
+
+    def get(self, path, loader):
+        mtime = os.stat(path).st_mtime_ns
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == mtime:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            if entry is not None:
+                self.reloads += 1
+            # loading under the lock keeps concurrent first calls from loading twice
+            client = loader(path)
+            self._entries[path] = (mtime, client)
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+            return client
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {"entries": len(self._entries), "maxsize": self.maxsize,
+                "hits": self.hits, "misses": self.misses, "reloads": self.reloads}
+
+
+CLIENT_CIRCUITS = ClientCircuitCache(int(os.environ.get("PRIVAGATOR_CLIENT_CACHE_SIZE", "16")))
+
+
+def _load_client_file(path):
+    fhe = load_concrete()
+    if fhe is None:
+        raise RuntimeError("concrete-python is required on the client")
+    with open(path, "rb") as f:
+        specs = fhe.ClientSpecs.deserialize(f.read())
+    client = fhe.Client(specs)
+    name = os.path.basename(path).rsplit("_client.specs", 1)[0]
+    CLIENT_KEYS.attach(CachedCircuit(name, None, client))
+    return client
+
+
+def load_client(operation):
+    """fhe.Client for an exported circuit, with its keys; cached across calls."""
+    path = os.path.join(CIRCUIT_DIR, f"{operation}_client.specs")
+    return CLIENT_CIRCUITS.get(path, _load_client_file)
+
+
+# Server sessions holding our evaluation keys: (server URL, keyset id) -> session id
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def _session_for(http, client):
+    """Session holding `client`'s evaluation keys on the server, uploading them the first time."""
+    key = (http.base_url, keyset_fingerprint(client))
+    with _sessions_lock:
+        session_id = _sessions.get(key)
+        if session_id is None:
+            session_id = _sessions[key] = http.open_session(client.evaluation_keys.serialize(),
+                                                           label=CLIENT_KEYS.tenant)
+        return session_id
+
+
+def _forget_session(http, client):
+    with _sessions_lock:
+        _sessions.pop((http.base_url, keyset_fingerprint(client)), None)
+
+
+def run_operation(operation, x, y=None, compression=None, bounds=None, use_session=True):
+    """
+    Encrypt locally, evaluate on the server, decrypt locally.
+    `compression` ("zstd" / "lz4") compresses the request frame when available.
+    The circuit tier is the smallest that holds the declared `bounds` ((lo, hi),
+    default: the widest tier). It never depends on the inputs themselves, so
+    the tier named in the request tells the server nothing about the values.
+    With `use_session` the evaluation keys are uploaded once per server
+    (POST /sessions) and later requests only carry ciphertexts.
+    """
+    try:
+        start_total = time.time()
+        fhe = load_concrete()
 
         # Prepare inputs
-        inputs = {"x": int(x)}
+        args = [int(x)]
         if y is not None:
-            inputs["y"] = int(y)
+            args.append(int(y))
+        if bounds is None:
+            bounds = (0, fhe_core.tier_max(fhe_core.TIERS[-1]))
+        # checks the inputs against the declared bounds, then returns those bounds
+        lo, hi = fhe_core._input_bounds(args, bounds)
+        circuit_name = fhe_core.tier_circuit_name(operation, fhe_core.select_tier(hi, lo))
+
+        # Load circuit (in-process LRU; only file I/O when the artifact changed)
+        start_load = time.time()
+        client = load_client(circuit_name)
+        load_time = time.time() - start_load
 
         # Encrypt
         start_enc = time.time()
-        enc_inputs = circuit.encrypt(inputs)
+        enc_inputs = client.encrypt(*args)
+        if len(args) == 1:
+            enc_inputs = (enc_inputs,)
         enc_time = time.time() - start_enc
 
-        # Serialize
-        payload = {k: v.tolist() if hasattr(v, "tolist") else v for k, v in enc_inputs.items()}
+        # Session: the server already holds our evaluation keys (uploaded on first use)
+        http = default_client()
+        start_session = time.time()
+        session_id = None
+        if use_session:
+            try:
+                session_id = _session_for(http, client)
+            except FHEClientError as e:
+                if e.status not in (404, 405):
+                    raise
+                # a server without /sessions: send the keys with every request
+        session_time = time.time() - start_session
 
-        # Send to FHE server
-        start_compute = time.time()
-        res = requests.post("http://127.0.0.1:8765/compute", json={"op": operation, "inputs": payload})
-        compute_time = time.time() - start_compute
+        # Serialize into a binary frame: ciphertexts, preceded by the evaluation keys without a session
+        start_ser = time.time()
+        ciphertexts = [v.serialize() for v in enc_inputs]
+        header = {"op": circuit_name, "accept_codecs": wire.available_codecs()}
+        if session_id:
+            header["session"] = session_id
+            keys_bytes = 0
+            body = wire.encode_frame(header, ciphertexts, codec=compression)
+        else:
+            keys_blob = client.evaluation_keys.serialize()
+            keys_bytes = len(keys_blob)
+            header["evaluation_keys"] = True
+            body = wire.encode_frame(header, [keys_blob, *ciphertexts], codec=compression)
+        ser_time = time.time() - start_ser
+
+        # Send to FHE server (pooled keep-alive connection)
+        try:
+            content, compute_time = http.compute_frame(operation, body)
+        except FHEClientError as e:
+            if not session_id or e.status != 404:
+                raise
+            # the session expired or was evicted: upload the keys again and retry once
+            _forget_session(http, client)
+            header["session"] = _session_for(http, client)
+            body = wire.encode_frame(header, ciphertexts, codec=compression)
+            content, compute_time = http.compute_frame(operation, body)
+        reply, values = wire.decode_frame(content)
 
         # Decrypt
         start_dec = time.time()
-        decrypted = circuit.decrypt(res.json()["result"])
+        decrypted = client.decrypt(fhe.Value.deserialize(values[0]))
         dec_time = time.time() - start_dec
         total_time = time.time() - start_total
 
-        # Estimate ciphertext size
-        import sys
-        payload_size_kb = sys.getsizeof(json.dumps(payload)) / 1024
-
         metrics = {
             "result": decrypted,
+            "circuit": circuit_name,
+            "load_time": round(load_time, 3),
+            "session_time": round(session_time, 3),
             "encryption_time": round(enc_time, 3),
+            "serialization_time": round(ser_time, 3),
             "compute_time": round(compute_time, 3),
+            "server_time": reply.get("server_time"),
             "decryption_time": round(dec_time, 3),
-            "payload_size_kb": round(payload_size_kb, 2),
+            # exact bytes on the wire, not Python object sizes
+            "request_bytes": len(body),
+            "response_bytes": len(content),
+            "ciphertext_bytes": sum(len(c) for c in ciphertexts),
+            "evaluation_key_bytes": keys_bytes,
+            "payload_size_kb": round(len(body) / 1024, 2),
             "total_time": round(total_time, 3)
         }
         return metrics
@@ -1,135 +1,682 @@
-import streamlit as st
-import numpy as np
+"""
+Privagator compute server.
+
+Serves the `/compute` and `/health` contract used by `streamlit_app.py`,
+`app.py` and `fhe_client.py`, plus asynchronous jobs: `POST /jobs` returns a
+job id at once, `GET /jobs/{id}` reports state and per-stage progress, and
+`GET /jobs/{id}/events` streams the same as server-sent events. Connections are handled by an asyncio front end
+while the CPU-bound FHE work runs in a process pool, so one slow computation
+never blocks other requests and throughput scales with the number of cores.
+
+    python fhe_server.py --port 8765 --workers 4 --timeout 60
+
+With `--coalesce-window-ms` set, concurrent scalar `/compute` requests for
+the same op are micro-batched into one tensor evaluation (modules/coalescer.py).
+
+`GET /metrics` exposes per-op, per-stage latency histograms (queue wait,
+serialization, encrypt, evaluate, decrypt) plus error and simulated-fallback
+counters in the Prometheus text format.
+
+Environment variables mirror the flags: PRIVAGATOR_HOST, PRIVAGATOR_PORT,
+PRIVAGATOR_WORKERS, PRIVAGATOR_TIMEOUT, PRIVAGATOR_BACKEND, PRIVAGATOR_SIM_LATENCY,
+PRIVAGATOR_PARALLELISM, PRIVAGATOR_THREADS, PRIVAGATOR_CPU_AFFINITY.
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import multiprocessing
+import os
+import re
+import signal
+import threading
 import time
+from concurrent.futures import ProcessPoolExecutor
+
+from modules import fhe_core, metrics, parallelism, sim_backend, wire
+from modules.aio_http import HTTPError, HTTPServer, Response, Router, StreamResponse, json_response
+from modules.circuit_registry import load_concrete
+from modules.coalescer import Coalescer
+from modules.compile_profiles import DEFAULT_PROFILE, PROFILES
+from modules.jobs import FINISHED, JobStore, JobStoreFull
+from modules.key_store import KeyStore, KeyStoreFull, KeysNeeded, SessionNotFound, WorkerKeyCache, valid_session_id
+from modules.metrics import REGISTRY
+
+
+# Exported server artifacts (see compile_fhe_circuits.py) used for requests
+# that arrive already encrypted by fhe_client.
+CIRCUIT_DIR = os.environ.get("PRIVAGATOR_CIRCUIT_DIR", "circuits")
+_OP_NAME = re.compile(r"^\w+$")
+# sent with 503 "busy" replies; clients may resend after this many seconds
+RETRY_AFTER = {"Retry-After": "1"}
+
+HTTP_REQUESTS = REGISTRY.counter(
+    "privagator_http_requests_total", "HTTP requests by route and status", ("route", "status"))
+JOBS = REGISTRY.counter("privagator_jobs_total", "Finished jobs by outcome", ("state",))
+
+
+# -----------------------------
+# Worker process side
+# -----------------------------
+_progress_queue = None
+_placement = {}
+_session_keys = WorkerKeyCache()
+
+
+def _place_worker(workers, parallel_spec, threads, cpu_slices, counter):
+    """
+    Pin this worker to its CPU slice (if any) and size its evaluation thread
+    pool, so `workers` processes share the cores instead of each using them all.
+    Must run before the Concrete runtime starts.
+    """
+    cpus = None
+    if cpu_slices:
+        with counter.get_lock():
+            index = counter.value
+            counter.value += 1
+        cpus = cpu_slices[index % len(cpu_slices)]
+        parallelism.pin(cpus)
+    threads = threads or (len(cpus) if cpus else max(1, len(parallelism.available_cpus()) // workers))
+    parallelism.set_threads(threads)
+    default, overrides = parallelism.parse_spec(parallel_spec)
+    fhe_core.set_parallelism(default)
+    for name, mode in overrides.items():
+        fhe_core.set_parallelism(mode, [name])
+    _placement.update(pid=os.getpid(), cpus=cpus, threads=threads)
+
+
+def _worker_init(backend, warm, sim_latency=None, progress_queue=None, compile_profile=None, placement=None,
+                 worker_key_cache_bytes=None):
+    global _progress_queue
+    _progress_queue = progress_queue
+    if worker_key_cache_bytes is not None:
+        _session_keys.max_bytes = worker_key_cache_bytes
+    if placement:
+        _place_worker(*placement)
+    fhe_core.set_backend(backend)
+    if compile_profile:
+        fhe_core.set_compile_profile(compile_profile)
+    sim_backend.configure(sim_latency)
+    if warm:
+        fhe_core.warm_up(background=False)
+
+
+def _instrumented(fn, op, submitted_at, *args):
+    """
+    Run `fn` in a worker and hand its metric events back to the parent,
+    which owns /metrics. Exceptions travel back the same way so the events
+    recorded before the failure are not lost.
+    """
+    with metrics.capture() as events:
+        fhe_core.STAGE_SECONDS.observe(max(0.0, time.time() - submitted_at), stage="queue_wait",
+                                       **fhe_core.metric_labels(op))
+        try:
+            return True, fn(*args), events
+        except Exception as e:
+            return False, e, events
+
+
+def _compute(op, inputs, options=None):
+    """Runs inside a pool worker."""
+    start = time.perf_counter()
+    result = fhe_core.run_circuit(op, inputs, **(options or {}))
+    return result, time.perf_counter() - start
+
+
+def _compute_batch(op, rows):
+    start = time.perf_counter()
+    results = fhe_core.run_batch(op, rows)
+    return results, time.perf_counter() - start
+
+
+def _run_job(job_id, kind, op, payload, options=None):
+    """A job's computation; stage progress goes back to the parent over the queue."""
+    def report(stage, done, total):
+        if _progress_queue is not None:
+            _progress_queue.put((job_id, stage, done, total))
+
+    with fhe_core.reporting(report):
+        if kind == "batch":
+            return _compute_batch(op, payload)
+        return _compute(op, payload, options)
+
+
+_servers = {}
+
+
+def _load_server(op):
+    if op not in _servers:
+        fhe = load_concrete()
+        if fhe is None:
+            raise RuntimeError("Encrypted requests need concrete on the server")
+        path = os.path.join(CIRCUIT_DIR, f"{op}_circuit.zip")
+        if not os.path.exists(path):
+            raise ValueError(f"No exported circuit for '{op}' (run compile_fhe_circuits.py)")
+        _servers[op] = fhe.Server.load(path)
+    return _servers[op]
+
+
+def _compute_encrypted(op, key_blob, arg_blobs, session_id=None):
+    """
+    Evaluate serialized ciphertexts; returns the serialized encrypted result.
+    With `session_id` the keys come from this worker's cache; KeysNeeded asks
+    the parent to resend with `key_blob` when they aren't there yet.
+    """
+    start = time.perf_counter()
+    fhe = load_concrete()
+    server = _load_server(op)
+    stage = fhe_core.STAGE_SECONDS
+    # exported circuits are not tiered
+    labels = fhe_core.metric_labels(op)
+    keys = _session_keys.get(session_id) if session_id else None
+    if keys is None and key_blob is None:
+        raise KeysNeeded(session_id)
+    with stage.time(stage="serialization", **labels):
+        if keys is None:
+            keys = fhe.EvaluationKeys.deserialize(key_blob)
+            if session_id:
+                _session_keys.put(session_id, keys, len(key_blob))
+        args = [fhe.Value.deserialize(blob) for blob in arg_blobs]
+    with stage.time(stage="evaluate", **labels):
+        result = server.run(*args, evaluation_keys=keys)
+    with stage.time(stage="serialization", **labels):
+        blob = result.serialize()
+    return blob, time.perf_counter() - start
+
+
+def _worker_readiness():
+    return {**fhe_core.readiness(), "keysets": fhe_core.keyset_stats(), "placement": dict(_placement)}
+
+
+# -----------------------------
+# Request handling
+# -----------------------------
+def parse_compute_request(data):
+    """
+    Accepts `{"op": "add", "inputs": [3, 4]}` (streamlit_app / fhe_client) and
+    the older `{"operation": "add", "x": 3, "y": 4}` shape used by app.py.
+    Ranking ops take a vector: `{"op": "topk", "inputs": [5, 9, 2], "k": 2}`, and
+    "histogram" optional bucket edges: `{"op": "histogram", "inputs": [...], "edges": [0, 250, 500, 750, 1000]}`
+    (one of fhe_core.HIST_EDGE_SETS).
+    `"backend": "fhe-sim"` (or any of fhe_core.BACKENDS) overrides the server's backend for the call.
+    Returns (op, inputs, options for run_circuit).
+    """
+    if not isinstance(data, dict):
+        raise HTTPError(400, "Expected a JSON object")
+    op = data.get("op") or data.get("operation")
+    if not op:
+        raise HTTPError(400, "Missing 'op'")
+    if "inputs" in data:
+        inputs = data["inputs"]
+    else:
+        inputs = [data[k] for k in ("x", "y") if data.get(k) is not None]
+    if not isinstance(inputs, (list, tuple)) or not inputs:
+        raise HTTPError(400, "'inputs' must be a non-empty list")
+    try:
+        inputs = [int(v) for v in inputs]
+    except (TypeError, ValueError):
+        raise HTTPError(400, "'inputs' must contain integers")
+    options = {}
+    if data.get("k") is not None:
+        if not isinstance(data["k"], int):
+            raise HTTPError(400, "'k' must be an integer")
+        options["k"] = data["k"]
+    if data.get("edges") is not None:
+        edges = data["edges"]
+        if not isinstance(edges, list) or not all(isinstance(e, int) for e in edges):
+            raise HTTPError(400, "'edges' must be a list of integers")
+        options["edges"] = edges
+    if data.get("backend") is not None:
+        if data["backend"] not in fhe_core.BACKENDS:
+            raise HTTPError(400, f"'backend' must be one of {', '.join(fhe_core.BACKENDS)}")
+        options["backend"] = data["backend"]
+    return op, inputs, options
+
+
+def parse_batch_request(data):
+    """`{"op": "add", "rows": [[1, 2], [3, 4], ...]}`"""
+    if not isinstance(data, dict) or not data.get("op"):
+        raise HTTPError(400, "Missing 'op'")
+    rows = data.get("rows")
+    if not isinstance(rows, list):
+        raise HTTPError(400, "'rows' must be a list of input lists")
+    try:
+        rows = [[int(v) for v in (row if isinstance(row, (list, tuple)) else [row])] for row in rows]
+    except (TypeError, ValueError):
+        raise HTTPError(400, "'rows' must contain integers")
+    return data["op"], rows
+
 
-# Remove the FHE server check and use simulated computations directly
-# --------------------------------
-# PAGE CONFIGURATION
-# --------------------------------
-st.set_page_config(
-    page_title="Privagator — FHE Demo",
-    layout="centered",
-    page_icon="🔐"
-)
-
-# --------------------------------
-# HEADER SECTION
-# --------------------------------
-st.image("https://cdn-icons-png.flaticon.com/512/3064/3064197.png", width=100)
-st.title("🔐 Privagator — FHE Demo (Simulated Secure Computation)")
-st.markdown("Experience how encrypted computations feel — safely simulated for this live demo.")
-
-st.divider()
-
-# --------------------------------
-# DEMO SELECTOR
-# --------------------------------
-demo = st.selectbox(
-    "Choose an FHE demo to simulate:",
-    [
-        "Secure Multiplication",
-        "Encrypted Addition", 
-        "Square Function",
-        "Private Comparison",
-        "Aggregate Balances"
-    ]
-)
-
-st.divider()
-
-# --------------------------------
-# SIMULATED FHE FUNCTIONS (No server needed)
-# --------------------------------
-def simulate_fhe_operation(operation, inputs):
-    """Simulate FHE operations without needing a backend server"""
-    time.sleep(1.2)  # Simulate computation time
-    
-    if operation == "multiply":
-        return inputs[0] * inputs[1]
-    elif operation == "add":
-        return inputs[0] + inputs[1]
-    elif operation == "square":
-        return inputs[0] ** 2
-    elif operation == "compare":
-        return inputs[0] > inputs[1]
-    elif operation == "aggregate":
-        return {
-            "total": sum(inputs),
-            "average": sum(inputs) / len(inputs)
+class ComputeService:
+    """Owns the process pool and implements the HTTP handlers."""
+
+    def __init__(self, workers, timeout, backend="auto", warm=False, max_pending=None, sim_latency=None,
+                 job_timeout=600.0, max_jobs=1000, job_ttl=600.0, coalesce_window=0.0,
+                 coalesce_max_batch=fhe_core.BATCH_SIZE, compile_profile=None, parallelism_spec=None,
+                 threads=None, cpu_affinity="none", key_store=None,
+                 worker_key_cache_bytes=64 * 1024 * 1024):
+        self.workers = workers
+        self.key_store = key_store or KeyStore()
+        self.worker_key_cache_bytes = worker_key_cache_bytes
+        self.timeout = timeout
+        self.job_timeout = job_timeout
+        self.jobs = JobStore(max_jobs, job_ttl)
+        self.coalescer = None
+        if coalesce_window > 0:
+            self.coalescer = Coalescer(
+                lambda op, rows: self.submit(_compute_batch, op, rows, op=op),
+                coalesce_window, coalesce_max_batch,
+                run_single=lambda op, inputs: self.submit(_compute, op, inputs, op=op))
+        self._job_tasks = set()
+        self.backend = backend
+        self.sim_latency = sim_latency or "zero"
+        self.max_pending = max_pending or workers * 16
+        self.pending = 0
+        self.started = time.time()
+        ctx = multiprocessing.get_context()
+        self.progress = ctx.Queue()
+        self._progress_thread = None
+        slices = parallelism.cpu_slices(workers) if cpu_affinity == "spread" else None
+        self.placement = {"parallelism": parallelism_spec or parallelism.DEFAULT_MODE, "threads": threads,
+                          "cpu_affinity": cpu_affinity, "cpu_slices": slices}
+        placement = (workers, parallelism_spec, threads, slices, ctx.Value("i", 0))
+        self.pool = ProcessPoolExecutor(
+            max_workers=workers, mp_context=ctx, initializer=_worker_init,
+            initargs=(backend, warm, sim_latency, self.progress, compile_profile, placement,
+                      worker_key_cache_bytes))
+
+    def start(self):
+        """Forward job progress from the workers onto the running event loop."""
+        loop = asyncio.get_running_loop()
+
+        def forward():
+            while True:
+                item = self.progress.get()
+                if item is None:
+                    return
+                loop.call_soon_threadsafe(self.jobs.progress, *item)
+
+        self._progress_thread = threading.Thread(target=forward, name="job-progress", daemon=True)
+        self._progress_thread.start()
+
+    async def submit(self, fn, *args, timeout=None, op=None):
+        """
+        Run `fn(*args)` in the pool. With `op` set, the worker's stage
+        timings and counters are merged into this process's registry.
+        """
+        if self.pending >= self.max_pending:
+            raise HTTPError(503, "Server busy, retry later", RETRY_AFTER)
+        loop = asyncio.get_running_loop()
+        self.pending += 1
+        try:
+            # a timed-out task keeps its worker busy until it finishes; the
+            # client just stops waiting for it
+            if op is None:
+                return await asyncio.wait_for(
+                    loop.run_in_executor(self.pool, fn, *args), timeout or self.timeout)
+            ok, value, events = await asyncio.wait_for(
+                loop.run_in_executor(self.pool, _instrumented, fn, op, time.time(), *args),
+                timeout or self.timeout)
+            REGISTRY.replay(events)
+            if not ok:
+                raise value
+            return value
+        except asyncio.TimeoutError:
+            fhe_core.ERRORS.inc(op=op or "internal", kind="timeout")
+            raise HTTPError(504, f"Computation exceeded {timeout or self.timeout}s")
+        finally:
+            self.pending -= 1
+
+    async def compute(self, request):
+        if request.headers.get("content-type", "").startswith(wire.CONTENT_TYPE):
+            return await self.compute_encrypted(request)
+        op, inputs, options = parse_compute_request(request.json())
+        try:
+            if self._coalescable(op, inputs, options):
+                # plaintext requests all run under the server's keys, so the op alone is the batch key
+                result, server_time, batch_size = await self.coalescer.submit(op, op, inputs)
+                return json_response({"ok": True, "result": result, "server_time": round(server_time, 6),
+                                      "batch_size": batch_size})
+            result, server_time = await self.submit(_compute, op, inputs, options, op=op)
+        except ValueError as e:
+            raise HTTPError(400, str(e))
+        return json_response({"ok": True, "result": result, "server_time": round(server_time, 6)})
+
+    def _coalescable(self, op, inputs, options=None):
+        if self.coalescer is None or op not in fhe_core.BATCH_OPS or options:
+            return False
+        return len(inputs) == len(fhe_core.BATCH_OPS[op][1])
+
+    async def compute_encrypted(self, request):
+        """
+        Binary-frame request: header {"op", "evaluation_keys": true,
+        "accept_codecs": [...]}, values [evaluation keys, *ciphertexts], or
+        header {"op", "session": id}, values [*ciphertexts] once the keys were
+        uploaded to /sessions.
+        Replies with a frame when the client's Accept header asks for one,
+        otherwise JSON with the result base64-encoded.
+        """
+        try:
+            header, values = wire.decode_frame(request.body)
+        except wire.FrameError as e:
+            raise HTTPError(400, str(e))
+        op = header.get("op", "")
+        if not isinstance(op, str) or not _OP_NAME.match(op):
+            raise HTTPError(400, "Missing or invalid 'op'")
+        session_id = header.get("session")
+        try:
+            if session_id is not None:
+                if not values:
+                    raise HTTPError(400, "Frame must carry ciphertexts")
+                result, server_time = await self._compute_in_session(op, session_id, values)
+            else:
+                if not header.get("evaluation_keys") or len(values) < 2:
+                    raise HTTPError(400, "Frame must carry evaluation keys followed by ciphertexts")
+                result, server_time = await self.submit(_compute_encrypted, op, values[0], values[1:], op=op)
+        except ValueError as e:
+            raise HTTPError(400, str(e))
+
+        reply = {"ok": True, "server_time": round(server_time, 6), "request_bytes": len(request.body)}
+        if wire.accepts_frames(request.headers.get("accept")):
+            codec = wire.pick_codec(header.get("accept_codecs"))
+            return Response(wire.encode_frame(reply, [result], codec), content_type=wire.CONTENT_TYPE)
+        return json_response({**reply, "result": base64.b64encode(result).decode("ascii")})
+
+    async def _compute_in_session(self, op, session_id, values):
+        await self._session(session_id)
+        try:
+            return await self.submit(_compute_encrypted, op, None, values, session_id, op=op)
+        except KeysNeeded:
+            # the worker that picked this up hasn't seen the session yet
+            try:
+                key_blob = await self._key_store(self.key_store.get, session_id)
+            except SessionNotFound:
+                raise HTTPError(404, "Unknown or expired session")
+            return await self.submit(_compute_encrypted, op, key_blob, values, session_id, op=op)
+
+    # ---------- Sessions ----------
+    async def _key_store(self, fn, *args):
+        """
+        Run a KeyStore call in the default thread pool: spilling, reloading
+        and expiring sessions read and write key files, which must not stall
+        the event loop.
+        """
+        return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+    async def _session(self, session_id):
+        """Touch `session_id`; 404 when it is unknown or expired."""
+        if not valid_session_id(session_id):
+            raise HTTPError(400, "Invalid session id")
+        try:
+            await self._key_store(self.key_store.touch, session_id)
+        except SessionNotFound:
+            raise HTTPError(404, "Unknown or expired session")
+
+    async def create_session(self, request):
+        """
+        Upload evaluation keys once: a frame whose single value is the keys
+        (header may carry "client": a label), or the raw serialized keys.
+        """
+        meta = {}
+        if request.headers.get("content-type", "").startswith(wire.CONTENT_TYPE):
+            try:
+                header, values = wire.decode_frame(request.body)
+            except wire.FrameError as e:
+                raise HTTPError(400, str(e))
+            if len(values) != 1:
+                raise HTTPError(400, "Frame must carry exactly the evaluation keys")
+            blob = values[0]
+            if isinstance(header.get("client"), str):
+                meta["client"] = header["client"][:128]
+        else:
+            blob = request.body
+        if not blob:
+            raise HTTPError(400, "Missing evaluation keys")
+        try:
+            session_id = await self._key_store(self.key_store.create, blob, meta)
+        except KeyStoreFull as e:
+            raise HTTPError(413, str(e))
+        return json_response({"ok": True, "session_id": session_id, "bytes": len(blob),
+                              "ttl": self.key_store.ttl}, status=201)
+
+    async def session_status(self, request):
+        await self._session(request.params["session_id"])
+        return json_response({"ok": True, **self.key_store.describe(request.params["session_id"])})
+
+    async def close_session(self, request):
+        session_id = request.params["session_id"]
+        if not valid_session_id(session_id):
+            raise HTTPError(400, "Invalid session id")
+        try:
+            await self._key_store(self.key_store.close, session_id)
+        except SessionNotFound:
+            raise HTTPError(404, "Unknown or expired session")
+        return json_response({"ok": True})
+
+    async def batch(self, request):
+        op, rows = parse_batch_request(request.json())
+        try:
+            results, server_time = await self.submit(_compute_batch, op, rows, op=op)
+        except ValueError as e:
+            raise HTTPError(400, str(e))
+        return json_response({"ok": True, "results": results, "server_time": round(server_time, 6)})
+
+    # ---------- Jobs ----------
+    async def submit_job(self, request):
+        """`POST /jobs` with a /compute body, or a /batch body (`rows`); replies 202 at once."""
+        data = request.json()
+        options = None
+        if isinstance(data, dict) and "rows" in data:
+            kind, (op, payload) = "batch", parse_batch_request(data)
+        else:
+            kind, (op, payload, options) = "compute", parse_compute_request(data)
+        try:
+            job = self.jobs.create(kind, op)
+        except JobStoreFull as e:
+            raise HTTPError(503, str(e), RETRY_AFTER)
+        task = asyncio.create_task(self._run_job(job.id, kind, op, payload, options))
+        self._job_tasks.add(task)
+        task.add_done_callback(self._job_tasks.discard)
+        return json_response({"ok": True, "job_id": job.id, "status_url": f"/jobs/{job.id}",
+                              "events_url": f"/jobs/{job.id}/events"}, status=202)
+
+    async def _run_job(self, job_id, kind, op, payload, options=None):
+        try:
+            result, _ = await self.submit(_run_job, job_id, kind, op, payload, options,
+                                          timeout=self.job_timeout, op=op)
+        except HTTPError as e:
+            self.jobs.fail(job_id, e.message)
+        except ValueError as e:
+            self.jobs.fail(job_id, str(e))
+        except Exception as e:
+            self.jobs.fail(job_id, f"{type(e).__name__}: {e}")
+        else:
+            self.jobs.finish(job_id, result)
+        job = self.jobs.get(job_id)
+        if job is not None:
+            JOBS.inc(state=job.state)
+
+    def _job(self, request):
+        job = self.jobs.get(request.params["job_id"])
+        if job is None:
+            raise HTTPError(404, "Unknown or expired job")
+        return job
+
+    async def job_status(self, request):
+        return json_response({"ok": True, **self._job(request).to_dict()})
+
+    async def job_events(self, request):
+        """Server-sent events: one `progress` event per change, then `done` or `failed`."""
+        job = self._job(request)
+
+        async def events():
+            seq = -1
+            while True:
+                if job.seq != seq:
+                    seq = job.seq
+                    event = job.state if job.state in FINISHED else "progress"
+                    yield f"id: {seq}\nevent: {event}\ndata: {json.dumps(job.to_dict())}\n\n".encode("utf-8")
+                    if job.state in FINISHED:
+                        return
+                await job.wait(seq, 15.0)
+                if job.seq == seq:
+                    yield b": keep-alive\n\n"
+
+        return StreamResponse(events())
+
+    async def config(self, request):
+        """What this server accepts, so front ends don't hard-code its configuration."""
+        return json_response({
+            "ok": True,
+            "ops": list(fhe_core.OPERATIONS),
+            "histogram_edge_sets": [list(edges) for edges in fhe_core.HIST_EDGE_SETS],
+        })
+
+    async def health(self, request):
+        body = {
+            "ok": True,
+            "backend": self.backend,
+            "sim_latency": self.sim_latency,
+            "workers": self.workers,
+            "pending": self.pending,
+            "jobs": self.jobs.stats(),
+            "coalescer": self.coalescer.stats() if self.coalescer else None,
+            "placement": self.placement,
+            "sessions": {
+                **self.key_store.stats(),
+                "worker_cache_max_bytes": self.worker_key_cache_bytes,
+                # store budget plus every worker's deserialized copies
+                "key_memory_ceiling_bytes": self.key_store.max_bytes + self.workers * self.worker_key_cache_bytes,
+            },
+            "uptime": round(time.time() - self.started, 1),
         }
-    return None
-
-# --------------------------------
-# DEMO LOGIC
-# --------------------------------
-if demo == "Secure Multiplication":
-    st.subheader("Multiply two numbers securely 🔢")
-    a = st.number_input("Number A", 0, 100, 3)
-    b = st.number_input("Number B", 0, 100, 5)
-    
-    if st.button("Run Secure Multiplication"):
-        with st.spinner("Performing secure (simulated) multiplication..."):
-            result = simulate_fhe_operation("multiply", [a, b])
-        st.success(f"Encrypted computation result: {a} × {b} = {result}")
-
-elif demo == "Encrypted Addition":
-    st.subheader("Add two numbers privately ➕")
-    x = st.number_input("Number X", 0, 100, 4)
-    y = st.number_input("Number Y", 0, 100, 6)
-    
-    if st.button("Run Secure Addition"):
-        with st.spinner("Performing secure (simulated) addition..."):
-            result = simulate_fhe_operation("add", [x, y])
-        st.success(f"Encrypted computation result: {x} + {y} = {result}")
-
-elif demo == "Square Function":
-    st.subheader("Compute a square securely 🧮")
-    x = st.number_input("Enter a number", 0, 100, 6)
-    
-    if st.button("Run Secure Square"):
-        with st.spinner("Performing secure (simulated) squaring..."):
-            result = simulate_fhe_operation("square", [x])
-        st.success(f"Encrypted computation result: {x}² = {result}")
-
-elif demo == "Private Comparison":
-    st.subheader("Compare values privately ⚖️")
-    a = st.number_input("Value A", 0, 100, 10)
-    b = st.number_input("Value B", 0, 100, 5)
-    
-    if st.button("Run Secure Comparison"):
-        with st.spinner("Performing secure (simulated) comparison..."):
-            result = simulate_fhe_operation("compare", [a, b])
-        st.success("✅ A is greater than B" if result else "❌ A is not greater than B")
-
-elif demo == "Aggregate Balances":
-    st.subheader("Aggregate Wallet Balances 💰")
-    st.caption("Compute total and average balances securely — simulated for demo purposes.")
-    
-    n = st.slider("Number of wallets", 2, 10, 4)
-    balances = [st.number_input(f"Wallet {i+1}", 0, 1000, 100*(i+1)) for i in range(n)]
-    
-    if st.button("Run Secure Aggregation"):
-        with st.spinner("Encrypting and computing securely (simulated)..."):
-            for progress in range(0, 101, 20):
-                st.progress(progress)
-                time.sleep(0.3)
-            result = simulate_fhe_operation("aggregate", balances)
-        st.success(f"🔢 Total: {result['total']} | ⚖️ Average: {result['average']:.2f}")
-        st.balloons()
-
-    with st.expander("🧩 How FHE protects your data"):
-        st.markdown("""
-        **Step 1:** Each wallet balance is encrypted — unreadable even to the server.  
-        **Step 2:** The server adds them while still encrypted.  
-        **Step 3:** Only your private key decrypts the final result.  
-
-        > This live demo simulates that flow safely without heavy backend load.
-        """)
-        st.image("https://cdn-icons-png.flaticon.com/512/11496/11496031.png", width=400)
-
-# --------------------------------
-# FOOTER
-# --------------------------------
-st.divider()
-st.caption("🔐 Simulated Fully Homomorphic Encryption (FHE) Demo")
-st.caption("Built with ❤️ using Streamlit — © 2025 Privagator Project")
\ No newline at end of file
+        if request.query.get("details"):
+            body["readiness"] = await self.submit(_worker_readiness, timeout=5)
+        return json_response(body)
+
+    async def metrics(self, request):
+        if request.query.get("format") == "json":
+            return json_response(fhe_core.metrics_snapshot())
+        return Response(REGISTRY.render().encode("utf-8"), content_type="text/plain; version=0.0.4")
+
+    def _counted(self, route, handler):
+        async def wrapped(request):
+            try:
+                response = await handler(request)
+            except HTTPError as e:
+                HTTP_REQUESTS.inc(route=route, status=e.status)
+                raise
+            except Exception:
+                HTTP_REQUESTS.inc(route=route, status=500)
+                raise
+            HTTP_REQUESTS.inc(route=route, status=response.status)
+            return response
+        return wrapped
+
+    def routes(self):
+        router = Router()
+        router.add("POST", "/compute", self._counted("/compute", self.compute))
+        router.add("POST", "/batch", self._counted("/batch", self.batch))
+        router.add("GET", "/health", self._counted("/health", self.health))
+        router.add("GET", "/config", self._counted("/config", self.config))
+        router.add("POST", "/jobs", self._counted("/jobs", self.submit_job))
+        router.add("GET", "/jobs/{job_id}", self._counted("/jobs/{id}", self.job_status))
+        router.add("GET", "/jobs/{job_id}/events", self._counted("/jobs/{id}/events", self.job_events))
+        router.add("POST", "/sessions", self._counted("/sessions", self.create_session))
+        router.add("GET", "/sessions/{session_id}", self._counted("/sessions/{id}", self.session_status))
+        router.add("DELETE", "/sessions/{session_id}", self._counted("/sessions/{id}", self.close_session))
+        router.add("GET", "/metrics", self.metrics)
+        return router
+
+    def shutdown(self):
+        self.pool.shutdown(wait=True, cancel_futures=True)
+        self.progress.put(None)
+        if self._progress_thread is not None:
+            self._progress_thread.join(timeout=5)
+
+
+async def serve(args):
+    key_store = KeyStore(int(args.key_store_mb * 1024 * 1024), args.session_ttl, args.key_spill_dir)
+    worker_key_cache_bytes = int(args.worker_key_cache_mb * 1024 * 1024)
+    service = ComputeService(args.workers, args.timeout, args.backend, args.warm, args.max_pending,
+                             args.sim_latency, args.job_timeout, args.max_jobs, args.job_ttl,
+                             args.coalesce_window_ms / 1000.0, args.coalesce_max_batch, args.compile_profile,
+                             args.parallelism, args.threads, args.cpu_affinity, key_store, worker_key_cache_bytes)
+    service.start()
+    server = await HTTPServer(service.routes(), args.host, args.port).start()
+    print(f"🧠 Privagator compute server on http://{args.host}:{server.port} "
+          f"({args.workers} workers, backend={args.backend})")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:  # Windows
+            pass
+    await stop.wait()
+
+    print("🛑 Shutting down: draining in-flight requests...")
+    await server.close(grace=args.grace)
+    await loop.run_in_executor(None, service.shutdown)
+    print("✅ Server stopped.")
+
+
+def build_parser():
+    env = os.environ.get
+    parser = argparse.ArgumentParser(description="Privagator FHE compute server")
+    parser.add_argument("--host", default=env("PRIVAGATOR_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(env("PRIVAGATOR_PORT", "8765")))
+    parser.add_argument("--workers", type=int, default=int(env("PRIVAGATOR_WORKERS", os.cpu_count() or 1)),
+                        help="Process pool size (default: number of cores)")
+    parser.add_argument("--timeout", type=float, default=float(env("PRIVAGATOR_TIMEOUT", "60")),
+                        help="Per-request computation timeout in seconds")
+    parser.add_argument("--job-timeout", type=float, default=float(env("PRIVAGATOR_JOB_TIMEOUT", "600")),
+                        help="Computation timeout in seconds for jobs submitted to /jobs")
+    parser.add_argument("--max-jobs", type=int, default=1000, help="Jobs held at once, finished ones included")
+    parser.add_argument("--job-ttl", type=float, default=600.0,
+                        help="Seconds a finished job's result stays available")
+    parser.add_argument("--coalesce-window-ms", type=float,
+                        default=float(env("PRIVAGATOR_COALESCE_WINDOW_MS", "0")),
+                        help="Micro-batch concurrent scalar requests for the same op within this window "
+                             "(0 disables; each request waits at most this long)")
+    parser.add_argument("--coalesce-max-batch", type=int, default=fhe_core.BATCH_SIZE,
+                        help="Run a coalesced batch as soon as it holds this many requests")
+    parser.add_argument("--max-pending", type=int, default=None,
+                        help="Reject with 503 beyond this many queued computations (default: 16 per worker)")
+    parser.add_argument("--grace", type=float, default=30.0,
+                        help="Seconds to let in-flight requests finish on shutdown")
+    parser.add_argument("--backend", choices=fhe_core.BACKENDS, default=env("PRIVAGATOR_BACKEND", "auto"))
+    parser.add_argument("--sim-latency", choices=sim_backend.MODES, default=env("PRIVAGATOR_SIM_LATENCY", "zero"),
+                        help="Simulated backend: no added latency, or replay the measured latency profile")
+    parser.add_argument("--compile-profile", choices=list(PROFILES),
+                        default=env("PRIVAGATOR_COMPILE_PROFILE", DEFAULT_PROFILE),
+                        help="Error probability / inputset profile circuits are compiled with")
+    parser.add_argument("--parallelism", default=env("PRIVAGATOR_PARALLELISM", parallelism.DEFAULT_MODE),
+                        help="Intra-circuit parallelism: off, loop, dataflow or auto, optionally with "
+                             "per-op overrides such as 'loop,aggregate=dataflow'")
+    parser.add_argument("--threads", type=int, default=int(env("PRIVAGATOR_THREADS", "0")) or None,
+                        help="Threads per circuit evaluation in each worker "
+                             "(default: the worker's CPU slice, or cores / workers)")
+    parser.add_argument("--cpu-affinity", choices=("none", "spread"), default=env("PRIVAGATOR_CPU_AFFINITY", "none"),
+                        help="'spread' pins each worker to its own contiguous slice of the CPUs")
+    parser.add_argument("--key-store-mb", type=float, default=float(env("PRIVAGATOR_KEY_STORE_MB", "256")),
+                        help="Memory budget for session evaluation keys in the server process; least "
+                             "recently used sessions are spilled or dropped beyond it. Workers hold their "
+                             "own copies on top (see --worker-key-cache-mb), so session keys can take up "
+                             "to key-store-mb + workers x worker-key-cache-mb")
+    parser.add_argument("--session-ttl", type=float, default=float(env("PRIVAGATOR_SESSION_TTL", "3600")),
+                        help="Seconds an unused session's keys are kept")
+    parser.add_argument("--key-spill-dir", default=env("PRIVAGATOR_KEY_SPILL_DIR") or None,
+                        help="Spill evicted session keys to this local directory instead of dropping them")
+    parser.add_argument("--worker-key-cache-mb", type=float,
+                        default=float(env("PRIVAGATOR_WORKER_KEY_CACHE_MB", "64")),
+                        help="Per-worker budget for deserialized session keys, counted by serialized "
+                             "size; least recently used keys are dropped beyond it")
+    parser.add_argument("--warm", action="store_true", help="Compile all circuits when each worker starts")
+    return parser
+
+
+if __name__ == "__main__":
+    asyncio.run(serve(build_parser().parse_args()))
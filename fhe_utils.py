@@ -1,49 +1,72 @@
-from concrete import fhe
+from modules.circuit_registry import CircuitRegistry, load_concrete
+from modules.compile_profiles import get_profile
 
 # -----------------------------
 # FHE Functions (Add, Sub, Mul)
 # -----------------------------
-@fhe.compiler({"x": "encrypted", "y": "encrypted"})
+# Plain functions; concrete is imported and each one compiled the first time
+# the matching operation is requested.
 def fhe_add(x, y):
     return x + y
 
-@fhe.compiler({"x": "encrypted", "y": "encrypted"})
 def fhe_subtract(x, y):
     return x - y
 
-@fhe.compiler({"x": "encrypted", "y": "encrypted"})
 def fhe_multiply(x, y):
     return x * y
 
 # -----------------------------
-# Compile the functions
+# Lazily compiled circuits
 # -----------------------------
-inputset = [(a, b) for a in range(0, 16) for b in range(0, 16)]
-compiled_add = fhe_add.compile(inputset)
-compiled_subtract = fhe_subtract.compile(inputset)
-compiled_multiply = fhe_multiply.compile(inputset)
+# Both inputs are bounded to 0..15; the active compile profile
+# (PRIVAGATOR_COMPILE_PROFILE) turns that into an inputset and configuration.
+BOUNDS = [(0, 15), (0, 15)]
+
+def _inputset():
+    return get_profile().inputset(BOUNDS)
+
+def _configuration():
+    return get_profile().configuration(load_concrete())
+
+_ENCRYPTED = {"x": "encrypted", "y": "encrypted"}
+
+CIRCUITS = CircuitRegistry("fhe_utils")
+CIRCUITS.register("add", fhe_add, _ENCRYPTED, _inputset, _configuration)
+CIRCUITS.register("subtract", fhe_subtract, _ENCRYPTED, _inputset, _configuration)
+CIRCUITS.register("multiply", fhe_multiply, _ENCRYPTED, _inputset, _configuration)
+
+OPERATIONS = {
+    "Encrypt & Add": "add",
+    "Encrypt & Subtract": "subtract",
+    "Encrypt & Multiply": "multiply",
+}
+
+def warm_up(background=True):
+    """Compile every circuit ahead of first use."""
+    return CIRCUITS.warm_up(background=background)
+
+def readiness():
+    return CIRCUITS.readiness()
 
 # -----------------------------
 # Encryption Routines
 # -----------------------------
-def run_fhe_operation(a, b, op):
+def run_fhe_operation(a, b, op, pool=None):
     """
     Run an encrypted computation based on selected operation.
+    With `pool` (a modules.circuit_pool.CircuitPool) the shared circuit is
+    used under its per-circuit guard.
     """
-    if op == "Encrypt & Add":
-        encrypted = compiled_add.encrypt(a, b)
-        result = compiled_add.run(encrypted)
-        return compiled_add.decrypt(result)
-
-    elif op == "Encrypt & Subtract":
-        encrypted = compiled_subtract.encrypt(a, b)
-        result = compiled_subtract.run(encrypted)
-        return compiled_subtract.decrypt(result)
-
-    elif op == "Encrypt & Multiply":
-        encrypted = compiled_multiply.encrypt(a, b)
-        result = compiled_multiply.run(encrypted)
-        return compiled_multiply.decrypt(result)
-
-    else:
+    name = OPERATIONS.get(op)
+    if name is None:
         return None
+    for value, (lo, hi) in zip((a, b), BOUNDS):
+        if not lo <= value <= hi:
+            raise ValueError(f"inputs must be within {lo}..{hi}")
+
+    if pool is not None:
+        return pool.run(CIRCUITS.label, name, a, b)
+    circuit = CIRCUITS.get(name)
+    encrypted = circuit.encrypt(a, b)
+    result = circuit.run(*encrypted)
+    return circuit.decrypt(result)
@@ -0,0 +1,362 @@
+"""
+Load generator for the compute server's `/compute` contract.
+
+    python loadtest.py --local --concurrency 16 --duration 30
+    python loadtest.py --url http://127.0.0.1:8765 --mode open --rate 200 --mix add=4,multiply=2,aggregate=1
+    python loadtest.py --local --via jobs --dist skewed --output capacity.json
+
+Two ways to drive the server:
+
+    closed  `--concurrency` clients each send a request, wait for the reply,
+            optionally pause `--think-time`, and repeat. Throughput is whatever
+            the server sustains at that concurrency.
+    open    requests arrive at `--rate` per second (Poisson, or evenly spaced
+            with `--arrivals uniform`) whether or not earlier ones finished,
+            over at most `--concurrency` connections. Latency is measured from
+            each request's scheduled arrival, so time spent queued behind a
+            slow server counts.
+
+`--mix` weights the ops; `--dist` picks the input values (uniform over the
+range, skewed towards small values, or always the maximum, i.e. the widest
+bit-width tier). `--via jobs` submits and polls jobs the way
+`streamlit_app.call_server` does instead of calling `/compute` directly.
+`--local` starts `fhe_server.py --backend simulated` on a free port for the
+run, so no network or concrete install is needed.
+
+The JSON report has p50/p95/p99 latency, throughput and error rate overall
+and per op, plus the configuration and environment, for tracking capacity
+over time.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from benchmark_fhe import environment
+from fhe_client import SERVER_URL, AsyncFHEClient, FHEClientError, FHETimeout
+from modules import fhe_core, sim_backend
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_MIX = "add=4,multiply=2,square=1,compare=1,aggregate=1"
+DISTRIBUTIONS = ("uniform", "skewed", "max")
+SCALAR_ARITY = {op: len(enc) for op, (_, enc) in fhe_core.BATCH_OPS.items()}
+
+
+# -----------------------------
+# Workload
+# -----------------------------
+def parse_mix(spec):
+    """{op: probability} from "add=4,multiply=2,aggregate" (weight 1 when omitted)."""
+    weights = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        op, _, weight = part.partition("=")
+        op = op.strip()
+        if op not in fhe_core.OPERATIONS:
+            raise ValueError(f"Unknown op '{op}' (expected one of {', '.join(fhe_core.OPERATIONS)})")
+        weights[op] = float(weight) if weight else 1.0
+        if weights[op] < 0:
+            raise ValueError(f"Weight of '{op}' must not be negative")
+    total = sum(weights.values())
+    if not total:
+        raise ValueError("The op mix is empty")
+    return {op: w / total for op, w in weights.items()}
+
+
+def draw(rng, dist, hi, size):
+    """`size` integers in 0..hi."""
+    if dist == "uniform":
+        return rng.integers(0, hi + 1, size)
+    if dist == "skewed":
+        return np.minimum(rng.zipf(1.5, size) - 1, hi)
+    if dist == "max":
+        return np.full(size, hi)
+    raise ValueError(f"Unknown distribution '{dist}' (expected one of {', '.join(DISTRIBUTIONS)})")
+
+
+class Workload:
+    """Random (op, inputs, options) requests following the op mix and input distribution."""
+
+    def __init__(self, mix, dist="uniform", max_value=None, rows=64, k=3, seed=0):
+        self.ops = list(mix)
+        self.weights = [mix[op] for op in self.ops]
+        self.dist = dist
+        self.max_value = max_value if max_value is not None else fhe_core.tier_max(fhe_core.TIERS[0])
+        self.rows = rows
+        self.k = k
+        self.rng = np.random.default_rng(seed)
+
+    def next(self):
+        op = self.ops[self.rng.choice(len(self.ops), p=self.weights)]
+        options = {}
+        if op in SCALAR_ARITY:
+            inputs = draw(self.rng, self.dist, self.max_value, SCALAR_ARITY[op])
+        elif op in ("aggregate", "histogram"):
+            inputs = draw(self.rng, self.dist, fhe_core.AGG_MAX_BALANCE, self.rows)
+        else:
+            size = min(self.rows, fhe_core.RANK_SIZE)
+            inputs = draw(self.rng, self.dist, self.max_value, size)
+            if op == "topk":
+                options["k"] = min(self.k, size)
+        return op, [int(v) for v in inputs], options
+
+
+# -----------------------------
+# Driving the server
+# -----------------------------
+def _error_kind(e):
+    if isinstance(e, FHETimeout):
+        return "timeout"
+    if isinstance(e, FHEClientError):
+        if e.status is not None:
+            return f"http_{e.status}"
+        if not str(e).startswith("Connection failed"):
+            return "failed"  # a job that ran and failed
+    return "connection"
+
+
+class Recorder:
+    """Outcomes of requests scheduled inside the measurement window."""
+
+    def __init__(self):
+        self.samples = []  # (op, seconds, error kind or None)
+
+    def add(self, op, seconds, error=None):
+        self.samples.append((op, seconds, error))
+
+
+async def _send(client, via, op, inputs, options):
+    if via == "jobs":
+        job_id = await client.submit_job(op, inputs, **options)
+        return await client.wait_job(job_id, poll_interval=0.3, timeout=client.timeout_for(op))
+    return await client.compute(op, inputs, **options)
+
+
+async def _timed(client, via, workload_request, scheduled, recorder, measure_from):
+    op, inputs, options = workload_request
+    try:
+        await _send(client, via, op, inputs, options)
+        error = None
+    except Exception as e:
+        error = _error_kind(e)
+    if scheduled >= measure_from:
+        recorder.add(op, time.perf_counter() - scheduled, error)
+
+
+async def run_closed(client, workload, args, recorder):
+    start = time.perf_counter()
+    measure_from, deadline = start + args.warmup, start + args.warmup + args.duration
+
+    async def user():
+        while time.perf_counter() < deadline:
+            await _timed(client, args.via, workload.next(), time.perf_counter(), recorder, measure_from)
+            if args.think_time:
+                await asyncio.sleep(args.think_time)
+
+    await asyncio.gather(*(user() for _ in range(args.concurrency)))
+    return measure_from, deadline
+
+
+async def run_open(client, workload, args, recorder):
+    rng = np.random.default_rng(args.seed + 1)
+    start = time.perf_counter()
+    measure_from, deadline = start + args.warmup, start + args.warmup + args.duration
+    tasks, dropped = set(), 0
+    arrival = start
+    while True:
+        gap = rng.exponential(1.0 / args.rate) if args.arrivals == "poisson" else 1.0 / args.rate
+        arrival += gap
+        if arrival >= deadline:
+            break
+        delay = arrival - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if len(tasks) >= args.max_outstanding:
+            # the client itself is saturated; count it rather than let memory grow without bound
+            if arrival >= measure_from:
+                dropped += 1
+            continue
+        task = asyncio.create_task(_timed(client, args.via, workload.next(), arrival, recorder, measure_from))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    if tasks:
+        await asyncio.gather(*tasks)
+    return measure_from, deadline, dropped
+
+
+def summarize(samples, seconds):
+    latencies = np.array([s for _, s, error in samples if error is None], dtype=float)
+    errors = {}
+    for _, _, error in samples:
+        if error is not None:
+            errors[error] = errors.get(error, 0) + 1
+    summary = {
+        "requests": len(samples),
+        "ok": int(latencies.size),
+        "errors": errors,
+        "error_rate": round(sum(errors.values()) / len(samples), 4) if samples else 0.0,
+        "throughput_rps": round(latencies.size / seconds, 2) if seconds > 0 else None,
+    }
+    if latencies.size:
+        summary["latency_s"] = {
+            "mean": float(latencies.mean()),
+            "p50": float(np.percentile(latencies, 50)),
+            "p95": float(np.percentile(latencies, 95)),
+            "p99": float(np.percentile(latencies, 99)),
+            "max": float(latencies.max()),
+        }
+    return summary
+
+
+async def run_load(url, args):
+    client = AsyncFHEClient(url, max_in_flight=args.concurrency, retries=0, timeout=args.timeout)
+    workload = Workload(parse_mix(args.mix), args.dist, args.max_value, args.rows, args.k, args.seed)
+    recorder = Recorder()
+    try:
+        server = await client.health()
+        if args.mode == "open":
+            measure_from, deadline, dropped = await run_open(client, workload, args, recorder)
+        else:
+            (measure_from, deadline), dropped = await run_closed(client, workload, args, recorder), 0
+        finished = time.perf_counter()
+    finally:
+        await client.close()
+
+    # requests still running at the deadline finish and count, so the window stretches to the last of them
+    seconds = max(deadline, finished) - measure_from
+    results = {"overall": summarize(recorder.samples, seconds), "ops": {}}
+    if args.mode == "open":
+        results["overall"]["offered_rps"] = args.rate
+        results["overall"]["dropped"] = dropped
+    for op in workload.ops:
+        results["ops"][op] = summarize([s for s in recorder.samples if s[0] == op], seconds)
+    results["overall"]["window_s"] = round(seconds, 3)
+    return server, results
+
+
+# -----------------------------
+# Local stand-in server
+# -----------------------------
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class LocalServer:
+    """`fhe_server.py --backend simulated` on a free port for the duration of a `with` block."""
+
+    def __init__(self, workers, sim_latency="zero", extra_args=(), startup_timeout=30.0):
+        self.port = _free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.command = [sys.executable, os.path.join(BASE_DIR, "fhe_server.py"), "--backend", "simulated",
+                        "--host", "127.0.0.1", "--port", str(self.port), "--workers", str(workers),
+                        "--sim-latency", sim_latency, *extra_args]
+        self.startup_timeout = startup_timeout
+        self.process = None
+
+    def __enter__(self):
+        self.process = subprocess.Popen(self.command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        deadline = time.monotonic() + self.startup_timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"Local server exited: {self.process.stderr.read().decode(errors='replace')}")
+            try:
+                with socket.create_connection(("127.0.0.1", self.port), timeout=0.5):
+                    return self
+            except OSError:
+                time.sleep(0.1)
+        self.__exit__()
+        raise RuntimeError(f"Local server did not start within {self.startup_timeout}s")
+
+    def __exit__(self, *exc):
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+
+
+# -----------------------------
+# CLI
+# -----------------------------
+def build_parser():
+    parser = argparse.ArgumentParser(description="Load-test the Privagator compute server")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--url", default=SERVER_URL, help="Server to test")
+    target.add_argument("--local", action="store_true",
+                        help="Start a simulated-backend server on a free port for this run")
+    parser.add_argument("--local-workers", type=int, default=os.cpu_count() or 1,
+                        help="Worker processes of the --local server")
+    parser.add_argument("--local-args", default="",
+                        help="Extra fhe_server.py arguments for the --local server, e.g. \"--coalesce-window-ms 2\"")
+    parser.add_argument("--sim-latency", choices=sim_backend.MODES, default="zero",
+                        help="Latency model of the --local server")
+    parser.add_argument("--mode", choices=("closed", "open"), default="closed")
+    parser.add_argument("--concurrency", type=int, default=8,
+                        help="Closed loop: concurrent clients. Open loop: connections")
+    parser.add_argument("--rate", type=float, default=50.0, help="Open loop: requests per second")
+    parser.add_argument("--arrivals", choices=("poisson", "uniform"), default="poisson",
+                        help="Open loop: arrival process")
+    parser.add_argument("--max-outstanding", type=int, default=10000,
+                        help="Open loop: requests in flight before new arrivals are dropped")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Closed loop: pause between requests (s)")
+    parser.add_argument("--duration", type=float, default=10.0, help="Measured seconds")
+    parser.add_argument("--warmup", type=float, default=2.0, help="Unmeasured seconds before the measurement")
+    parser.add_argument("--via", choices=("compute", "jobs"), default="compute",
+                        help="POST /compute, or submit and poll /jobs like streamlit_app")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Op weights, e.g. add=4,multiply=2,aggregate=1")
+    parser.add_argument("--dist", choices=DISTRIBUTIONS, default="uniform", help="Input value distribution")
+    parser.add_argument("--max-value", type=int, default=None,
+                        help="Largest scalar/ranking input (default: top of the smallest tier)")
+    parser.add_argument("--rows", type=int, default=64, help="Balances per aggregate/histogram/ranking request")
+    parser.add_argument("--k", type=int, default=3, help="k of topk requests")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout (s)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.mode == "open" and args.rate <= 0:
+        raise SystemExit("--rate must be positive")
+
+    def run(url):
+        print(f"🚦 {args.mode}-loop load on {url} for {args.duration:g}s "
+              f"(+{args.warmup:g}s warm-up), mix {args.mix}", file=sys.stderr)
+        return asyncio.run(run_load(url, args))
+
+    if args.local:
+        with LocalServer(args.local_workers, args.sim_latency, args.local_args.split()) as local:
+            server, results = run(local.url)
+    else:
+        server, results = run(args.url)
+
+    config = {k: v for k, v in vars(args).items() if k != "output"}
+    report = {"meta": environment(), "config": config, "server": server, "results": results}
+    overall = results["overall"]
+    latency = overall.get("latency_s", {})
+    print(f"📈 {overall['throughput_rps']} req/s, error rate {overall['error_rate']:.2%}, "
+          f"p50 {latency.get('p50', 0) * 1000:.1f} ms, p99 {latency.get('p99', 0) * 1000:.1f} ms",
+          file=sys.stderr)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"📄 Report written to {args.output}", file=sys.stderr)
+    else:
+        print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,354 @@
+"""
+Minimal HTTP/1.1 plumbing on top of asyncio streams.
+
+Just enough HTTP for the compute server (request parsing with Content-Length
+bodies, keep-alive connections, JSON and chunked streaming responses, and a
+tiny path router) and
+for the async client (a keep-alive connection pool). It keeps both free of
+web-framework dependencies.
+"""
+
+import asyncio
+import json
+import re
+from urllib.parse import parse_qsl, urlsplit
+
+
+MAX_HEADER_BYTES = 64 * 1024
+
+REASONS = {
+    200: "OK", 201: "Created", 202: "Accepted", 204: "No Content", 400: "Bad Request", 404: "Not Found",
+    405: "Method Not Allowed", 406: "Not Acceptable", 411: "Length Required",
+    413: "Payload Too Large", 415: "Unsupported Media Type", 500: "Internal Server Error",
+    503: "Service Unavailable", 504: "Gateway Timeout",
+}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.headers = headers or {}
+
+
+class Request:
+    def __init__(self, method, target, version, headers, body):
+        self.method = method
+        self.version = version
+        self.headers = headers
+        self.body = body
+        parts = urlsplit(target)
+        self.path = parts.path
+        self.query = dict(parse_qsl(parts.query))
+        self.params = {}
+
+    @property
+    def keep_alive(self):
+        conn = self.headers.get("connection", "").lower()
+        if self.version == "HTTP/1.0":
+            return conn == "keep-alive"
+        return conn != "close"
+
+    def json(self):
+        try:
+            return json.loads(self.body or b"null")
+        except ValueError:
+            raise HTTPError(400, "Request body is not valid JSON")
+
+
+class Response:
+    def __init__(self, body=b"", status=200, content_type="application/json", headers=None):
+        self.body = body
+        self.status = status
+        self.content_type = content_type
+        self.headers = headers or {}
+
+
+class StreamResponse(Response):
+    """Response whose body is an async iterator of bytes, sent chunked as it is produced."""
+
+    def __init__(self, chunks, status=200, content_type="text/event-stream", headers=None):
+        super().__init__(b"", status, content_type, headers)
+        self.chunks = chunks
+
+
+def json_response(obj, status=200, headers=None):
+    return Response(json.dumps(obj).encode("utf-8"), status=status, headers=headers)
+
+
+async def read_request(reader, max_body):
+    """Read one request off the stream; None on a cleanly closed connection."""
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError as e:
+        if not e.partial:
+            return None
+        raise HTTPError(400, "Truncated request")
+    except asyncio.LimitOverrunError:
+        raise HTTPError(413, "Request headers too large")
+
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, target, version = lines[0].split(" ", 2)
+    except ValueError:
+        raise HTTPError(400, "Malformed request line")
+    headers = {}
+    for line in lines[1:]:
+        if not line:
+            continue
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        raise HTTPError(411, "Chunked request bodies are not supported")
+    length = headers.get("content-length", "0") or "0"
+    if not (length.isascii() and length.isdigit()):
+        raise HTTPError(400, "Invalid Content-Length")
+    length = int(length)
+    if length > max_body:
+        raise HTTPError(413, f"Request body exceeds {max_body} bytes")
+    try:
+        body = await reader.readexactly(length) if length else b""
+    except asyncio.IncompleteReadError:
+        raise HTTPError(400, "Truncated request body")
+    return Request(method.upper(), target, version, headers, body)
+
+
+async def write_response(writer, response, keep_alive):
+    reason = REASONS.get(response.status, "")
+    streaming = isinstance(response, StreamResponse)
+    headers = {"Content-Type": response.content_type}
+    if streaming:
+        headers["Transfer-Encoding"] = "chunked"
+        headers["Cache-Control"] = "no-cache"
+    else:
+        headers["Content-Length"] = str(len(response.body))
+    headers["Connection"] = "keep-alive" if keep_alive else "close"
+    headers.update(response.headers)
+    head = f"HTTP/1.1 {response.status} {reason}\r\n"
+    head += "".join(f"{k}: {v}\r\n" for k, v in headers.items())
+    writer.write(head.encode("latin-1") + b"\r\n" + response.body)
+    await writer.drain()
+    if streaming:
+        async for chunk in response.chunks:
+            if chunk:
+                writer.write(f"{len(chunk):x}\r\n".encode("latin-1") + chunk + b"\r\n")
+                await writer.drain()
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+
+class Router:
+    """Maps (method, path pattern) to async handlers; `{name}` captures a segment."""
+
+    def __init__(self):
+        self._routes = []
+
+    def add(self, method, pattern, handler):
+        regex = re.compile("^" + re.sub(r"\{(\w+)\}", r"(?P<\1>[^/]+)", pattern) + "$")
+        self._routes.append((method.upper(), regex, handler))
+
+    def resolve(self, request):
+        allowed = False
+        for method, regex, handler in self._routes:
+            match = regex.match(request.path)
+            if not match:
+                continue
+            if method == request.method:
+                request.params = match.groupdict()
+                return handler
+            allowed = True
+        if allowed:
+            raise HTTPError(405, f"{request.method} not allowed on {request.path}")
+        raise HTTPError(404, f"No route for {request.path}")
+
+
+class HTTPServer:
+    """asyncio HTTP/1.1 server with keep-alive and graceful shutdown."""
+
+    def __init__(self, router, host="127.0.0.1", port=8765, max_body=64 * 1024 * 1024,
+                 keepalive_timeout=15.0):
+        self.router = router
+        self.host = host
+        self.port = port
+        self.max_body = max_body
+        self.keepalive_timeout = keepalive_timeout
+        self.in_flight = 0
+        self._server = None
+        self._connections = set()
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    async def start(self):
+        self._server = await asyncio.start_server(
+            self._handle_connection, self.host, self.port, limit=MAX_HEADER_BYTES)
+        if self.port == 0:
+            self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def _dispatch(self, request):
+        try:
+            handler = self.router.resolve(request)
+            return await handler(request)
+        except HTTPError as e:
+            return json_response({"ok": False, "error": e.message}, status=e.status, headers=e.headers)
+        except Exception as e:
+            return json_response({"ok": False, "error": f"{type(e).__name__}: {e}"}, status=500)
+
+    async def _handle_connection(self, reader, writer):
+        task = asyncio.current_task()
+        self._connections.add(task)
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(
+                        read_request(reader, self.max_body), self.keepalive_timeout)
+                except asyncio.TimeoutError:
+                    break
+                except HTTPError as e:
+                    await write_response(
+                        writer, json_response({"ok": False, "error": e.message}, status=e.status), False)
+                    break
+                if request is None:
+                    break
+
+                self.in_flight += 1
+                self._idle.clear()
+                try:
+                    response = await self._dispatch(request)
+                finally:
+                    self.in_flight -= 1
+                    if self.in_flight == 0:
+                        self._idle.set()
+                keep_alive = request.keep_alive and self._server.is_serving()
+                await write_response(writer, response, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._connections.discard(task)
+            writer.close()
+
+    async def close(self, grace=30.0):
+        """Stop accepting, let in-flight requests finish (up to `grace` s), then drop idle connections."""
+        if self._server is None:
+            return
+        self._server.close()
+        try:
+            await asyncio.wait_for(self._idle.wait(), grace)
+        except asyncio.TimeoutError:
+            pass
+        for task in list(self._connections):
+            task.cancel()
+        await self._server.wait_closed()
+
+
+# ---------- Client side ----------
+class ClientResponse:
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def json(self):
+        return json.loads(self.body or b"null")
+
+
+async def _read_chunked(reader):
+    body = bytearray()
+    while True:
+        size = int((await reader.readuntil(b"\r\n")).split(b";")[0].strip(), 16)
+        if size == 0:
+            await reader.readuntil(b"\r\n")
+            return bytes(body)
+        body += await reader.readexactly(size)
+        await reader.readexactly(2)
+
+
+async def read_response(reader):
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    status = int(lines[0].split(" ", 2)[1])
+    headers = {}
+    for line in lines[1:]:
+        if line:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        body = await _read_chunked(reader)
+    elif "content-length" in headers:
+        body = await reader.readexactly(int(headers["content-length"]))
+    else:
+        body = await reader.read()
+        headers["connection"] = "close"
+    return ClientResponse(status, headers, body)
+
+
+class AsyncConnectionPool:
+    """
+    Keep-alive HTTP/1.1 connections to one origin, reused across requests.
+    At most `max_connections` requests are in flight at once.
+    """
+
+    def __init__(self, base_url, max_connections=32):
+        parts = urlsplit(base_url)
+        self.scheme = parts.scheme or "http"
+        self.host = parts.hostname
+        self.port = parts.port or (443 if self.scheme == "https" else 80)
+        self.base_path = parts.path.rstrip("/")
+        self.max_connections = max_connections
+        self._idle = []
+        self._slots = asyncio.Semaphore(max_connections)
+        self.opened = 0
+        self.reused = 0
+
+    async def _connect(self):
+        ssl = self.scheme == "https" or None
+        self.opened += 1
+        return await asyncio.open_connection(self.host, self.port, ssl=ssl, limit=MAX_HEADER_BYTES)
+
+    async def _send(self, conn, method, path, body, headers, timeout):
+        reader, writer = conn
+        head = {
+            "Host": self.host if self.port in (80, 443) else f"{self.host}:{self.port}",
+            "Content-Length": str(len(body)),
+            "Connection": "keep-alive",
+        }
+        head.update(headers or {})
+        raw = f"{method} {self.base_path}{path} HTTP/1.1\r\n"
+        raw += "".join(f"{k}: {v}\r\n" for k, v in head.items())
+        writer.write(raw.encode("latin-1") + b"\r\n" + body)
+        await writer.drain()
+        return await asyncio.wait_for(read_response(reader), timeout)
+
+    async def request(self, method, path, body=b"", headers=None, timeout=None):
+        async with self._slots:
+            while True:
+                reused = bool(self._idle)
+                conn = self._idle.pop() if reused else await self._connect()
+                try:
+                    response = await self._send(conn, method, path, body, headers, timeout)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    conn[1].close()
+                    if reused:
+                        # the server closed an idle keep-alive connection; retry on a fresh one
+                        continue
+                    raise
+                except BaseException:
+                    conn[1].close()
+                    raise
+                if reused:
+                    self.reused += 1
+                break
+            if response.headers.get("connection", "").lower() == "close":
+                conn[1].close()
+            else:
+                self._idle.append(conn)
+            return response
+
+    async def close(self):
+        while self._idle:
+            _, writer = self._idle.pop()
+            writer.close()
@@ -0,0 +1,289 @@
+"""
+On-disk, content-addressed cache of compiled Concrete circuits.
+
+Compiling a circuit is by far the most expensive thing a fresh process does.
+Every compiled circuit is stored under a key derived from everything that
+influences the compiled artifact (function source, encryption statuses,
+inputset bounds, configuration and the concrete-python version), so a later
+process with the same inputs can load the saved server instead of compiling.
+
+Layout of the cache directory:
+
+    <key>.zip    server artifact written by `fhe.Server.save`
+    <key>.json   metadata (name, concrete version, size, created)
+
+Entries are evicted least-recently-used once the directory grows past the
+configured size cap. Entries written by another concrete-python version, or
+that fail to load, are removed automatically.
+"""
+
+import hashlib
+import inspect
+import json
+import os
+import textwrap
+import threading
+import time
+
+import numpy as np
+
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "privagator", "circuits")
+DEFAULT_MAX_MB = 512
+
+
+def concrete_version():
+    """Installed concrete-python version, or None when it isn't installed."""
+    try:
+        from importlib.metadata import version
+        return version("concrete-python")
+    except Exception:
+        return None
+
+
+def inputset_bounds(inputset):
+    """
+    Per-argument (min, max, shape) summary of an inputset. Module inputsets
+    ({function name: inputset}) are summarised per function.
+    """
+    if isinstance(inputset, dict):
+        return {name: inputset_bounds(sub) for name, sub in sorted(inputset.items())}
+    bounds = []
+    for sample in inputset:
+        args = sample if isinstance(sample, tuple) else (sample,)
+        for i, arg in enumerate(args):
+            arr = np.asarray(arg)
+            lo, hi = int(arr.min()), int(arr.max())
+            if i == len(bounds):
+                bounds.append([lo, hi, list(arr.shape)])
+            else:
+                bounds[i][0] = min(bounds[i][0], lo)
+                bounds[i][1] = max(bounds[i][1], hi)
+    return bounds
+
+
+def _configuration_fingerprint(configuration):
+    if configuration is None:
+        return None
+    return {k: repr(v) for k, v in sorted(vars(configuration).items())}
+
+
+def cache_key(name, func, encryption, inputset, configuration=None, extra=None):
+    """Content address of a compiled circuit."""
+    payload = {
+        "name": name,
+        "source": textwrap.dedent(inspect.getsource(func)),
+        "encryption": encryption,
+        "bounds": inputset_bounds(inputset),
+        "configuration": _configuration_fingerprint(configuration),
+        "concrete": concrete_version(),
+        "extra": extra,
+    }
+    blob = json.dumps(payload, sort_keys=True, default=repr).encode("utf-8")
+    return hashlib.sha256(blob).hexdigest()
+
+
+# ---------- Circuit wrapper ----------
+class CachedCircuit:
+    """
+    Uniform encrypt/run/decrypt facade over a compiled or loaded server.
+
+    A freshly compiled `fhe.Circuit` and a server loaded from disk expose
+    slightly different APIs; both are wrapped so callers don't care which
+    one they got. The optional `function_name` selects a function of a
+    compiled module.
+    """
+
+    def __init__(self, name, server, client, key=None, from_cache=False):
+        self.name = name
+        self.server = server
+        self.client = client
+        self.key = key
+        self.from_cache = from_cache
+
+    def keygen(self):
+        self.client.keys.generate()
+
+    def encrypt(self, *args, function_name=None):
+        if function_name is None:
+            return self.client.encrypt(*args)
+        return self.client.encrypt(*args, function_name=function_name)
+
+    def run(self, *args, function_name=None):
+        kwargs = {"evaluation_keys": self.client.evaluation_keys}
+        if function_name is not None:
+            kwargs["function_name"] = function_name
+        return self.server.run(*args, **kwargs)
+
+    def decrypt(self, *results, function_name=None):
+        if function_name is None:
+            return self.client.decrypt(*results)
+        return self.client.decrypt(*results, function_name=function_name)
+
+
+# ---------- Cache ----------
+class CircuitCache:
+    """Content-addressed, size-capped LRU cache of compiled circuit servers."""
+
+    def __init__(self, directory=None, max_bytes=None):
+        self.directory = directory or os.environ.get("PRIVAGATOR_CIRCUIT_CACHE", DEFAULT_CACHE_DIR)
+        if max_bytes is None:
+            max_bytes = int(float(os.environ.get("PRIVAGATOR_CIRCUIT_CACHE_MB", DEFAULT_MAX_MB)) * 1024 * 1024)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._pruned = False
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def _paths(self, key):
+        return (os.path.join(self.directory, f"{key}.zip"),
+                os.path.join(self.directory, f"{key}.json"))
+
+    def _remove(self, key):
+        for path in self._paths(key):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _entries(self):
+        """(key, last_used, size) for every complete entry in the directory."""
+        entries = []
+        if not os.path.isdir(self.directory):
+            return entries
+        for fname in os.listdir(self.directory):
+            if not fname.endswith(".json"):
+                continue
+            key = fname[:-5]
+            zip_path, meta_path = self._paths(key)
+            try:
+                st = os.stat(zip_path)
+                last_used = os.stat(meta_path).st_mtime
+            except FileNotFoundError:
+                continue
+            entries.append((key, last_used, st.st_size))
+        return entries
+
+    def prune_stale(self):
+        """Drop entries built by another concrete version and orphaned files."""
+        if not os.path.isdir(self.directory):
+            return
+        current = concrete_version()
+        for fname in os.listdir(self.directory):
+            key, ext = os.path.splitext(fname)
+            if key.endswith(".tmp"):
+                continue  # another process is still writing this entry
+            zip_path, meta_path = self._paths(key)
+            if ext == ".zip" and not os.path.exists(meta_path):
+                self._remove(key)
+            elif ext == ".json":
+                try:
+                    with open(meta_path) as f:
+                        meta = json.load(f)
+                except (OSError, ValueError):
+                    meta = {}
+                if meta.get("concrete") != current or not os.path.exists(zip_path):
+                    self._remove(key)
+
+    def _enforce_limit(self):
+        entries = sorted(self._entries(), key=lambda e: e[1])
+        total = sum(size for _, _, size in entries)
+        while entries and total > self.max_bytes:
+            key, _, size = entries.pop(0)
+            self._remove(key)
+            total -= size
+            self.evictions += 1
+
+    def load(self, name, key):
+        """Return a CachedCircuit for `key`, or None on a miss."""
+        from concrete import fhe
+
+        zip_path, meta_path = self._paths(key)
+        if not (os.path.exists(zip_path) and os.path.exists(meta_path)):
+            return None
+        try:
+            server = fhe.Server.load(zip_path)
+            client = fhe.Client(server.client_specs)
+        except Exception:
+            # corrupt or incompatible artifact: drop it and recompile
+            self._remove(key)
+            return None
+        os.utime(meta_path)  # bump LRU position
+        return CachedCircuit(name, server, client, key=key, from_cache=True)
+
+    def store(self, name, key, circuit):
+        """Persist the server of a freshly compiled `fhe.Circuit`."""
+        os.makedirs(self.directory, exist_ok=True)
+        zip_path, meta_path = self._paths(key)
+        # Server.save archives through shutil.make_archive, which always writes
+        # "<path>.zip"; a temp name already ending in .zip is kept as given
+        tmp_zip = os.path.join(self.directory, f"{key}.{os.getpid()}.tmp.zip")
+        circuit.server.save(tmp_zip)
+        os.replace(tmp_zip, zip_path)
+        meta = {
+            "name": name,
+            "concrete": concrete_version(),
+            "size": os.path.getsize(zip_path),
+            "created": time.time(),
+        }
+        tmp_meta = f"{meta_path}.{os.getpid()}.tmp"
+        with open(tmp_meta, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_meta, meta_path)
+        self._enforce_limit()
+
+    def get_or_build(self, name, key, build):
+        """
+        Load the circuit stored under `key`, or call `build()` (which must return
+        a compiled `fhe.Circuit` or module) and store the result on a miss.
+        """
+        if self.enabled:
+            with self._lock:
+                if not self._pruned:
+                    self.prune_stale()
+                    self._pruned = True
+            cached = self.load(name, key)
+            if cached is not None:
+                self.hits += 1
+                return cached
+            self.misses += 1
+
+        circuit = build()
+        if self.enabled:
+            try:
+                self.store(name, key, circuit)
+            except Exception as e:
+                # a read-only or full disk must not break compilation
+                print(f"⚠️ circuit cache: could not store {name}: {e}")
+        return CachedCircuit(name, circuit.server, circuit.client, key=key)
+
+    def get_or_compile(self, name, func, encryption, inputset, configuration=None, extra=None):
+        """
+        Load the circuit for these compile inputs from disk, compiling and
+        storing it on a miss.
+        """
+        from concrete import fhe
+
+        key = cache_key(name, func, encryption, inputset, configuration, extra)
+        return self.get_or_build(
+            name, key, lambda: fhe.Compiler(func, encryption).compile(inputset, configuration))
+
+    def stats(self):
+        entries = self._entries()
+        return {
+            "directory": self.directory,
+            "entries": len(entries),
+            "bytes": sum(size for _, _, size in entries),
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+CIRCUIT_CACHE = CircuitCache()
@@ -0,0 +1,118 @@
+"""
+Process-wide pool of compiled circuits shared by every UI session.
+
+The registries already compile each circuit once; the pool adds what
+concurrent sessions need on top of that:
+
+- one execution guard per circuit, so two sessions never drive the same
+  circuit's client/server at once while unrelated ops still run in parallel
+- hit/compile/contention counters and the number of sessions seen recently,
+  for the stats panel
+
+Keys come from the shared KeysetManager through the registries, so sessions
+share keys as well as circuits.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+from modules.circuit_registry import COMPILED
+from modules.keyset import KEYSETS
+
+
+class CircuitPool:
+    def __init__(self, registries, session_ttl=300.0, keysets=None):
+        self.registries = {r.label: r for r in registries}
+        self.session_ttl = session_ttl
+        self.keysets = keysets or KEYSETS
+        self._guards = {}
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.compiles = 0
+        self.contended = 0
+        self.in_flight = 0
+
+    def _registry(self, label):
+        try:
+            return self.registries[label]
+        except KeyError:
+            raise ValueError(f"Unknown circuit registry '{label}'")
+
+    def _guard(self, key):
+        with self._lock:
+            guard = self._guards.get(key)
+            if guard is None:
+                guard = self._guards[key] = threading.Lock()
+            return guard
+
+    def circuit(self, label, name):
+        """The compiled circuit, compiling it on first use across all sessions."""
+        entry = self._registry(label).entry(name)
+        already = entry.state == COMPILED
+        circuit = entry.get()
+        with self._lock:
+            if already:
+                self.hits += 1
+            else:
+                self.compiles += 1
+        return circuit
+
+    @contextmanager
+    def lease(self, label, name):
+        """Exclusive use of one circuit; other circuits stay available."""
+        guard = self._guard((label, name))
+        if not guard.acquire(blocking=False):
+            with self._lock:
+                self.contended += 1
+            guard.acquire()
+        with self._lock:
+            self.in_flight += 1
+        try:
+            yield self.circuit(label, name)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+            guard.release()
+
+    def run(self, label, name, *args):
+        """encrypt → run → decrypt of `args` on the shared circuit."""
+        with self.lease(label, name) as circuit:
+            encrypted = circuit.encrypt(*args)
+            result = circuit.run(encrypted) if len(args) == 1 else circuit.run(*encrypted)
+            return circuit.decrypt(result)
+
+    def warm_up(self, label=None, background=True):
+        labels = [label] if label else list(self.registries)
+        return [self._registry(l).warm_up(background=background) for l in labels]
+
+    # ---------- Sessions ----------
+    def touch(self, session_id):
+        """Record that `session_id` is active now."""
+        now = time.time()
+        with self._lock:
+            self._sessions[session_id] = now
+            for sid, seen in list(self._sessions.items()):
+                if now - seen > self.session_ttl:
+                    del self._sessions[sid]
+
+    def active_sessions(self):
+        cutoff = time.time() - self.session_ttl
+        with self._lock:
+            return sum(1 for seen in self._sessions.values() if seen >= cutoff)
+
+    def stats(self):
+        compiled = sum(1 for r in self.registries.values()
+                       for s in r.readiness().values() if s["state"] == COMPILED)
+        active = self.active_sessions()
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "compiles": self.compiles,
+                "contended": self.contended,
+                "in_flight": self.in_flight,
+                "active_sessions": active,
+                "compiled_circuits": compiled,
+                "keysets": self.keysets.stats(),
+            }
@@ -0,0 +1,266 @@
+"""
+Lazy loading of concrete and lazy, once-only compilation of circuits.
+
+Nothing here touches concrete at import time. `load_concrete()` imports it on
+first use, and each registered circuit compiles the first time it is asked
+for, behind a per-circuit lock so concurrent callers wait for one compile
+instead of racing. Compiled circuits get their keys from the shared
+KeysetManager right away. `warm_up()` can compile circuits ahead of time in a
+background thread and `readiness()` reports where every circuit stands.
+
+`LazyCircuit.simulator()` compiles the same function a second time with
+Concrete's FHE simulation enabled and execution disabled. The result computes
+exactly what the real circuit computes, at the same bit widths and with the
+same table lookups, but on clear values and without keys.
+"""
+
+import threading
+import time
+import traceback
+
+from modules.circuit_cache import CIRCUIT_CACHE
+from modules.keyset import KEYSETS
+
+
+PENDING = "pending"
+COMPILING = "compiling"
+COMPILED = "compiled"
+FAILED = "failed"
+
+_fhe = None
+_fhe_error = None
+_fhe_tried = False
+_import_lock = threading.Lock()
+
+
+def load_concrete():
+    """Import `concrete.fhe` once; returns the module, or None if unavailable."""
+    global _fhe, _fhe_error, _fhe_tried
+    if _fhe_tried:
+        return _fhe
+    with _import_lock:
+        if not _fhe_tried:
+            try:
+                from concrete import fhe
+                _fhe = fhe
+            except Exception:
+                # import error, missing native libs, etc.
+                _fhe_error = traceback.format_exc()
+                print("⚠️  concrete-python not available — using simulated FHE mode")
+            _fhe_tried = True
+    return _fhe
+
+
+def concrete_import_error():
+    """Traceback of the failed concrete import, if any."""
+    return _fhe_error
+
+
+class LazyCircuit:
+    """A circuit that compiles (or loads from the disk cache) on first use."""
+
+    def __init__(self, name, func, encryption, inputset, configuration=None, extra=None, cache=None,
+                 keysets=None):
+        self.name = name
+        self.func = func
+        self.encryption = encryption
+        # inputsets may be passed as a callable so they are only built when needed
+        self.inputset = inputset
+        self.configuration = configuration
+        self.extra = extra
+        self.cache = cache or CIRCUIT_CACHE
+        self.keysets = keysets or KEYSETS
+        self.state = PENDING
+        self.error = None
+        self.compile_time = None
+        self.keyset_id = None
+        self._circuit = None
+        self._lock = threading.Lock()
+        self.sim_state = PENDING
+        self.sim_error = None
+        self.sim_compile_time = None
+        self._simulator = None
+        self._sim_lock = threading.Lock()
+
+    def get(self):
+        """Return the compiled circuit, compiling it exactly once."""
+        if self.state == COMPILED:
+            return self._circuit
+        with self._lock:
+            if self.state == COMPILED:
+                return self._circuit
+            if self.state == FAILED:
+                raise RuntimeError(f"Compilation of '{self.name}' failed:\n{self.error}")
+            fhe = load_concrete()
+            if fhe is None:
+                raise RuntimeError("Concrete is not available.")
+            self.state = COMPILING
+            start = time.perf_counter()
+            try:
+                inputset = self.inputset() if callable(self.inputset) else self.inputset
+                configuration = self.configuration() if callable(self.configuration) else self.configuration
+                circuit = self._compile(inputset, configuration)
+                self.compile_time = time.perf_counter() - start
+                # shared keys: loaded or generated now rather than on first encrypt
+                self.keyset_id = self.keysets.attach(circuit)
+                self._circuit = circuit
+            except Exception:
+                self.error = traceback.format_exc()
+                self.state = FAILED
+                raise RuntimeError(f"Compilation of '{self.name}' failed:\n{self.error}")
+            self.state = COMPILED
+            return self._circuit
+
+    def _compile(self, inputset, configuration):
+        """Compile (or load from the disk cache); subclasses may build differently."""
+        return self.cache.get_or_compile(
+            self.name, self.func, self.encryption, inputset, configuration, self.extra)
+
+    def _build(self, inputset, configuration):
+        """A compiled `fhe.Circuit` (or module) straight from the compiler, bypassing the disk cache."""
+        return load_concrete().Compiler(self.func, self.encryption).compile(inputset, configuration)
+
+    def simulator(self):
+        """The FHE-simulation build of this circuit (a SimulatedCircuit), compiled once on first use."""
+        if self.sim_state == COMPILED:
+            return self._simulator
+        with self._sim_lock:
+            if self.sim_state == COMPILED:
+                return self._simulator
+            if self.sim_state == FAILED:
+                raise RuntimeError(f"Simulation build of '{self.name}' failed:\n{self.sim_error}")
+            fhe = load_concrete()
+            if fhe is None:
+                raise RuntimeError("Concrete is not available.")
+            self.sim_state = COMPILING
+            start = time.perf_counter()
+            try:
+                inputset = self.inputset() if callable(self.inputset) else self.inputset
+                configuration = self.configuration() if callable(self.configuration) else self.configuration
+                if configuration is None:
+                    configuration = fhe.Configuration(fhe_simulation=True, fhe_execution=False)
+                else:
+                    configuration = configuration.fork(fhe_simulation=True, fhe_execution=False)
+                # not stored in the disk cache, which holds servers only; there are no keys to make
+                self._simulator = SimulatedCircuit(self.name, self._build(inputset, configuration))
+                self.sim_compile_time = time.perf_counter() - start
+            except Exception:
+                self.sim_error = traceback.format_exc()
+                self.sim_state = FAILED
+                raise RuntimeError(f"Simulation build of '{self.name}' failed:\n{self.sim_error}")
+            self.sim_state = COMPILED
+            return self._simulator
+
+    def reset(self):
+        """Forget a failed or compiled circuit so the next `get()` recompiles."""
+        with self._lock:
+            self.state = PENDING
+            self.error = None
+            self._circuit = None
+        with self._sim_lock:
+            self.sim_state = PENDING
+            self.sim_error = None
+            self._simulator = None
+
+    def status(self):
+        info = {"state": self.state}
+        if self.compile_time is not None:
+            info["compile_time"] = round(self.compile_time, 3)
+            info["from_cache"] = bool(self._circuit is not None and self._circuit.from_cache)
+        if self.keyset_id:
+            info["keyset"] = self.keyset_id
+        if self.error:
+            info["error"] = self.error.strip().splitlines()[-1]
+        if self.sim_state != PENDING:
+            info["simulation"] = {"state": self.sim_state}
+            if self.sim_compile_time is not None:
+                info["simulation"]["compile_time"] = round(self.sim_compile_time, 3)
+            if self.sim_error:
+                info["simulation"]["error"] = self.sim_error.strip().splitlines()[-1]
+        return info
+
+
+class SimulatedCircuit:
+    """
+    CachedCircuit's encrypt/run/decrypt facade over an FHE-simulation build:
+    "encrypting" and "decrypting" pass values through, `run` simulates. Code
+    written against CachedCircuit runs on it unchanged.
+    """
+
+    def __init__(self, name, circuit):
+        self.name = name
+        self.circuit = circuit
+        self.from_cache = False
+
+    def encrypt(self, *args, function_name=None):
+        return args[0] if len(args) == 1 else args
+
+    def run(self, *args, function_name=None):
+        if function_name is None:
+            return self.circuit.simulate(*args)
+        return getattr(self.circuit, function_name).simulate(*args)
+
+    def decrypt(self, *results, function_name=None):
+        return results[0] if len(results) == 1 else results
+
+
+class CircuitRegistry:
+    """Named collection of LazyCircuits with warm-up and readiness reporting."""
+
+    def __init__(self, label):
+        self.label = label
+        self._circuits = {}
+        self._warmup_thread = None
+
+    def register(self, name, func, encryption, inputset, configuration=None, extra=None):
+        return self.add(LazyCircuit(name, func, encryption, inputset, configuration, extra))
+
+    def add(self, circuit):
+        self._circuits[circuit.name] = circuit
+        return circuit
+
+    def __contains__(self, name):
+        return name in self._circuits
+
+    def names(self):
+        return list(self._circuits)
+
+    def entry(self, name):
+        try:
+            return self._circuits[name]
+        except KeyError:
+            raise ValueError(f"Unknown circuit '{name}'")
+
+    def get(self, name):
+        return self.entry(name).get()
+
+    def simulator(self, name):
+        return self.entry(name).simulator()
+
+    def _warm(self, names):
+        for name in names:
+            try:
+                self._circuits[name].get()
+            except Exception:
+                # recorded on the LazyCircuit, surfaced through readiness()
+                pass
+
+    def warm_up(self, names=None, background=True):
+        """
+        Compile `names` (default: all) ahead of first use.
+        With `background=True` this returns immediately with the daemon thread.
+        """
+        names = list(names or self._circuits)
+        if not background:
+            self._warm(names)
+            return None
+        if self._warmup_thread is not None and self._warmup_thread.is_alive():
+            return self._warmup_thread
+        self._warmup_thread = threading.Thread(
+            target=self._warm, args=(names,), name=f"{self.label}-warmup", daemon=True)
+        self._warmup_thread.start()
+        return self._warmup_thread
+
+    def readiness(self):
+        """{name: {"state": pending|compiling|compiled|failed, ...}}"""
+        return {name: c.status() for name, c in self._circuits.items()}
@@ -0,0 +1,129 @@
+"""
+Micro-batching of concurrent single computations.
+
+Many simultaneous scalar requests for the same op (say a burst of `add`)
+would each pay for a full circuit execution. The Coalescer holds requests
+for up to `window` seconds, or until `max_batch` of them share a key, then
+runs them as one batched (tensor) evaluation and hands every caller its own
+row of the result. A request that ends up alone in its window runs as a
+plain single computation instead. When a batch fails on bad input, its rows
+are retried one by one so only the offending request fails; any other
+failure (busy, timeout, internal error) goes to every caller unchanged, so
+an overloaded pool doesn't get N more submissions.
+
+A wider window means bigger batches and more throughput but adds up to
+`window` of latency to every request; the batch size and wait histograms
+below show where a given setting lands.
+"""
+
+import asyncio
+import time
+
+from modules.aio_http import HTTPError
+from modules.metrics import REGISTRY
+
+
+COALESCED_BATCH = REGISTRY.histogram(
+    "privagator_coalesced_batch_size", "Requests executed together per coalesced batch", ("op",),
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+COALESCE_WAIT = REGISTRY.histogram(
+    "privagator_coalesce_wait_seconds", "Time a request waited for its batch to fill", ("op",))
+COALESCED_REQUESTS = REGISTRY.counter(
+    "privagator_coalesced_requests_total", "Requests served through the coalescer", ("op",))
+
+
+def _bad_input(error):
+    """Whether `error` rejects the inputs (so another row of the batch may be to blame)."""
+    return isinstance(error, ValueError) or (isinstance(error, HTTPError) and error.status == 400)
+
+
+class _Pending:
+    def __init__(self):
+        self.items = []  # (inputs, future, enqueued_at)
+        self.timer = None
+
+
+class Coalescer:
+    """
+    `run_batch(op, rows)` is an async callable returning `(results, seconds)`;
+    `submit(key, op, inputs)` resolves to `(result, seconds, batch_size)`.
+    Requests only share a batch when their `key` matches.
+    """
+
+    def __init__(self, run_batch, window=0.002, max_batch=64, run_single=None):
+        self.run_batch = run_batch
+        self.run_single = run_single
+        self.window = window
+        self.max_batch = max_batch
+        self._pending = {}
+        self._tasks = set()
+        self.batches = 0
+        self.requests = 0
+
+    async def submit(self, key, op, inputs):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = self._pending[key] = _Pending()
+            pending.timer = loop.call_later(self.window, self._flush, key, op)
+        pending.items.append((inputs, future, time.perf_counter()))
+        if len(pending.items) >= self.max_batch:
+            self._flush(key, op)
+        return await future
+
+    def _flush(self, key, op):
+        pending = self._pending.pop(key, None)
+        if pending is None:
+            return
+        pending.timer.cancel()
+        task = asyncio.create_task(self._execute(op, pending.items))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _execute(self, op, items):
+        now = time.perf_counter()
+        for _, _, enqueued in items:
+            COALESCE_WAIT.observe(now - enqueued, op=op)
+        COALESCED_BATCH.observe(len(items), op=op)
+        COALESCED_REQUESTS.inc(len(items), op=op)
+        self.batches += 1
+        self.requests += len(items)
+        if len(items) == 1 and self.run_single is not None:
+            # a lone request would pay for a whole BATCH_SIZE-wide padded tensor; run it as a scalar
+            inputs, future, _ = items[0]
+            await self._single(op, inputs, future)
+            return
+        try:
+            results, seconds = await self.run_batch(op, [inputs for inputs, _, _ in items])
+        except Exception as e:
+            if len(items) > 1 and self.run_single is not None and _bad_input(e):
+                # one bad request must not fail its batch-mates: retry them one by one
+                await asyncio.gather(*(self._single(op, inputs, future) for inputs, future, _ in items))
+                return
+            for _, future, _ in items:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future, _), result in zip(items, results):
+            if not future.done():
+                future.set_result((result, seconds, len(items)))
+
+    async def _single(self, op, inputs, future):
+        try:
+            result, seconds = await self.run_single(op, inputs)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+        else:
+            if not future.done():
+                future.set_result((result, seconds, 1))
+
+    def stats(self):
+        return {
+            "window_ms": round(self.window * 1000, 3),
+            "max_batch": self.max_batch,
+            "batches": self.batches,
+            "requests": self.requests,
+            "mean_batch": round(self.requests / self.batches, 2) if self.batches else 0.0,
+        }
@@ -0,0 +1,108 @@
+"""
+Named compile profiles: inputsets built from declared bounds plus the
+Concrete configuration (error probability, parameter selection) to use.
+
+Concrete only needs an inputset to discover the range of every
+intermediate value, so enumerating a full Cartesian product (400 samples for
+a 0..19 pair) is wasted compile time that grows with the square of the range.
+`bounds_inputset` covers each argument's low and high bound (and zero when it
+lies inside) in every combination, plus a few seeded random samples, which
+is enough for the monotone arithmetic used here.
+
+    low-latency    looser per-PBS error probability, corners only
+    balanced       Concrete's default global error probability (default)
+    high-accuracy  much tighter global error probability, more samples
+
+Select with PRIVAGATOR_COMPILE_PROFILE (or `fhe_server.py --compile-profile`);
+`benchmark_fhe.py --profiles ...` reports compile time and latency per profile.
+"""
+
+import itertools
+import os
+
+import numpy as np
+
+from modules.circuit_registry import load_concrete
+
+
+DEFAULT_PROFILE = "balanced"
+
+
+def bounds_inputset(bounds, shape=None, samples=0, seed=0):
+    """
+    Minimal inputset for arguments bounded by `bounds` ([(lo, hi), ...]).
+    With `shape`, every argument is a tensor of that shape: corner samples are
+    constant tensors and the random ones mix values across elements.
+    """
+    points = []
+    for lo, hi in bounds:
+        values = {int(lo), int(hi)}
+        if lo < 0 < hi:
+            values.add(0)
+        points.append(sorted(values))
+    rng = np.random.default_rng(seed)
+    if shape is None:
+        inputset = list(itertools.product(*points))
+        inputset += [tuple(int(rng.integers(lo, hi + 1)) for lo, hi in bounds) for _ in range(samples)]
+    else:
+        inputset = [tuple(np.full(shape, v, dtype=np.int64) for v in corner)
+                    for corner in itertools.product(*points)]
+        inputset += [tuple(rng.integers(lo, hi + 1, shape) for lo, hi in bounds) for _ in range(samples)]
+    return inputset
+
+
+class CompileProfile:
+    def __init__(self, name, description, p_error=None, global_p_error=None, samples=0, options=None):
+        self.name = name
+        self.description = description
+        self.p_error = p_error
+        self.global_p_error = global_p_error
+        self.samples = samples
+        self.options = options or {}
+
+    def inputset(self, bounds, shape=None, seed=0):
+        return bounds_inputset(bounds, shape, self.samples, seed)
+
+    def configuration(self, fhe=None, **overrides):
+        """`fhe.Configuration` for this profile (None when concrete is unavailable)."""
+        fhe = fhe or load_concrete()
+        if fhe is None:
+            return None
+        kwargs = {"p_error": self.p_error, "global_p_error": self.global_p_error, **self.options}
+        kwargs.update(overrides)
+        return fhe.Configuration(**kwargs)
+
+    def describe(self):
+        return {
+            "name": self.name,
+            "description": self.description,
+            "p_error": self.p_error,
+            "global_p_error": self.global_p_error,
+            "samples": self.samples,
+            **self.options,
+        }
+
+
+PROFILES = {p.name: p for p in (
+    CompileProfile(
+        "low-latency", "Smallest parameters: 1e-3 error probability per table lookup",
+        p_error=1e-3, global_p_error=None, samples=0,
+        options={"parameter_selection_strategy": "multi"}),
+    CompileProfile(
+        "balanced", "Concrete's default: 1e-5 error probability for the whole circuit",
+        p_error=None, global_p_error=1e-5, samples=8,
+        options={"parameter_selection_strategy": "multi"}),
+    CompileProfile(
+        "high-accuracy", "1e-9 error probability for the whole circuit, wider inputset",
+        p_error=None, global_p_error=1e-9, samples=64,
+        options={"parameter_selection_strategy": "multi"}),
+)}
+
+
+def get_profile(name=None):
+    """Profile `name`, or the one PRIVAGATOR_COMPILE_PROFILE selects."""
+    name = name or os.environ.get("PRIVAGATOR_COMPILE_PROFILE") or DEFAULT_PROFILE
+    try:
+        return PROFILES[name]
+    except KeyError:
+        raise ValueError(f"Unknown compile profile '{name}' (expected one of {', '.join(PROFILES)})")
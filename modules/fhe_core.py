@@ -1,80 +1,703 @@
+import inspect
+import os
+import threading
 import numpy as np
 import traceback
+from contextlib import contextmanager
 
+from modules.circuit_cache import cache_key
+from modules import parallelism
+from modules.compile_profiles import get_profile
+from modules.keyset import KEYSETS
+from modules.metrics import REGISTRY
+from modules.sim_backend import latency_model
+from modules.circuit_registry import (
+    CircuitRegistry, LazyCircuit, FAILED, load_concrete, concrete_import_error,
+)
 
-try:
-    from concrete import fhe
-    FHE_AVAILABLE = True
-except ImportError:
-    FHE_AVAILABLE = False
-    print("⚠️  concrete-python not available — using simulated FHE mode")
-  
 
+# ---------- FHE functions ----------
+# Plain functions: concrete is only imported (and these only compiled) the
+# first time an operation actually needs them.
+def _square(x):
+    return x * x
 
-# Flags / placeholders
-USING_CONCRETE = False
-_compile_error = None
 
-# Try to import concrete and compile circuits
-try:
-    from concrete import fhe
+def _multiply(x, y):
+    return x * y
 
-    # ---- define FHE functions ----
-    @fhe.compiler({"x": "encrypted"})
-    def _square(x):
-        return x * x
 
-    @fhe.compiler({"x": "encrypted", "y": "encrypted"})
-    def _multiply(x, y):
-        return x * y
+def _add(x, y):
+    return x + y
 
-    @fhe.compiler({"x": "encrypted", "y": "encrypted"})
-    def _add(x, y):
-        return x + y
 
-    @fhe.compiler({"x": "encrypted", "y": "encrypted"})
-    def _compare(x, y):
-        return x > y
+def _compare(x, y):
+    return x > y
 
-    # Compile circuits once (small sample ranges)
-    print("🔄 modules.fhe_core: compiling Concrete circuits (this can take a few seconds)...")
+
+# Scalar and batched circuits share these functions; batched ops run them on
+# 1-D tensors of BATCH_SIZE values, so a whole chunk of rows is one encrypt,
+# one run and one decrypt.
+BATCH_SIZE = int(os.environ.get("PRIVAGATOR_BATCH_SIZE", "64"))
+BATCH_OPS = {
+    "square": (_square, {"x": "encrypted"}),
+    "multiply": (_multiply, {"x": "encrypted", "y": "encrypted"}),
+    "add": (_add, {"x": "encrypted", "y": "encrypted"}),
+    "compare": (_compare, {"x": "encrypted", "y": "encrypted"}),
+}
+
+
+# ---------- Bit-width tiers ----------
+# Every op is compiled per input bit-width tier: a b-bit tier accepts inputs
+# in 0..2**b - 1. Requests run on the smallest tier that fits their bounds,
+# so small inputs don't pay for wide circuits, and anything beyond the
+# widest tier is rejected instead of overflowing.
+TIERS = tuple(sorted(int(b) for b in os.environ.get("PRIVAGATOR_TIERS", "4,7,10").split(",")))
+
+
+def tier_max(bits):
+    return 2 ** bits - 1
+
+
+def select_tier(hi, lo=0):
+    """Smallest tier whose range holds lo..hi; ValueError when none does."""
+    if lo < 0:
+        raise ValueError("inputs must be non-negative")
+    for bits in TIERS:
+        if hi <= tier_max(bits):
+            return bits
+    raise ValueError(f"inputs must be within 0..{tier_max(TIERS[-1])}")
+
+
+def _input_bounds(values, bounds=None):
+    """(lo, hi) of `values`, or the declared `bounds` after checking the values respect them."""
+    values = np.asarray(values, dtype=np.int64)
+    lo, hi = (int(values.min()), int(values.max())) if values.size else (0, 0)
+    if bounds is None:
+        return lo, hi
+    declared_lo, declared_hi = (int(b) for b in bounds)
+    if lo < declared_lo or hi > declared_hi:
+        raise ValueError(f"inputs fall outside the declared bounds {declared_lo}..{declared_hi}")
+    return declared_lo, declared_hi
+
+
+def tier_circuit_name(op, bits):
+    return f"{op}_{bits}bit"
+
+
+def batch_circuit_name(op, bits):
+    return f"{tier_circuit_name(op, bits)}@{BATCH_SIZE}"
+
+
+# ---------- Compile profile ----------
+# Inputsets come from each circuit's declared bounds and the configuration
+# (error probability etc.) from the active profile; both are read when a
+# circuit compiles, so set_compile_profile() affects circuits not yet compiled.
+_profile = get_profile()
+
+
+def set_compile_profile(name):
+    global _profile
+    _profile = get_profile(name)
+
+
+def get_compile_profile():
+    return _profile
+
+
+def _configuration(op=None, name=None):
+    mode = parallelism_mode(op, name)
+    _compiled_modes[name] = mode
+    return _profile.configuration(load_concrete(), **parallelism.options(mode))
+
+
+def _bounded_inputset(arity, hi, shape=None):
+    return _profile.inputset([(0, hi)] * arity, shape)
+
+
+# ---------- Parallelism ----------
+# Loop/dataflow/auto parallelization is part of each circuit's configuration
+# (and so of its cache key); a mode can be set for every circuit or per op or
+# circuit name. See modules/parallelism.py for threads and CPU affinity.
+_parallel_default, _parallel_overrides = parallelism.parse_spec()
+_circuit_ops = {}  # circuit name -> op
+_compiled_modes = {}  # circuit name -> mode its configuration was built with
+
+
+def parallelism_mode(op=None, name=None):
+    return _parallel_overrides.get(name) or _parallel_overrides.get(op) or _parallel_default
+
+
+def set_parallelism(mode, circuits=None):
+    """
+    Use `mode` for every circuit, or only for `circuits` (op or circuit
+    names). Affected circuits that are already compiled are reset, so they
+    recompile (or load from the disk cache) with the new mode on next use.
+    """
+    global _parallel_default
+    parallelism.options(mode)
+    if circuits is None:
+        _parallel_default = mode
+        _parallel_overrides.clear()
+    else:
+        _parallel_overrides.update({c: mode for c in circuits})
+    for name, op in _circuit_ops.items():
+        if name in _compiled_modes and _compiled_modes[name] != parallelism_mode(op, name):
+            del _compiled_modes[name]
+            CIRCUITS.entry(name).reset()
+
+
+def parallelism_settings():
+    return {"default": _parallel_default, "overrides": dict(_parallel_overrides),
+            "threads": parallelism.get_threads()}
+
+
+# ---------- Encrypted aggregation ----------
+# Balances are summed in fixed-size encrypted chunks; the encrypted partial
+# totals are then combined pairwise, so both levels reduce in log depth.
+AGG_CHUNK = int(os.environ.get("PRIVAGATOR_AGG_CHUNK", "256"))
+AGG_MAX_BALANCE = int(os.environ.get("PRIVAGATOR_AGG_MAX_BALANCE", "1000"))
+AGG_MAX_ROWS = int(os.environ.get("PRIVAGATOR_AGG_MAX_ROWS", "65536"))
+
+
+def _tree_sum(x):
+    """Pairwise reduction of a 1-D tensor: log2(len(x)) levels of additions."""
+    while x.shape[0] > 1:
+        half = x.shape[0] // 2
+        head = x[:half] + x[half:2 * half]
+        x = head if x.shape[0] % 2 == 0 else np.concatenate((head, x[-1:]))
+    return x[0]
+
+
+def _aggregate_module(fhe):
+    """
+    Two-function module: `chunk_total` reduces one encrypted chunk, `combine`
+    adds two encrypted partial totals. The wiring lets outputs of either
+    function be fed back into `combine` without decrypting.
+    """
+    @fhe.module()
+    class Aggregate:
+        @fhe.function({"x": "encrypted"})
+        def chunk_total(x):
+            return _tree_sum(x)
+
+        @fhe.function({"a": "encrypted", "b": "encrypted"})
+        def combine(a, b):
+            return a + b
+
+        composition = fhe.Wired({
+            fhe.Wire(fhe.Output(chunk_total, 0), fhe.Input(combine, 0)),
+            fhe.Wire(fhe.Output(chunk_total, 0), fhe.Input(combine, 1)),
+            fhe.Wire(fhe.Output(combine, 0), fhe.Input(combine, 0)),
+            fhe.Wire(fhe.Output(combine, 0), fhe.Input(combine, 1)),
+        })
+
+    return Aggregate
+
+
+def _aggregate_inputset():
+    max_total = AGG_MAX_BALANCE * AGG_MAX_ROWS
+    totals = [(0, 0), (max_total // 2, max_total - max_total // 2), (0, max_total), (max_total, 0)]
+    return {"chunk_total": _profile.inputset([(0, AGG_MAX_BALANCE)], shape=(AGG_CHUNK,)), "combine": totals}
+
+
+class _AggregateCircuit(LazyCircuit):
+    """LazyCircuit for the aggregate module (compiled via a module, not fhe.Compiler)."""
+
+    def __init__(self):
+        super().__init__("aggregate", _aggregate_module, None, _aggregate_inputset,
+                         lambda: _configuration("aggregate", "aggregate"))
+
+    def _compile(self, inputset, configuration):
+        extra = {"tree_sum": inspect.getsource(_tree_sum), "chunk": AGG_CHUNK}
+        key = cache_key(self.name, self.func, self.encryption, inputset, configuration, extra)
+        return self.cache.get_or_build(self.name, key, lambda: self._build(inputset, configuration))
+
+    def _build(self, inputset, configuration):
+        return self.func(load_concrete()).compile(inputset, configuration)
+
+
+# ---------- Encrypted histogram ----------
+# Each balance is mapped to its bucket index by one table lookup, the indices
+# of a chunk are counted per bucket, and chunk counts are combined pairwise
+# like the aggregate totals. Chunks are padded with PAD, which maps to no bucket.
+# Bucket i is [edges[i], edges[i+1]); the last one also holds edges[-1].
+PAD = AGG_MAX_BALANCE + 1
+HIST_MAX_BUCKETS = 32
+HIST_EDGES = tuple(int(e) for e in os.environ.get(
+    "PRIVAGATOR_HIST_EDGES", ",".join(str(int(e)) for e in np.linspace(0, AGG_MAX_BALANCE, 6))).split(","))
+
+
+def _check_edges(edges):
+    edges = tuple(int(e) for e in edges)
+    if len(edges) < 2 or any(b <= a for a, b in zip(edges, edges[1:])):
+        raise ValueError("histogram edges must be at least two strictly increasing integers")
+    if len(edges) - 1 > HIST_MAX_BUCKETS:
+        raise ValueError(f"histogram supports at most {HIST_MAX_BUCKETS} buckets")
+    if edges[0] < 0 or edges[-1] > AGG_MAX_BALANCE:
+        raise ValueError(f"histogram edges must be within 0..{AGG_MAX_BALANCE}")
+    return edges
+
+
+# Every set of edges is its own compiled circuit and metric label, so only
+# HIST_EDGES and the sets in PRIVAGATOR_HIST_EDGE_SETS ("0,250,500,750,1000;0,100,1000")
+# are accepted; anything else is rejected rather than compiled.
+HIST_EDGE_SETS = [_check_edges(HIST_EDGES)]
+for _spec in filter(None, (p.strip() for p in os.environ.get(
+        "PRIVAGATOR_HIST_EDGE_SETS", "0,250,500,750,1000").split(";"))):
+    _edges = _check_edges(_spec.split(","))
+    if _edges not in HIST_EDGE_SETS:
+        HIST_EDGE_SETS.append(_edges)
+
+
+def allow_histogram_edges(edges):
+    """Add `edges` to the accepted sets (for in-process callers; the server only takes configured ones)."""
+    edges = _check_edges(edges)
+    if edges not in HIST_EDGE_SETS:
+        HIST_EDGE_SETS.append(edges)
+    return edges
+
+
+def histogram_edges(edges=None):
+    """Validated bucket edges as a tuple (default HIST_EDGES); ValueError unless they are an accepted set."""
+    edges = _check_edges(HIST_EDGES if edges is None else edges)
+    if edges not in HIST_EDGE_SETS:
+        accepted = "; ".join(",".join(str(e) for e in accepted) for accepted in HIST_EDGE_SETS)
+        raise ValueError(f"histogram edges must be one of the configured sets: {accepted}")
+    return edges
+
+
+def _bucket_table(edges):
+    """Bucket index of every value 0..PAD, padded to a power-of-two table; len(edges) - 1 means none."""
+    size = 1 << int(PAD).bit_length()
+    values = np.arange(size)
+    index = np.searchsorted(edges, values, side="right") - 1
+    index[values == edges[-1]] = len(edges) - 2
+    outside = (values < edges[0]) | (values > edges[-1])
+    index[outside] = len(edges) - 1
+    return [int(i) for i in index]
+
+
+def _histogram_module(fhe, edges):
+    """`chunk_counts` counts one encrypted chunk per bucket, `combine` adds two count vectors."""
+    table = fhe.LookupTable(_bucket_table(edges))
+    buckets = len(edges) - 1
+
+    @fhe.module()
+    class Histogram:
+        @fhe.function({"x": "encrypted"})
+        def chunk_counts(x):
+            index = table[x]
+            onehot = index.reshape((1, AGG_CHUNK)) == np.arange(buckets).reshape((buckets, 1))
+            return np.sum(onehot, axis=1)
+
+        @fhe.function({"a": "encrypted", "b": "encrypted"})
+        def combine(a, b):
+            return a + b
+
+        composition = fhe.Wired({
+            fhe.Wire(fhe.Output(chunk_counts, 0), fhe.Input(combine, 0)),
+            fhe.Wire(fhe.Output(chunk_counts, 0), fhe.Input(combine, 1)),
+            fhe.Wire(fhe.Output(combine, 0), fhe.Input(combine, 0)),
+            fhe.Wire(fhe.Output(combine, 0), fhe.Input(combine, 1)),
+        })
+
+    return Histogram
+
+
+def _histogram_inputset(edges):
+    buckets = len(edges) - 1
+    ramp = np.linspace(0, PAD, AGG_CHUNK).astype(np.int64)
+    none, full = np.zeros(buckets, dtype=np.int64), np.full(buckets, AGG_MAX_ROWS, dtype=np.int64)
+    half = full // 2
+    return {
+        "chunk_counts": _profile.inputset([(0, PAD)], shape=(AGG_CHUNK,)) + [(ramp,)],
+        "combine": [(none, none), (half, full - half), (none, full), (full, none)],
+    }
+
+
+def histogram_circuit_name(edges):
+    return "histogram@" + "-".join(str(e) for e in edges)
+
+
+class _HistogramCircuit(LazyCircuit):
+    """LazyCircuit for the histogram module of one set of bucket edges."""
+
+    def __init__(self, edges):
+        name = histogram_circuit_name(edges)
+        super().__init__(name, _histogram_module, None, lambda: _histogram_inputset(edges),
+                         lambda: _configuration("histogram", name))
+        self.edges = edges
+
+    def _compile(self, inputset, configuration):
+        extra = {"edges": self.edges, "chunk": AGG_CHUNK, "pad": PAD}
+        key = cache_key(self.name, self.func, self.encryption, inputset, configuration, extra)
+        return self.cache.get_or_build(self.name, key, lambda: self._build(inputset, configuration))
+
+    def _build(self, inputset, configuration):
+        return self.func(load_concrete(), self.edges).compile(inputset, configuration)
+
+
+# ---------- Encrypted ranking ----------
+# Ranking ops take a whole vector of up to RANK_SIZE values (zero-padded
+# after the real ones) and evaluate every pairwise comparison in one circuit
+# rather than N² scalar `compare` calls. Ties go to the lower index, so every
+# value gets a distinct position and padding never outranks a real value.
+RANK_SIZE = int(os.environ.get("PRIVAGATOR_RANK_SIZE", "16"))
+RANKING_OPS = ("rank_matrix", "argmax", "topk")
+_EARLIER = np.tril(np.ones((RANK_SIZE, RANK_SIZE), dtype=np.int64), -1)  # [i, j] = 1 when j < i
+
+
+def _rank_matrix(x):
+    """[i, j] = x[i] > x[j]"""
+    return x.reshape((RANK_SIZE, 1)) > x.reshape((1, RANK_SIZE))
+
+
+def _positions(x):
+    """Descending rank of every value: how many values beat it."""
+    col, row = x.reshape((RANK_SIZE, 1)), x.reshape((1, RANK_SIZE))
+    return np.sum((row > col) + (row == col) * _EARLIER, axis=1)
+
+
+def _select_top(x, k):
+    """(indices, values) of the k largest values, largest first."""
+    onehot = _positions(x).reshape((1, RANK_SIZE)) == np.arange(k).reshape((k, 1))
+    return onehot @ np.arange(RANK_SIZE), np.sum(onehot * x.reshape((1, RANK_SIZE)), axis=1)
+
+
+def _argmax(x):
+    return _select_top(x, 1)
+
+
+def _topk_function(k):
+    def topk(x):
+        return _select_top(x, k)
+    return topk
+
+
+# the traced functions only show their own source to the cache key
+_RANKING_SOURCE = "".join(inspect.getsource(f) for f in (_positions, _select_top))
+
+
+def _ranking_inputset(hi):
+    ramp = np.linspace(0, hi, RANK_SIZE).astype(np.int64)
+    # constant tensors alone never exercise a nonzero difference between two values
+    return _profile.inputset([(0, hi)], (RANK_SIZE,)) + [(ramp,), (ramp[::-1].copy(),)]
+
+
+def topk_circuit_name(k, bits):
+    return f"{tier_circuit_name('topk', bits)}@k{k}"
+
+
+# ---------- Backend selection ----------
+# "auto" uses Concrete when it is importable and falls back to simulation,
+# "concrete" refuses to fall back, "simulated" never touches Concrete.
+# "fhe-sim" runs each circuit's FHE-simulation build (see
+# LazyCircuit.simulator): the same integer semantics as "concrete",
+# overflow included, with no keys and no encryption. It needs concrete and
+# never falls back. run_circuit and run_batch also take a per-call backend.
+BACKENDS = ("auto", "concrete", "fhe-sim", "simulated")
+_backend = os.environ.get("PRIVAGATOR_BACKEND", "auto")
+
+
+def _check_backend(name):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend '{name}' (expected one of {', '.join(BACKENDS)})")
+    return name
+
+
+def set_backend(name):
+    global _backend
+    _backend = _check_backend(name)
+
+
+def get_backend():
+    return _backend
+
+
+CIRCUITS = CircuitRegistry("fhe_core")
+
+
+_register_lock = threading.Lock()
+
+
+def _register(op, name, func, encryption, inputset, extra=None):
+    _circuit_ops[name] = op
+    CIRCUITS.register(name, func, encryption, inputset, lambda: _configuration(op, name), extra)
+
+
+for _op, (_func, _enc) in BATCH_OPS.items():
+    for _bits in TIERS:
+        _register(_op, tier_circuit_name(_op, _bits), _func, _enc,
+                  lambda arity=len(_enc), hi=tier_max(_bits): _bounded_inputset(arity, hi))
+        _register(_op, batch_circuit_name(_op, _bits), _func, _enc,
+                  lambda arity=len(_enc), hi=tier_max(_bits): _bounded_inputset(arity, hi, (BATCH_SIZE,)))
+_circuit_ops["aggregate"] = "aggregate"
+CIRCUITS.add(_AggregateCircuit())
+for _bits in TIERS:
+    for _op, _func in (("rank_matrix", _rank_matrix), ("argmax", _argmax)):
+        _register(_op, tier_circuit_name(_op, _bits), _func, {"x": "encrypted"},
+                  lambda hi=tier_max(_bits): _ranking_inputset(hi), {"ranking": _RANKING_SOURCE})
+
+
+def _histogram_circuit(edges):
+    """Name of the histogram circuit for `edges`, registered the first time they are used."""
+    name = histogram_circuit_name(edges)
+    with _register_lock:
+        if name not in CIRCUITS:
+            _circuit_ops[name] = "histogram"
+            CIRCUITS.add(_HistogramCircuit(edges))
+    return name
+
+
+_histogram_circuit(histogram_edges())
+
+
+def _topk_circuit(k, bits):
+    """Name of the top-k circuit for `k`, registered the first time that k is asked for."""
+    name = topk_circuit_name(k, bits)
+    with _register_lock:
+        if name not in CIRCUITS:
+            _register("topk", name, _topk_function(k), {"x": "encrypted"},
+                      lambda: _ranking_inputset(tier_max(bits)), {"ranking": _RANKING_SOURCE, "k": k})
+    return name
+
+
+OPERATIONS = (*BATCH_OPS, "aggregate", "histogram", *RANKING_OPS)
+
+
+def warm_up(ops=None, background=True):
+    """
+    Compile circuits ahead of first use (all of them by default).
+    `ops` takes registry names, e.g. tier_circuit_name("add", 7) or
+    batch_circuit_name("add", 7).
+    """
+    if _backend in ("simulated", "fhe-sim") or load_concrete() is None:
+        return None
+    return CIRCUITS.warm_up(ops, background=background)
+
+
+def readiness():
+    """Which circuits are compiled, compiling, pending or failed."""
+    return {
+        "backend": _backend,
+        "concrete": _backend != "simulated" and load_concrete() is not None,
+        "compile_profile": _profile.name,
+        "parallelism": parallelism_settings(),
+        "circuits": CIRCUITS.readiness(),
+    }
+
+
+def keyset_stats():
+    """Keygen/load times and key sizes of the shared keysets."""
+    return KEYSETS.stats()
+
+
+# ---------- Metrics ----------
+# Exposed in-process through metrics_snapshot() and by the compute server on
+# /metrics. Stages: encrypt, evaluate, decrypt (here), serialization and
+# queue_wait (recorded by fhe_server). `op` is always the requested op; the
+# circuit that ran it is described by `tier` ("4bit", ...) and `batch` (rows
+# per tensor evaluation), both "" where they don't apply.
+STAGE_SECONDS = REGISTRY.histogram(
+    "privagator_stage_seconds", "Seconds spent per op and FHE stage", ("op", "stage", "tier", "batch"))
+COMPUTATIONS = REGISTRY.counter(
+    "privagator_computations_total", "Computations by op, circuit tier and backend that served them",
+    ("op", "tier", "batch", "backend"))
+ERRORS = REGISTRY.counter(
+    "privagator_errors_total", "Failed computations by op and kind", ("op", "kind"))
+FALLBACKS = REGISTRY.counter(
+    "privagator_simulated_fallbacks_total", "Computations that fell back to simulation", ("op", "reason"))
+
+
+def metric_labels(op, bits=None, batch=None):
+    """`op`, `tier` and `batch` labels of a computation of `op` on the `bits`-bit tier."""
+    return {"op": op, "tier": f"{bits}bit" if bits else "", "batch": str(batch) if batch else ""}
+
+
+def metrics_snapshot():
+    """Current histograms and counters as plain dicts."""
+    return REGISTRY.snapshot()
+
+
+# ---------- Progress ----------
+# Long computations (jobs on the compute server) report stage progress to a
+# per-thread callback `fn(stage, done, total)`, installed with reporting().
+_progress = threading.local()
+
+
+@contextmanager
+def reporting(callback):
+    """Send (stage, done, total) progress of computations on this thread to `callback`."""
+    previous = getattr(_progress, "callback", None)
+    _progress.callback = callback
     try:
-        square_circuit = _square.compile([(i,) for i in range(0, 20)])
-        multiply_circuit = _multiply.compile([(i, j) for i in range(0, 20) for j in range(0, 20)])
-        add_circuit = _add.compile([(i, j) for i in range(0, 20) for j in range(0, 20)])
-        compare_circuit = _compare.compile([(i, j) for i in range(0, 20) for j in range(0, 20)])
-        USING_CONCRETE = True
-        print("✅ modules.fhe_core: Concrete circuits compiled successfully.")
-    except Exception as ce:
-        _compile_error = traceback.format_exc()
-        print("⚠️ modules.fhe_core: Concrete import succeeded but compilation failed.")
-        print(_compile_error)
-        # leave USING_CONCRETE False so simulation will be used
-
-except Exception as e:
-    # Concrete not available (import error, missing native libs, etc.)
-    _compile_error = traceback.format_exc()
-    print("⚠️ modules.fhe_core: Concrete is not available. Falling back to simulated mode.")
-    # USING_CONCRETE stays False
+        yield
+    finally:
+        _progress.callback = previous
+
+
+@contextmanager
+def _stage(labels, stage, done=1, total=1):
+    """Time one stage of a computation (`labels` from metric_labels) and report it as progress."""
+    with STAGE_SECONDS.time(stage=stage, **labels):
+        yield
+    callback = getattr(_progress, "callback", None)
+    if callback is not None:
+        callback(stage, done, total)
 
 
 # ---------- Helper wrappers ----------
-def _run_concrete_circuit(circuit, inputs):
+def _run_concrete_circuit(circuit, inputs, labels):
     """
     Generic helper to run compiled concrete circuits.
     `inputs` is a list or tuple of integers.
     """
     # encryption, run, decrypt using the circuit object API
-    if len(inputs) == 1:
-        enc = circuit.encrypt(int(inputs[0]))
-        out = circuit.run(enc)
-        return circuit.decrypt(out)
-    else:
+    with _stage(labels, "encrypt"):
         encs = circuit.encrypt(*[int(x) for x in inputs])
-        out = circuit.run(*encs)
+    with _stage(labels, "evaluate"):
+        out = circuit.run(encs) if len(inputs) == 1 else circuit.run(*encs)
+    with _stage(labels, "decrypt"):
         return circuit.decrypt(out)
 
 
+def _run_tensor_circuit(circuit, args, labels, done=1, total=1):
+    """One encrypt/run/decrypt over a tuple of equally shaped arrays."""
+    with _stage(labels, "encrypt", done, total):
+        encs = circuit.encrypt(*args)
+    with _stage(labels, "evaluate", done, total):
+        out = circuit.run(encs) if len(args) == 1 else circuit.run(*encs)
+    with _stage(labels, "decrypt", done, total):
+        return np.asarray(circuit.decrypt(out))
+
+
+def _run_chunked_module(circuit, vals, op, first, pad=0):
+    """
+    Encrypted reduction of `vals` through a chunk/combine module: each
+    AGG_CHUNK-sized chunk (padded with `pad`) is reduced by the `first`
+    function, then the encrypted partial results are combined pairwise with
+    `combine` until one ciphertext is left, which is decrypted.
+    """
+    labels = metric_labels(op)
+    partials = []
+    chunks = -(-len(vals) // AGG_CHUNK)
+    for i, start in enumerate(range(0, len(vals), AGG_CHUNK)):
+        chunk = np.full(AGG_CHUNK, pad, dtype=np.int64)
+        part = vals[start:start + AGG_CHUNK]
+        chunk[:len(part)] = part
+        with _stage(labels, "encrypt", i + 1, chunks):
+            enc = circuit.encrypt(chunk, function_name=first)
+        # the combine tree below is the last evaluate step
+        with _stage(labels, "evaluate", i, chunks):
+            partials.append(circuit.run(enc, function_name=first))
+    produced_by = first
+    with _stage(labels, "evaluate", chunks, chunks):
+        while len(partials) > 1:
+            combined = [circuit.run(partials[i], partials[i + 1], function_name="combine")
+                        for i in range(0, len(partials) - 1, 2)]
+            if len(partials) % 2:
+                combined.append(partials[-1])
+            partials = combined
+            produced_by = "combine"
+    # with more than one chunk the last value always comes out of `combine`
+    with _stage(labels, "decrypt"):
+        return circuit.decrypt(partials[0], function_name=produced_by)
+
+
+def _run_aggregate_circuit(circuit, vals):
+    """Encrypted total of `vals` (zero padding doesn't change a sum)."""
+    return int(_run_chunked_module(circuit, vals, "aggregate", "chunk_total"))
+
+
+def _run_simulated(labels, compute, items=1, latency_op=None):
+    """
+    Simulated encrypt/evaluate/decrypt: `compute()` gives the result, the
+    latency model (zero by default) decides how long each stage takes,
+    sampled from the `latency_op` profile (default: the op's own).
+    """
+    model = latency_model()
+    latency_op = latency_op or labels["op"]
+    with _stage(labels, "encrypt"):
+        model.wait(latency_op, stages=("encrypt",), items=items)
+    with _stage(labels, "evaluate"):
+        result = compute()
+        model.wait(latency_op, stages=("run",), items=items)
+    with _stage(labels, "decrypt"):
+        model.wait(latency_op, stages=("decrypt",), items=items)
+    return result
+
+
+def _aggregate(vals, circuit=None):
+    """
+    {"total", "average"}. Only the total is computed under encryption; the
+    average is the decrypted total floor-divided by the public row count,
+    in plaintext. Dividing in the circuit would need a table lookup over
+    the whole 0..AGG_MAX_BALANCE * AGG_MAX_ROWS range, recompiled per count.
+    """
+    vals = np.asarray(vals, dtype=np.int64).reshape(-1)
+    if len(vals) == 0:
+        return {"total": 0, "average": 0}
+    # the simulated path enforces the compiled circuit's range too
+    if len(vals) > AGG_MAX_ROWS:
+        raise ValueError(f"aggregate supports at most {AGG_MAX_ROWS} balances per call")
+    if vals.min() < 0 or vals.max() > AGG_MAX_BALANCE:
+        raise ValueError(f"aggregate balances must be within 0..{AGG_MAX_BALANCE}")
+    if circuit is None:
+        total = int(vals.sum())
+    else:
+        total = _run_aggregate_circuit(circuit, vals)
+    return {"total": total, "average": total // len(vals)}
+
+
+def _histogram(vals, edges, circuit=None):
+    """{"edges", "counts", "rows"}: how many balances fall in each bucket."""
+    vals = np.asarray(vals, dtype=np.int64).reshape(-1)
+    if len(vals) > AGG_MAX_ROWS:
+        raise ValueError(f"histogram supports at most {AGG_MAX_ROWS} balances per call")
+    if len(vals) and (vals.min() < edges[0] or vals.max() > edges[-1]):
+        raise ValueError(f"histogram balances must be within {edges[0]}..{edges[-1]}")
+    if len(vals) == 0:
+        counts = np.zeros(len(edges) - 1, dtype=np.int64)
+    elif circuit is None:
+        counts, _ = np.histogram(vals, bins=edges)
+    else:
+        counts = np.asarray(_run_chunked_module(circuit, vals, "histogram", "chunk_counts", pad=PAD))
+    return {"edges": list(edges), "counts": [int(c) for c in counts], "rows": len(vals)}
+
+
+def _simulate_batch(op, arr):
+    """NumPy counterpart of the batched circuits; `arr` has shape (N, arity)."""
+    if op == "square":
+        return arr[:, 0] * arr[:, 0]
+    if op == "multiply":
+        return arr[:, 0] * arr[:, 1]
+    if op == "add":
+        return arr[:, 0] + arr[:, 1]
+    if op == "compare":
+        return arr[:, 0] > arr[:, 1]
+    raise ValueError("Unknown operation")
+
+
+def _simulate_ranking(op, x, k=1):
+    """NumPy counterpart of the ranking circuits on a padded vector `x`."""
+    if op == "rank_matrix":
+        return x[:, None] > x[None, :]
+    # a stable sort keeps the lower index first among ties, like _positions
+    order = np.argsort(-x, kind="stable")[:k]
+    return np.stack((order, x[order]))
+
+
+def _ranking_result(op, raw, n):
+    """Public shape of a ranking result for the first `n` (unpadded) values."""
+    if op == "rank_matrix":
+        return [[bool(v) for v in row[:n]] for row in np.asarray(raw)[:n]]
+    indices, values = np.asarray(raw).reshape(2, -1)
+    if op == "argmax":
+        return {"index": int(indices[0]), "max": int(values[0])}
+    return {"indices": [int(i) for i in indices], "values": [int(v) for v in values]}
+
+
 def _simulate(op, inputs):
     """Simple deterministic simulation to show the same semantics as the FHE demos."""
     try:
@@ -87,68 +710,254 @@ def _simulate(op, inputs):
         if op == "compare":
             return bool(int(inputs[0]) > int(inputs[1]))
         if op == "aggregate":
-            vals = [int(v) for v in inputs]
-            total = sum(vals)
-            avg = total // len(vals) if len(vals) > 0 else 0
-            return {"total": total, "average": avg}
+            return _aggregate(inputs)
+    except ValueError:
+        raise
     except Exception as e:
         raise RuntimeError(f"Simulation error: {e}")
 
 
 # ---------- Public API ----------
-def run_circuit(op, inputs):
+def _concrete_circuit(name, op, backend=None):
+    """
+    (circuit, backend that serves it) for circuit `name` (computing `op`):
+    the compiled circuit and "concrete", its FHE-simulation build and
+    "fhe-sim", or None and "simulated" when the simulated path should be
+    used instead (backend, concrete missing, or a failed compile under "auto").
+    """
+    backend = _check_backend(backend) if backend is not None else _backend
+    if backend == "simulated":
+        return None, "simulated"
+    if load_concrete() is None:
+        if backend != "auto":
+            raise RuntimeError(f"{backend} backend requested but concrete is not available")
+        # Concrete not available — simulation
+        FALLBACKS.inc(op=op, reason="concrete_unavailable")
+        return None, "simulated"
+    try:
+        if backend == "fhe-sim":
+            return CIRCUITS.simulator(name), "fhe-sim"
+        return CIRCUITS.get(name), "concrete"
+    except RuntimeError:
+        if backend != "auto":
+            ERRORS.inc(op=op, kind="compile")
+            raise
+        # compilation failed; details stay visible through readiness()
+        FALLBACKS.inc(op=op, reason="compile_failed")
+        return None, "simulated"
+
+
+def _run_ranking(op, inputs, bounds=None, k=None, backend=None):
+    """
+    rank_matrix → n×n list of bools ([i][j] = inputs[i] > inputs[j]),
+    argmax → {"index", "max"}, topk → {"indices", "values"} (largest first).
+    """
+    try:
+        n = len(inputs)
+        if not 1 <= n <= RANK_SIZE:
+            raise ValueError(f"'{op}' takes 1..{RANK_SIZE} values, got {n}")
+        if op == "topk":
+            if k is None or not 1 <= int(k) <= n:
+                raise ValueError(f"'topk' needs k within 1..{n}")
+            k = int(k)
+        lo, hi = _input_bounds(inputs, bounds)
+        bits = select_tier(hi, lo)
+    except ValueError:
+        ERRORS.inc(op=op, kind="invalid_input")
+        raise
+    x = np.zeros(RANK_SIZE, dtype=np.int64)
+    x[:n] = inputs
+    name = _topk_circuit(k, bits) if op == "topk" else tier_circuit_name(op, bits)
+    labels = metric_labels(op, bits)
+
+    circuit, served_by = _concrete_circuit(name, op, backend)
+    COMPUTATIONS.inc(backend=served_by, **labels)
+    if circuit is None:
+        raw = _run_simulated(labels, lambda: _simulate_ranking(op, x, k or 1))
+        return _ranking_result(op, raw, n)
+    try:
+        raw = _run_tensor_circuit(circuit, (x,), labels)
+    except Exception as e:
+        ERRORS.inc(op=op, kind="runtime")
+        err = traceback.format_exc()
+        raise RuntimeError(f"Concrete runtime error: {e}\n{err}")
+    return _ranking_result(op, raw, n)
+
+
+def _run_histogram(inputs, edges=None, backend=None):
+    try:
+        edges = histogram_edges(edges)
+    except ValueError:
+        ERRORS.inc(op="histogram", kind="invalid_input")
+        raise
+    name = _histogram_circuit(edges)
+    labels = metric_labels("histogram")
+    circuit, served_by = _concrete_circuit(name, "histogram", backend)
+    COMPUTATIONS.inc(backend=served_by, **labels)
+    try:
+        if circuit is None:
+            # measured per AGG_CHUNK-sized chunk, like aggregate
+            items = max(-(-len(inputs) // AGG_CHUNK), 1)
+            return _run_simulated(labels, lambda: _histogram(inputs, edges), items)
+        return _histogram(inputs, edges, circuit)
+    except ValueError:
+        ERRORS.inc(op="histogram", kind="invalid_input")
+        raise
+    except Exception as e:
+        ERRORS.inc(op="histogram", kind="runtime")
+        err = traceback.format_exc()
+        raise RuntimeError(f"Concrete runtime error: {e}\n{err}")
+
+
+def run_circuit(op, inputs, bounds=None, k=None, edges=None, backend=None):
     """
     Run operation `op` with `inputs` (list/tuple).
-    Returns an int, bool, or dict depending on operation.
-    If Concrete is available and compiled, this will use real FHE circuits.
-    Otherwise it falls back to simulation.
+    Returns an int, bool, list or dict depending on operation.
+    If Concrete is available the op's circuit is compiled on first use and
+    real FHE is used; otherwise (or if that circuit failed to compile) it
+    falls back to simulation.
+    Scalar and ranking ops run on the smallest bit-width tier holding
+    `bounds` ((lo, hi), default: the inputs' own range); out-of-range inputs
+    raise ValueError. `k` is the number of values "topk" returns and
+    `edges` the bucket edges of "histogram" (default HIST_EDGES).
+    `backend` overrides the process-wide backend for this call.
+    """
+    if op not in OPERATIONS:
+        ERRORS.inc(op="unknown", kind="invalid_input")
+        raise ValueError("Unknown operation")
+    if backend is not None:
+        _check_backend(backend)
+    if op in RANKING_OPS:
+        return _run_ranking(op, inputs, bounds, k, backend)
+    if op == "histogram":
+        return _run_histogram(inputs, edges, backend)
+    name, bits = op, None
+    if op != "aggregate":
+        try:
+            arity = len(BATCH_OPS[op][1])
+            if len(inputs) != arity:
+                raise ValueError(f"'{op}' expects {arity} input(s), got {len(inputs)}")
+            lo, hi = _input_bounds(inputs, bounds)
+            bits = select_tier(hi, lo)
+            name = tier_circuit_name(op, bits)
+        except ValueError:
+            ERRORS.inc(op=op, kind="invalid_input")
+            raise
+    labels = metric_labels(op, bits, None if op == "aggregate" else 1)
+    circuit, served_by = _concrete_circuit(name, op, backend)
+    COMPUTATIONS.inc(backend=served_by, **labels)
+    if circuit is None:
+        # the aggregate profile is measured per AGG_CHUNK-sized chunk
+        items = max(-(-len(inputs) // AGG_CHUNK), 1) if op == "aggregate" else 1
+        try:
+            return _run_simulated(labels, lambda: _simulate(op, inputs), items)
+        except ValueError:
+            ERRORS.inc(op=op, kind="invalid_input")
+            raise
+
+    try:
+        if op == "aggregate":
+            return _aggregate(inputs, circuit)
+        out = _run_concrete_circuit(circuit, inputs, labels)
+        if op == "compare":
+            return bool(out)
+        return int(out)
+    except ValueError:
+        ERRORS.inc(op=op, kind="invalid_input")
+        raise
+    except Exception as e:
+        # Concrete runtime failure -> surface info and fallback
+        ERRORS.inc(op=op, kind="runtime")
+        err = traceback.format_exc()
+        raise RuntimeError(f"Concrete runtime error: {e}\n{err}")
+
+
+def run_batch(op, rows, bounds=None, backend=None):
+    """
+    Run `op` over many input tuples at once, e.g. run_batch("add", [(1, 2), (3, 4)]).
+    `rows` may also be an (N, arity) NumPy array.
+    Rows are packed into BATCH_SIZE-wide tensors (the last chunk zero-padded),
+    so each chunk costs one encrypt, one run and one decrypt. The whole batch
+    runs on the smallest tier holding `bounds` (default: the rows' range).
+    With backend="fhe-sim" the chunks are simulated instead, which makes
+    sweeps over many rows cheap while matching the encrypted results.
+    Returns a list of ints (bools for "compare") in row order.
     """
-    if USING_CONCRETE:
+    if op not in BATCH_OPS:
+        ERRORS.inc(op="unknown", kind="invalid_input")
+        raise ValueError("Unknown operation")
+    if backend is not None:
+        _check_backend(backend)
+    arity = len(BATCH_OPS[op][1])
+    if len(rows) == 0:
+        return []
+    arr = np.asarray(rows, dtype=np.int64).reshape(len(rows), -1)
+    try:
+        if arr.shape[1] != arity:
+            raise ValueError(f"'{op}' expects {arity} input(s) per row, got {arr.shape[1]}")
+        lo, hi = _input_bounds(arr, bounds)
+        bits = select_tier(hi, lo)
+    except ValueError:
+        ERRORS.inc(op=op, kind="invalid_input")
+        raise
+
+    name = batch_circuit_name(op, bits)
+    labels = metric_labels(op, bits, BATCH_SIZE)
+    circuit, served_by = _concrete_circuit(name, op, backend)
+    COMPUTATIONS.inc(backend=served_by, **labels)
+    if circuit is None:
+        # a measured batch profile costs per tensor chunk, a scalar one per row
+        if latency_model().covers(name):
+            out = _run_simulated(labels, lambda: _simulate_batch(op, arr), -(-len(arr) // BATCH_SIZE),
+                                 latency_op=name)
+        else:
+            out = _run_simulated(labels, lambda: _simulate_batch(op, arr), len(arr))
+    else:
+        out = np.empty(len(arr), dtype=np.int64)
         try:
-            if op == "square":
-                out = _run_concrete_circuit(square_circuit, inputs)
-                return int(out)
-            if op == "multiply":
-                out = _run_concrete_circuit(multiply_circuit, inputs)
-                return int(out)
-            if op == "add":
-                out = _run_concrete_circuit(add_circuit, inputs)
-                return int(out)
-            if op == "compare":
-                out = _run_concrete_circuit(compare_circuit, inputs)
-                return bool(out)
-            if op == "aggregate":
-                # We didn't compile an aggregate circuit — do local arithmetic (aggregate is safe to do locally)
-                vals = [int(v) for v in inputs]
-                total = sum(vals)
-                avg = total // len(vals) if len(vals) > 0 else 0
-                return {"total": total, "average": avg}
-            raise ValueError("Unknown operation")
+            chunks = -(-len(arr) // BATCH_SIZE)
+            for n, start in enumerate(range(0, len(arr), BATCH_SIZE)):
+                chunk = arr[start:start + BATCH_SIZE]
+                padded = np.zeros((BATCH_SIZE, arity), dtype=np.int64)
+                padded[:len(chunk)] = chunk
+                res = _run_tensor_circuit(circuit, tuple(padded[:, i] for i in range(arity)), labels,
+                                          n + 1, chunks)
+                out[start:start + len(chunk)] = res[:len(chunk)]
         except Exception as e:
-            # Concrete runtime failure -> surface info and fallback
+            ERRORS.inc(op=op, kind="runtime")
             err = traceback.format_exc()
             raise RuntimeError(f"Concrete runtime error: {e}\n{err}")
-    else:
-        # Concrete not available — simulation
-        return _simulate(op, inputs)
+
+    if op == "compare":
+        return [bool(v) for v in out]
+    return [int(v) for v in out]
 
 
 def is_concrete_available():
     """Return (bool, message). If False, message explains why (if known)."""
-    if USING_CONCRETE:
-        return True, "Concrete is available and circuits compiled."
-    else:
-        msg = "Concrete not available or compilation failed."
-        if _compile_error:
-            msg += " Details:\n" + _compile_error.splitlines()[-4:][0] if _compile_error else ""
+    if load_concrete() is None:
+        msg = "Concrete not available."
+        err = concrete_import_error()
+        if err:
+            msg += " Details:\n" + err.strip().splitlines()[-1]
         return False, msg
+    failed = {op: s for op, s in CIRCUITS.readiness().items() if s["state"] == FAILED}
+    if failed:
+        details = "; ".join(f"{op}: {s.get('error', '')}" for op, s in failed.items())
+        return False, f"Concrete available but compilation failed. Details:\n{details}"
+    return True, "Concrete is available; circuits compile on first use."
 
 def encrypt(x):
-    if not FHE_AVAILABLE:
+    if load_concrete() is None:
         return x * 2  # fake encryption
     return x  # replace with real encryption when available
 
 def decrypt(y):
-    if not FHE_AVAILABLE:
+    if load_concrete() is None:
         return y / 2  # fake decryption
     return y
+
+
+# Opt-in: start compiling every circuit in the background at import time
+if os.environ.get("PRIVAGATOR_WARMUP", "").lower() in ("1", "true", "yes"):
+    warm_up()
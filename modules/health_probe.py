@@ -0,0 +1,65 @@
+"""
+Backend health checked in the background, so pages never wait on it.
+
+A daemon thread calls `check()` every `interval` seconds and keeps the
+latest outcome. `state()` answers immediately from that outcome; a result
+older than `ttl` seconds (the prober is stuck behind a slow backend) is
+reported as stale instead of being trusted. `refresh()` wakes the prober
+early, e.g. from a "retry" button.
+"""
+
+import threading
+import time
+
+
+class HealthProbe:
+    def __init__(self, check, interval=15.0, ttl=45.0):
+        self.check = check
+        self.interval = interval
+        self.ttl = ttl
+        self._state = {"ok": None, "checked_at": None, "latency": None, "error": None}
+        self._probes = 0
+        self._done = threading.Condition()
+        self._wake = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="health-probe", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            start = time.perf_counter()
+            try:
+                self.check()
+                ok, error = True, None
+            except Exception as e:
+                ok, error = False, str(e) or type(e).__name__
+            with self._done:
+                self._state = {"ok": ok, "checked_at": time.time(), "latency": time.perf_counter() - start,
+                               "error": error}
+                self._probes += 1
+                self._done.notify_all()
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def refresh(self, timeout=0):
+        """Probe again now; waits up to `timeout` seconds for the new result."""
+        with self._done:
+            seen = self._probes
+        self._wake.set()
+        with self._done:
+            return self._done.wait_for(lambda: self._probes > seen, timeout)
+
+    def wait(self, timeout):
+        """Block up to `timeout` seconds for the first probe; True once there is a result."""
+        with self._done:
+            return self._done.wait_for(lambda: self._probes > 0, timeout)
+
+    def state(self):
+        """Latest result: ok is True/False, or None while unknown or stale."""
+        with self._done:
+            state = dict(self._state)
+        age = time.time() - state["checked_at"] if state["checked_at"] is not None else None
+        state["age"] = age
+        state["stale"] = age is not None and age > self.ttl
+        if state["stale"]:
+            state["ok"] = None
+        return state
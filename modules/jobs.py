@@ -0,0 +1,160 @@
+"""
+Asynchronous jobs for the compute server.
+
+A job is a computation submitted with `POST /jobs` and followed with
+`GET /jobs/{id}` (status and per-stage progress) or `GET /jobs/{id}/events`
+(a server-sent event stream). The store lives on the server's event loop;
+workers report progress as (job_id, stage, done, total) tuples that the
+server feeds to `JobStore.progress`.
+
+Finished jobs are kept for `ttl` seconds, and at most `max_jobs` jobs are
+held at once: the oldest finished jobs are evicted first, and new jobs are
+refused while every slot holds a running one.
+"""
+
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+FINISHED = (DONE, FAILED)
+
+# order the stages are reported in, for the overall percentage
+STAGES = ("encrypt", "evaluate", "decrypt")
+
+
+class JobStoreFull(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, kind, op):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.op = op
+        self.state = QUEUED
+        self.stage = None
+        self.stages = {}  # stage -> [done, total]
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.seq = 0
+        self._changed = asyncio.Event()
+
+    def _touch(self):
+        self.seq += 1
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def percent(self):
+        if self.state == DONE:
+            return 100
+        known = [s for s in STAGES if s in self.stages]
+        if not known:
+            return 0
+        fraction = sum(min(d / t, 1.0) if t else 1.0 for d, t in (self.stages[s] for s in known))
+        return int(100 * fraction / len(STAGES))
+
+    def to_dict(self):
+        out = {
+            "id": self.id,
+            "kind": self.kind,
+            "op": self.op,
+            "state": self.state,
+            "stage": self.stage,
+            "stages": {s: {"done": d, "total": t} for s, (d, t) in self.stages.items()},
+            "percent": self.percent(),
+            "seq": self.seq,
+            "created": self.created,
+        }
+        if self.started is not None:
+            out["queue_time"] = round(self.started - self.created, 6)
+        if self.finished is not None:
+            out["elapsed"] = round(self.finished - self.created, 6)
+        if self.state == DONE:
+            out["result"] = self.result
+        if self.error is not None:
+            out["error"] = self.error
+        return out
+
+    async def wait(self, seq, timeout):
+        """Wait until the job changes past `seq` (or `timeout` s pass)."""
+        if self.seq > seq:
+            return
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+
+class JobStore:
+    """Bounded, TTL-evicting job table. Use from the event loop thread only."""
+
+    def __init__(self, max_jobs=1000, ttl=600.0):
+        self.max_jobs = max_jobs
+        self.ttl = ttl
+        self._jobs = OrderedDict()
+
+    def _evict(self):
+        now = time.time()
+        for job_id, job in list(self._jobs.items()):
+            if job.state in FINISHED and now - job.finished > self.ttl:
+                del self._jobs[job_id]
+        if len(self._jobs) < self.max_jobs:
+            return
+        # full: drop finished jobs oldest-first until a slot is free
+        for job_id, job in list(self._jobs.items()):
+            if job.state in FINISHED:
+                del self._jobs[job_id]
+                if len(self._jobs) < self.max_jobs:
+                    return
+        raise JobStoreFull(f"{self.max_jobs} jobs already running")
+
+    def create(self, kind, op):
+        self._evict()
+        job = Job(kind, op)
+        self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id):
+        job = self._jobs.get(job_id)
+        if job is not None and job.state in FINISHED and time.time() - job.finished > self.ttl:
+            del self._jobs[job_id]
+            return None
+        return job
+
+    def progress(self, job_id, stage, done, total):
+        job = self._jobs.get(job_id)
+        if job is None or job.state in FINISHED:
+            return
+        if job.state == QUEUED:
+            job.state = RUNNING
+            job.started = time.time()
+        job.stage = stage
+        job.stages[stage] = [done, total]
+        job._touch()
+
+    def finish(self, job_id, result):
+        job = self._jobs.get(job_id)
+        if job is not None:
+            job.state, job.result, job.finished = DONE, result, time.time()
+            job._touch()
+
+    def fail(self, job_id, error):
+        job = self._jobs.get(job_id)
+        if job is not None:
+            job.state, job.error, job.finished = FAILED, error, time.time()
+            job._touch()
+
+    def stats(self):
+        counts = {}
+        for job in self._jobs.values():
+            counts[job.state] = counts.get(job.state, 0) + 1
+        return {"jobs": len(self._jobs), "max_jobs": self.max_jobs, "ttl": self.ttl, **counts}
@@ -0,0 +1,268 @@
+"""
+Server-side store of clients' evaluation keys, one entry per session.
+
+The client keeps its secret key; the server only needs the evaluation keys,
+which are far larger than the ciphertexts of a request. `POST /sessions`
+uploads them once and returns a session id. Later encrypted requests name
+the session instead of carrying the keys.
+
+Sessions live in memory up to `max_bytes` of key material. Beyond that, the
+least recently used sessions are evicted: spilled to `spill_dir` when one is
+configured (and read back on their next use), dropped otherwise. A session
+unused for `ttl` seconds expires wherever it is held.
+
+Pool workers keep their own small LRU of deserialized keys (`WorkerKeyCache`)
+so a warm session skips both the transfer and the deserialization. It is
+bounded by serialized bytes like the store, so session keys take at most
+the store's `max_bytes` plus each worker's budget.
+"""
+
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from modules.metrics import REGISTRY
+
+
+KEY_STORE_LOOKUPS = REGISTRY.counter(
+    "privagator_key_store_lookups_total", "Session lookups by where the keys were (memory, disk, miss)",
+    ("result",))
+KEY_STORE_EVICTIONS = REGISTRY.counter(
+    "privagator_key_store_evictions_total", "Sessions leaving memory by reason (spill, drop, expired, closed)",
+    ("reason",))
+KEY_STORE_RELOADS = REGISTRY.counter(
+    "privagator_key_store_reloads_total", "Spilled sessions read back into memory")
+KEY_STORE_BYTES = REGISTRY.gauge(
+    "privagator_key_store_bytes", "Evaluation key bytes held by the session store", ("tier",))
+KEY_STORE_SESSIONS = REGISTRY.gauge(
+    "privagator_key_store_sessions", "Sessions held by the session store", ("tier",))
+WORKER_KEY_CACHE = REGISTRY.counter(
+    "privagator_worker_key_cache_total", "Deserialized-key lookups in pool workers by result", ("result",))
+
+_SESSION_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+class SessionNotFound(KeyError):
+    pass
+
+
+class KeyStoreFull(Exception):
+    pass
+
+
+class KeysNeeded(Exception):
+    """Raised in a worker that doesn't hold a session's keys yet; the caller resends with the keys."""
+
+
+class _Session:
+    def __init__(self, session_id, blob, meta):
+        self.id = session_id
+        self.blob = blob
+        self.size = len(blob)
+        self.meta = meta
+        self.created = time.time()
+        self.last_used = self.created
+
+
+class KeyStore:
+    """Evaluation keys per session, bounded in memory, optionally spilled to disk. Thread-safe."""
+
+    def __init__(self, max_bytes=256 * 1024 * 1024, ttl=3600.0, spill_dir=None, max_key_bytes=None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.spill_dir = spill_dir
+        self.max_key_bytes = max_key_bytes or max_bytes
+        self._memory = OrderedDict()  # session id -> _Session, least recently used first
+        self._spilled = {}  # session id -> (size, meta, created, last_used)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        if spill_dir:
+            os.makedirs(spill_dir, mode=0o700, exist_ok=True)
+
+    def _path(self, session_id):
+        return os.path.join(self.spill_dir, f"{session_id}.evk")
+
+    # ---------- Eviction ----------
+    def _expire(self, now):
+        cutoff = now - self.ttl
+        expired = [sid for sid, s in self._memory.items() if s.last_used < cutoff]
+        expired += [sid for sid, (_, _, _, last_used) in self._spilled.items() if last_used < cutoff]
+        for session_id in expired:
+            self._forget(session_id, "expired")
+        if expired:
+            self._update_gauges()
+
+    def _fit(self, incoming):
+        """Evict least recently used sessions until `incoming` more bytes fit in memory."""
+        while self._memory and self._bytes + incoming > self.max_bytes:
+            session_id, session = self._memory.popitem(last=False)
+            self._bytes -= session.size
+            if self.spill_dir:
+                with open(self._path(session_id), "wb") as f:
+                    f.write(session.blob)
+                self._spilled[session_id] = (session.size, session.meta, session.created, session.last_used)
+                KEY_STORE_EVICTIONS.inc(reason="spill")
+            else:
+                KEY_STORE_EVICTIONS.inc(reason="drop")
+
+    def _forget(self, session_id, reason):
+        session = self._memory.pop(session_id, None)
+        if session is not None:
+            self._bytes -= session.size
+        if self._spilled.pop(session_id, None) is not None:
+            try:
+                os.remove(self._path(session_id))
+            except FileNotFoundError:
+                pass
+        KEY_STORE_EVICTIONS.inc(reason=reason)
+
+    def _admit(self, session):
+        self._fit(session.size)
+        self._memory[session.id] = session
+        self._bytes += session.size
+
+    def _update_gauges(self):
+        KEY_STORE_BYTES.set(self._bytes, tier="memory")
+        KEY_STORE_BYTES.set(sum(size for size, _, _, _ in self._spilled.values()), tier="disk")
+        KEY_STORE_SESSIONS.set(len(self._memory), tier="memory")
+        KEY_STORE_SESSIONS.set(len(self._spilled), tier="disk")
+
+    # ---------- API ----------
+    def create(self, blob, meta=None):
+        """Store evaluation keys `blob`; returns the new session id."""
+        if len(blob) > self.max_key_bytes:
+            raise KeyStoreFull(f"Evaluation keys of {len(blob)} bytes exceed the {self.max_key_bytes} byte limit")
+        session = _Session(uuid.uuid4().hex, bytes(blob), dict(meta or {}))
+        with self._lock:
+            self._expire(time.time())
+            self._admit(session)
+            self._update_gauges()
+        return session.id
+
+    def touch(self, session_id):
+        """
+        Mark the session used now without loading its keys (a worker may
+        already hold them); SessionNotFound when it is unknown or expired.
+        """
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            session = self._memory.get(session_id)
+            if session is not None:
+                session.last_used = now
+                self._memory.move_to_end(session_id)
+                KEY_STORE_LOOKUPS.inc(result="memory")
+                return
+            if session_id in self._spilled:
+                size, meta, created, _ = self._spilled[session_id]
+                self._spilled[session_id] = (size, meta, created, now)
+                KEY_STORE_LOOKUPS.inc(result="disk")
+                return
+        KEY_STORE_LOOKUPS.inc(result="miss")
+        raise SessionNotFound(session_id)
+
+    def get(self, session_id):
+        """The session's key blob, read back into memory if it was spilled."""
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            session = self._memory.get(session_id)
+            if session is not None:
+                session.last_used = now
+                self._memory.move_to_end(session_id)
+                return session.blob
+            spilled = self._spilled.pop(session_id, None)
+            if spilled is None:
+                raise SessionNotFound(session_id)
+            size, meta, created, _ = spilled
+            path = self._path(session_id)
+            with open(path, "rb") as f:
+                session = _Session(session_id, f.read(), meta)
+            os.remove(path)
+            session.created, session.last_used = created, now
+            self._admit(session)
+            self._update_gauges()
+            KEY_STORE_RELOADS.inc()
+            return session.blob
+
+    def close(self, session_id):
+        with self._lock:
+            if session_id not in self._memory and session_id not in self._spilled:
+                raise SessionNotFound(session_id)
+            self._forget(session_id, "closed")
+            self._update_gauges()
+
+    def sweep(self):
+        """Drop expired sessions now (they are otherwise dropped lazily)."""
+        with self._lock:
+            self._expire(time.time())
+            self._update_gauges()
+
+    def describe(self, session_id):
+        with self._lock:
+            session = self._memory.get(session_id)
+            if session is not None:
+                return {"id": session_id, "tier": "memory", "bytes": session.size, "created": session.created,
+                        "last_used": session.last_used, **session.meta}
+            if session_id in self._spilled:
+                size, meta, created, last_used = self._spilled[session_id]
+                return {"id": session_id, "tier": "disk", "bytes": size, "created": created,
+                        "last_used": last_used, **meta}
+        raise SessionNotFound(session_id)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "sessions": len(self._memory) + len(self._spilled),
+                "memory_sessions": len(self._memory),
+                "memory_bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "spilled_sessions": len(self._spilled),
+                "spill_dir": self.spill_dir,
+                "ttl": self.ttl,
+            }
+
+
+def valid_session_id(session_id):
+    return isinstance(session_id, str) and bool(_SESSION_ID.match(session_id))
+
+
+class WorkerKeyCache:
+    """
+    Small LRU of deserialized evaluation keys inside one pool worker, bounded
+    by their serialized size (`max_bytes`), which a deserialized keyset
+    roughly matches.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # session id -> (keys, size), least recently used first
+        self._bytes = 0
+
+    def get(self, session_id):
+        entry = self._entries.get(session_id)
+        if entry is None:
+            WORKER_KEY_CACHE.inc(result="miss")
+            return None
+        self._entries.move_to_end(session_id)
+        WORKER_KEY_CACHE.inc(result="hit")
+        return entry[0]
+
+    def put(self, session_id, keys, size):
+        """Keep `keys` (`size` serialized bytes); keys larger than the whole budget are not kept."""
+        previous = self._entries.pop(session_id, None)
+        if previous is not None:
+            self._bytes -= previous[1]
+        if size > self.max_bytes:
+            return
+        self._entries[session_id] = (keys, size)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self._bytes -= evicted
+
+    def stats(self):
+        return {"sessions": len(self._entries), "bytes": self._bytes, "max_bytes": self.max_bytes}
@@ -0,0 +1,129 @@
+"""
+Shared, persisted keysets for compiled circuits.
+
+Without this, every circuit generates its own keys on its first `encrypt`,
+so the first call of each op stalls on key generation and memory holds one
+evaluation keyset per circuit. The manager instead:
+
+- generates keys once per deployment (or per tenant) and keyset parameters,
+- persists them under `<key dir>/<tenant>/<keyset id>.keys` and reloads
+  them on the next start,
+- hands the same `fhe.Keys` object to every circuit whose keyset
+  parameters match,
+- records keygen/load time and key sizes when keys are attached, so
+  `stats()` only reports numbers it already has.
+
+The key directory holds secret keys: it is created with 0700 permissions
+and should live on local, non-shared storage.
+"""
+
+import hashlib
+import os
+import threading
+import time
+
+
+DEFAULT_KEY_DIR = os.path.join(os.path.expanduser("~"), ".cache", "privagator", "keys")
+
+
+def keyset_fingerprint(client):
+    """
+    Identifier of the keyset parameters a client needs. Circuits with the
+    same fingerprint can share keys.
+    """
+    specs = client.specs
+    try:
+        blob = specs.program_info.get_keyset_info().serialize()
+    except Exception:
+        # older runtimes: the full specs are a stricter (never wrong) key
+        blob = specs.serialize()
+    return hashlib.sha256(blob).hexdigest()[:16]
+
+
+class _Keyset:
+    def __init__(self, keyset_id, tenant, keys, path):
+        self.keyset_id = keyset_id
+        self.tenant = tenant
+        self.keys = keys
+        self.path = path
+        self.circuits = []
+        self.keygen_time = None
+        self.load_time = None
+        self.sizes = {}
+
+    def measure(self, client):
+        # serializing evaluation keys is not free; done once, when the keys are attached
+        self.sizes = {"evaluation_bytes": len(client.evaluation_keys.serialize())}
+        if self.path and os.path.exists(self.path):
+            self.sizes["file_bytes"] = os.path.getsize(self.path)
+
+
+class KeysetManager:
+    def __init__(self, directory=None, tenant=None):
+        if directory is None:
+            directory = os.environ.get("PRIVAGATOR_KEY_DIR", DEFAULT_KEY_DIR)
+        self.directory = directory  # "" keeps keys in memory only
+        self.tenant = tenant or os.environ.get("PRIVAGATOR_TENANT", "default")
+        self._keysets = {}
+        self._lock = threading.Lock()
+
+    def _path(self, tenant, keyset_id):
+        if not self.directory:
+            return None
+        tenant_dir = os.path.join(self.directory, tenant)
+        os.makedirs(tenant_dir, mode=0o700, exist_ok=True)
+        return os.path.join(tenant_dir, f"{keyset_id}.keys")
+
+    def attach(self, circuit, tenant=None):
+        """
+        Give `circuit` (a CachedCircuit) the shared keys for its parameters,
+        loading them from disk or generating (and saving) them the first time.
+        """
+        tenant = tenant or self.tenant
+        keyset_id = keyset_fingerprint(circuit.client)
+        with self._lock:
+            keyset = self._keysets.get((tenant, keyset_id))
+            if keyset is None:
+                keys = circuit.client.keys
+                path = self._path(tenant, keyset_id)
+                start = time.perf_counter()
+                if path is None:
+                    keys.generate()
+                    loaded = False
+                else:
+                    loaded = os.path.exists(path)
+                    keys.load_if_exists_generate_and_save_otherwise(path)
+                    os.chmod(path, 0o600)
+                keyset = _Keyset(keyset_id, tenant, keys, path)
+                if loaded:
+                    keyset.load_time = time.perf_counter() - start
+                else:
+                    keyset.keygen_time = time.perf_counter() - start
+                keyset.measure(circuit.client)
+                self._keysets[(tenant, keyset_id)] = keyset
+            else:
+                circuit.client.keys = keyset.keys
+            keyset.circuits.append(circuit.name)
+        return keyset_id
+
+    def stats(self):
+        """Per-keyset circuits, timings and sizes, all recorded at attach time."""
+        keysets = []
+        with self._lock:
+            for (tenant, keyset_id), keyset in self._keysets.items():
+                entry = {
+                    "id": keyset_id,
+                    "tenant": tenant,
+                    "circuits": list(keyset.circuits),
+                    "persisted": keyset.path is not None,
+                }
+                if keyset.keygen_time is not None:
+                    entry["keygen_time"] = round(keyset.keygen_time, 3)
+                if keyset.load_time is not None:
+                    entry["load_time"] = round(keyset.load_time, 3)
+                entry.update(keyset.sizes)
+                keysets.append(entry)
+        return {"directory": self.directory or None, "tenant": self.tenant, "keysets": keysets}
+
+
+KEYSETS = KeysetManager()
@@ -0,0 +1,219 @@
+"""
+Process-local latency histograms, counters and gauges, Prometheus text exposition.
+
+`REGISTRY.snapshot()` is the in-process API; `REGISTRY.render()` produces the
+Prometheus text format served on the compute server's `/metrics`.
+
+Pool workers run in other processes, so their observations would be lost
+in the parent. `capture()` records every observation made by the current
+thread into a list as well; the worker returns that list and the parent
+feeds it to `REGISTRY.replay()`.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_local = threading.local()
+
+
+def _captured():
+    return getattr(_local, "events", None)
+
+
+@contextmanager
+def capture():
+    """Collect (metric, labels, value) events observed by this thread."""
+    previous = _captured()
+    events = []
+    _local.events = events
+    try:
+        yield events
+    finally:
+        _local.events = previous
+        if previous is not None:
+            previous.extend(events)
+
+
+def _label_key(labelnames, labels):
+    if set(labels) != set(labelnames):
+        raise ValueError(f"Expected labels {labelnames}, got {sorted(labels)}")
+    return tuple(str(labels[name]) for name in labelnames)
+
+
+def _format_labels(labelnames, key, extra=None):
+    pairs = list(zip(labelnames, key))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    inner = ",".join('{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in pairs)
+    return "{" + inner + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        self._apply(_label_key(self.labelnames, labels), amount)
+        events = _captured()
+        if events is not None:
+            events.append((self.name, labels, amount))
+
+    def _apply(self, key, amount):
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            return [{"labels": dict(zip(self.labelnames, k)), "value": v} for k, v in self._values.items()]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    """A value that goes up and down (e.g. bytes held); `set` replaces it."""
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = value
+        events = _captured()
+        if events is not None:
+            events.append((self.name, labels, ("set", value)))
+
+    def _apply(self, key, amount):
+        if isinstance(amount, tuple):
+            with self._lock:
+                self._values[key] = amount[1]
+        else:
+            super()._apply(key, amount)
+
+    def render(self):
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # key -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        self._apply(_label_key(self.labelnames, labels), value)
+        events = _captured()
+        if events is not None:
+            events.append((self.name, labels, value))
+
+    def _apply(self, key, value):
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            else:
+                series[len(self.buckets)] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def snapshot(self):
+        out = []
+        with self._lock:
+            for key, series in self._series.items():
+                count = sum(series[:-1])
+                out.append({
+                    "labels": dict(zip(self.labelnames, key)),
+                    "count": count,
+                    "sum": series[-1],
+                    "mean": series[-1] / count if count else 0.0,
+                    "buckets": dict(zip([*map(str, self.buckets), "+Inf"], series[:-1])),
+                })
+        return out
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, n in zip([*map(repr, self.buckets), "+Inf"], series[:-1]):
+                    cumulative += n
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', bound))} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {series[-1]}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self._register(Counter(name, help, labelnames))
+
+    def gauge(self, name, help, labelnames=()):
+        return self._register(Gauge(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def replay(self, events):
+        """Apply events captured in another process."""
+        for name, labels, value in events or ():
+            metric = self._metrics.get(name)
+            if metric is not None:
+                metric._apply(_label_key(metric.labelnames, labels), value)
+
+    def snapshot(self):
+        return {name: {"type": m.kind, "series": m.snapshot()} for name, m in self._metrics.items()}
+
+    def render(self):
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
@@ -0,0 +1,105 @@
+"""
+Intra-circuit parallelism and worker CPU placement.
+
+A compiled circuit can evaluate its tensor operations in parallel. The mode
+is fixed at compile time, and the thread count is read by the runtime when
+it first runs a circuit:
+
+    off       sequential evaluation
+    loop      parallel tensor loops (OpenMP), Concrete's default
+    dataflow  independent parts of the circuit run as parallel tasks (needs a
+              concrete-python build with the dataflow runtime)
+    auto      let the compiler decide where to parallelize
+
+Several server workers that each use every core oversubscribe the machine.
+`cpu_slices` splits the CPUs this process may use into one contiguous slice
+per worker, and `pin` keeps a worker on its slice. The thread count should
+then match the slice size.
+
+    PRIVAGATOR_PARALLELISM   "loop" for every circuit, or e.g. "loop,aggregate=dataflow"
+                             to override single ops or circuits
+    PRIVAGATOR_THREADS       threads per evaluation (sets OMP_NUM_THREADS)
+"""
+
+import os
+
+
+MODES = ("off", "loop", "dataflow", "auto")
+DEFAULT_MODE = "loop"
+
+
+def options(mode):
+    """`fhe.Configuration` keyword arguments for `mode`."""
+    if mode not in MODES:
+        raise ValueError(f"Unknown parallelism mode '{mode}' (expected one of {', '.join(MODES)})")
+    return {
+        "loop_parallelize": mode == "loop",
+        "dataflow_parallelize": mode == "dataflow",
+        "auto_parallelize": mode == "auto",
+    }
+
+
+def parse_spec(spec=None):
+    """
+    (default mode, {op or circuit name: mode}) from a spec such as
+    "loop,aggregate=dataflow,add_10bit@64=off"; PRIVAGATOR_PARALLELISM when omitted.
+    """
+    spec = spec if spec is not None else os.environ.get("PRIVAGATOR_PARALLELISM", "")
+    default, overrides = DEFAULT_MODE, {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        name, _, mode = part.rpartition("=")
+        options(mode)  # validates
+        if name:
+            overrides[name.strip()] = mode
+        else:
+            default = mode
+    return default, overrides
+
+
+def available_cpus():
+    """CPUs this process may run on."""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def cpu_slices(workers, cpus=None):
+    """
+    Split `cpus` into `workers` contiguous, near-equal slices. With more
+    workers than CPUs, each worker gets one CPU and CPUs are shared in turn.
+    """
+    cpus = list(cpus if cpus is not None else available_cpus())
+    if workers >= len(cpus):
+        return [[cpus[i % len(cpus)]] for i in range(workers)]
+    size, extra = divmod(len(cpus), workers)
+    slices, start = [], 0
+    for i in range(workers):
+        end = start + size + (1 if i < extra else 0)
+        slices.append(cpus[start:end])
+        start = end
+    return slices
+
+
+def pin(cpus):
+    """Restrict this process to `cpus`; False where the platform can't."""
+    if not hasattr(os, "sched_setaffinity"):
+        return False
+    os.sched_setaffinity(0, cpus)
+    return True
+
+
+def set_threads(threads):
+    """
+    Threads per circuit evaluation. Only takes effect if called before the
+    Concrete runtime starts in this process, e.g. in a pool worker's initializer.
+    """
+    if threads:
+        os.environ["OMP_NUM_THREADS"] = str(int(threads))
+
+
+def get_threads():
+    value = os.environ.get("OMP_NUM_THREADS") or os.environ.get("PRIVAGATOR_THREADS")
+    return int(value) if value else len(available_cpus())
+
+
+set_threads(os.environ.get("PRIVAGATOR_THREADS"))
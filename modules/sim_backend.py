@@ -0,0 +1,157 @@
+"""
+Latency model for the simulated backend.
+
+The simulated backend computes results with NumPy; this module decides how
+long that should appear to take:
+
+    zero   no added latency (load tests, CI) — the default
+    model  replay per-op, per-stage latency distributions from a profile
+           file measured on real Concrete runs
+
+Profiles are written by `python benchmark_fhe.py --emit-profile PATH` and
+look like:
+
+    {"meta": {...},
+     "ops": {"add": {"encrypt": {"min": .., "p50": .., "p90": .., "p99": .., "max": ..},
+                     "run": {...}, "decrypt": {...}}, ...}}
+
+Each stage is sampled from a piecewise-linear inverse CDF through those
+quantiles, so the simulated tail looks like the measured one. Only profiles
+written by the benchmark count as measured (`profile_is_measured`); the
+shipped one is a placeholder, so nothing defaults to "model" on it.
+
+    PRIVAGATOR_SIM_LATENCY   zero | model
+    PRIVAGATOR_SIM_PROFILE   profile path (default profiles/simulated_latency.json)
+"""
+
+import json
+import os
+import random
+import re
+import threading
+import time
+
+
+MODES = ("zero", "model")
+STAGES = ("encrypt", "run", "decrypt")
+DEFAULT_PROFILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                               "profiles", "simulated_latency.json")
+
+MEASURED_SOURCE = "benchmark_fhe"
+
+# (cumulative probability, quantile key) knots of the inverse CDF
+_KNOTS = ((0.0, "min"), (0.5, "p50"), (0.9, "p90"), (0.99, "p99"), (1.0, "max"))
+# bit-width tier suffix of circuit names ("add_4bit", "add_4bit@64")
+_TIER_SUFFIX = re.compile(r"_\d+bit(?=@|$)")
+
+
+def load_profile(path=None):
+    """The parsed profile; one without ops when the file is missing."""
+    path = path or os.environ.get("PRIVAGATOR_SIM_PROFILE") or DEFAULT_PROFILE
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"ops": {}}
+
+
+def profile_is_measured(profile=None):
+    """Whether `profile` (default: the configured file) came from real benchmark runs."""
+    profile = load_profile() if profile is None else profile
+    meta = profile.get("meta", {})
+    return meta.get("source") == MEASURED_SOURCE and not meta.get("placeholder", False)
+
+
+def _sample(dist, u):
+    points = [(p, float(dist[k])) for p, k in _KNOTS if k in dist]
+    if not points:
+        return 0.0
+    if u <= points[0][0]:
+        return points[0][1]
+    for (p0, v0), (p1, v1) in zip(points, points[1:]):
+        if u <= p1:
+            return v0 + (v1 - v0) * (u - p0) / (p1 - p0) if p1 > p0 else v1
+    return points[-1][1]
+
+
+class LatencyModel:
+    def __init__(self, mode="zero", profile=None, seed=None):
+        if mode not in MODES:
+            raise ValueError(f"Unknown simulated latency mode '{mode}', expected one of {MODES}")
+        self.mode = mode
+        self.profile = profile if profile is not None else (load_profile() if mode == "model" else {"ops": {}})
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _stages(self, op):
+        ops = self.profile.get("ops", {})
+        # tiered and batched variants ("add_4bit@64") fall back to "add@64",
+        # then "add_4bit", then the plain op's profile
+        untiered = _TIER_SUFFIX.sub("", op)
+        for name in (op, untiered, op.split("@")[0], untiered.split("@")[0]):
+            if name in ops:
+                return ops[name]
+        return {}
+
+    def covers(self, op):
+        """Whether the profile has measurements for `op` itself, tier suffix aside."""
+        ops = self.profile.get("ops", {})
+        return op in ops or _TIER_SUFFIX.sub("", op) in ops
+
+    def sample(self, op, stage):
+        """One simulated duration in seconds for `stage` of `op`."""
+        if self.mode == "zero":
+            return 0.0
+        dist = self._stages(op).get(stage)
+        if not dist:
+            return 0.0
+        with self._lock:
+            u = self._rng.random()
+        return _sample(dist, u)
+
+    def expected(self, op, stages=STAGES, items=1):
+        """Median total for `stages`, e.g. to label a progress bar."""
+        if self.mode == "zero":
+            return 0.0
+        profile = self._stages(op)
+        return items * sum(float(profile.get(s, {}).get("p50", 0.0)) for s in stages)
+
+    def wait(self, op, stages=STAGES, items=1, sleep=time.sleep):
+        """
+        Block for as long as `items` evaluations of `op` would take on the
+        measured backend and return the seconds waited.
+        """
+        if self.mode == "zero":
+            return 0.0
+        total = sum(self.sample(op, s) for s in stages for _ in range(items))
+        if total > 0:
+            sleep(total)
+        return total
+
+
+_models = {}
+_models_lock = threading.Lock()
+
+
+def latency_model(default="zero"):
+    """
+    The process-wide model; PRIVAGATOR_SIM_LATENCY overrides `default`.
+    Everything defaults to "zero"; the Streamlit demo pages ask for "model"
+    only once `profile_is_measured()`.
+    """
+    mode = os.environ.get("PRIVAGATOR_SIM_LATENCY") or default
+    with _models_lock:
+        if mode not in _models:
+            _models[mode] = LatencyModel(mode)
+        return _models[mode]
+
+
+def configure(mode=None, profile_path=None):
+    """Pin the mode (and optionally the profile) for this process, e.g. in a pool worker."""
+    if mode:
+        os.environ["PRIVAGATOR_SIM_LATENCY"] = mode
+    if profile_path:
+        os.environ["PRIVAGATOR_SIM_PROFILE"] = profile_path
+    with _models_lock:
+        _models.clear()
+    return latency_model()
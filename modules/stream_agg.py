@@ -0,0 +1,245 @@
+"""
+Streaming aggregation of balance files too large to hold in memory.
+
+    python -m modules.stream_agg balances.csv --column balance --workers 4
+    python -m modules.stream_agg balances.parquet --column balance --max-in-flight 8
+
+The file is read in blocks of `block_rows` (CSV through pandas, Parquet
+through pyarrow). Pool workers split each block into AGG_CHUNK-sized chunks
+and encrypt them with the aggregate circuit's keys, which they load from the
+shared key directory. The parent feeds every encrypted chunk through
+`chunk_total` and folds it into a running encrypted sum with `combine`.
+At most `max_in_flight` blocks are being read, encrypted or reduced at any
+time, so memory stays bounded however large the file is.
+
+The aggregate circuit holds totals of up to AGG_MAX_ROWS balances. Once the
+running sum has seen that many rows it is decrypted and added to a plaintext
+total, and a fresh encrypted sum starts for the next rows.
+
+Without concrete the same pipeline runs on the simulated backend.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+from modules import fhe_core
+from modules.circuit_registry import load_concrete
+from modules.keyset import KEYSETS
+
+
+DEFAULT_BLOCK_ROWS = 16 * fhe_core.AGG_CHUNK
+
+
+# ---------- Reading ----------
+def iter_blocks(path, column=None, block_rows=DEFAULT_BLOCK_ROWS, fmt=None):
+    """Yield the balances of `column` (default: the first one) as int64 arrays of up to `block_rows`."""
+    fmt = fmt or ("parquet" if path.endswith((".parquet", ".pq")) else "csv")
+    if fmt == "csv":
+        import pandas as pd
+        usecols = [column] if column is not None else [0]
+        for frame in pd.read_csv(path, usecols=usecols, chunksize=block_rows):
+            yield _balances(frame.iloc[:, 0].to_numpy())
+    elif fmt == "parquet":
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Reading Parquet files needs pyarrow (pip install pyarrow)")
+        parquet = pq.ParquetFile(path)
+        columns = [column] if column is not None else [parquet.schema_arrow.names[0]]
+        for batch in parquet.iter_batches(batch_size=block_rows, columns=columns):
+            yield _balances(batch.column(0).to_numpy(zero_copy_only=False))
+    else:
+        raise ValueError(f"Unknown file format '{fmt}' (expected csv or parquet)")
+
+
+def _balances(values):
+    values = np.asarray(values)
+    if values.dtype.kind == "f":
+        if np.isnan(values).any():
+            raise ValueError("balances must not be missing")
+        if (values != np.floor(values)).any():
+            raise ValueError("balances must be integers")
+    return values.astype(np.int64)
+
+
+# ---------- Worker side ----------
+_circuit = None
+
+
+def _init_worker(backend):
+    global _circuit
+    fhe_core.set_backend(backend)
+    if backend == "concrete":
+        # loaded from the circuit cache, keys from the key directory the parent filled
+        _circuit = fhe_core.CIRCUITS.get("aggregate")
+
+
+def _chunks(block):
+    for start in range(0, len(block), fhe_core.AGG_CHUNK):
+        chunk = np.zeros(fhe_core.AGG_CHUNK, dtype=np.int64)
+        part = block[start:start + fhe_core.AGG_CHUNK]
+        chunk[:len(part)] = part
+        yield chunk, len(part)
+
+
+def _encrypt_block(block):
+    """[(serialized ciphertext of one chunk, rows in it), ...] for one block."""
+    if _circuit is None:
+        # simulated: the "ciphertext" is the chunk itself
+        return [(chunk.tobytes(), rows) for chunk, rows in _chunks(block)]
+    return [(_circuit.encrypt(chunk, function_name="chunk_total").serialize(), rows)
+            for chunk, rows in _chunks(block)]
+
+
+# ---------- Running sums ----------
+class _EncryptedRunningSum:
+    """Encrypted sum of chunks, settled into a plaintext total every AGG_MAX_ROWS rows."""
+
+    def __init__(self, circuit):
+        self.circuit = circuit
+        self.fhe = load_concrete()
+        self.partial = None
+        self.produced_by = None
+        self.rows = 0
+        self.settled = 0
+
+    def add(self, blob, rows):
+        if self.rows + rows > fhe_core.AGG_MAX_ROWS:
+            self.settle()
+        value = self.fhe.Value.deserialize(blob)
+        total = self.circuit.run(value, function_name="chunk_total")
+        if self.partial is None:
+            self.partial, self.produced_by = total, "chunk_total"
+        else:
+            self.partial = self.circuit.run(self.partial, total, function_name="combine")
+            self.produced_by = "combine"
+        self.rows += rows
+
+    def settle(self):
+        if self.partial is not None:
+            self.settled += int(self.circuit.decrypt(self.partial, function_name=self.produced_by))
+        self.partial, self.produced_by, self.rows = None, None, 0
+        return self.settled
+
+
+class _SimulatedRunningSum:
+    def __init__(self):
+        self.settled = 0
+
+    def add(self, blob, rows):
+        self.settled += int(np.frombuffer(blob, dtype=np.int64).sum())
+
+    def settle(self):
+        return self.settled
+
+
+# ---------- Pipeline ----------
+def _resolve_backend(backend):
+    if backend == "auto":
+        return "concrete" if load_concrete() is not None else "simulated"
+    if backend == "concrete" and load_concrete() is None:
+        raise RuntimeError("Concrete backend requested but concrete is not available")
+    return backend
+
+
+def stream_aggregate(blocks, workers=None, max_in_flight=None, backend="auto", on_progress=None,
+                     progress_interval=1.0):
+    """
+    Encrypted total of every balance yielded by `blocks`, plus the average
+    computed in plaintext from the decrypted total and the public row count.
+    `on_progress(rows, seconds)` is called at most every `progress_interval`
+    seconds and once at the end.
+    """
+    backend = _resolve_backend(backend)
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = max_in_flight or 2 * workers
+    if backend == "concrete":
+        if not KEYSETS.directory:
+            raise RuntimeError("Streaming with concrete needs a persistent key directory (PRIVAGATOR_KEY_DIR)")
+        # compile (or load) once here so every worker loads the cached circuit and saved keys
+        running = _EncryptedRunningSum(fhe_core.CIRCUITS.get("aggregate"))
+    else:
+        running = _SimulatedRunningSum()
+
+    start = last_report = time.perf_counter()
+    rows = 0
+    in_flight = set()
+
+    def drain():
+        nonlocal rows, last_report
+        done, pending = wait(in_flight, return_when=FIRST_COMPLETED)
+        in_flight.intersection_update(pending)
+        for future in done:
+            for blob, count in future.result():
+                running.add(blob, count)
+                rows += count
+        now = time.perf_counter()
+        if on_progress is not None and now - last_report >= progress_interval:
+            last_report = now
+            on_progress(rows, now - start)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(backend,)) as pool:
+        offset = 0
+        for block in blocks:
+            if len(block) and (block.min() < 0 or block.max() > fhe_core.AGG_MAX_BALANCE):
+                bad = offset + int(np.argmax((block < 0) | (block > fhe_core.AGG_MAX_BALANCE)))
+                raise ValueError(f"row {bad}: balances must be within 0..{fhe_core.AGG_MAX_BALANCE}")
+            offset += len(block)
+            while len(in_flight) >= max_in_flight:
+                drain()
+            in_flight.add(pool.submit(_encrypt_block, block))
+        while in_flight:
+            drain()
+
+    total = running.settle()
+    seconds = time.perf_counter() - start
+    if on_progress is not None:
+        on_progress(rows, seconds)
+    return {
+        "total": total,
+        "average": total // rows if rows else 0,
+        "rows": rows,
+        "seconds": round(seconds, 3),
+        "rows_per_second": round(rows / seconds, 1) if seconds > 0 else None,
+        "backend": backend,
+    }
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Streaming encrypted aggregation of a balance file")
+    parser.add_argument("path", help="CSV or Parquet file")
+    parser.add_argument("--column", default=None, help="Balance column (default: the first one)")
+    parser.add_argument("--format", choices=("csv", "parquet"), default=None,
+                        help="File format (default: from the file extension)")
+    parser.add_argument("--block-rows", type=int, default=DEFAULT_BLOCK_ROWS,
+                        help="Rows read and handed to a worker at a time")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Encryption processes")
+    parser.add_argument("--max-in-flight", type=int, default=None,
+                        help="Blocks read but not yet reduced (default: 2 per worker); bounds memory")
+    parser.add_argument("--backend", choices=("auto", "concrete", "simulated"), default="auto")
+    parser.add_argument("--progress-interval", type=float, default=1.0, help="Seconds between progress lines")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    def report(rows, seconds):
+        rate = rows / seconds if seconds > 0 else 0.0
+        print(f"📈 {rows:,} rows in {seconds:.1f} s ({rate:,.0f} rows/s)", file=sys.stderr)
+
+    blocks = iter_blocks(args.path, args.column, args.block_rows, args.format)
+    result = stream_aggregate(blocks, args.workers, args.max_in_flight, args.backend, report,
+                              args.progress_interval)
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""
+Binary framing for ciphertexts, keys and results on the wire.
+
+JSON lists of ciphertext words inflate payloads many times over and cost a
+lot of CPU to encode. A frame carries a small JSON header and any number of
+opaque binary values (the library's own `serialize()` output), each
+length-prefixed:
+
+    magic     4 bytes   b"PVF1"
+    codec     1 byte    0 = none, 1 = zstd, 2 = lz4
+    body      rest      (compressed with `codec`)
+
+    body:
+    header_len  u32  | header (UTF-8 JSON)
+    count       u32  | count x (length u32 | value bytes)
+
+All integers are big-endian. zstd (`zstandard`) and lz4 (`lz4`) are
+optional; `available_codecs()` lists what this process can use.
+"""
+
+import json
+import struct
+
+
+CONTENT_TYPE = "application/x-privagator-frame"
+MAGIC = b"PVF1"
+
+_U32 = struct.Struct(">I")
+_CODEC_IDS = {None: 0, "zstd": 1, "lz4": 2}
+_CODEC_NAMES = {v: k for k, v in _CODEC_IDS.items()}
+
+try:
+    import zstandard as _zstd
+except ImportError:
+    _zstd = None
+
+try:
+    import lz4.frame as _lz4
+except ImportError:
+    _lz4 = None
+
+
+class FrameError(ValueError):
+    pass
+
+
+def available_codecs():
+    codecs = []
+    if _zstd is not None:
+        codecs.append("zstd")
+    if _lz4 is not None:
+        codecs.append("lz4")
+    return codecs
+
+
+def pick_codec(accepted):
+    """First codec from the peer's `accepted` list that this process supports."""
+    ours = available_codecs()
+    for codec in accepted or ():
+        if codec in ours:
+            return codec
+    return None
+
+
+def _compress(codec, data):
+    if codec == "zstd":
+        return _zstd.ZstdCompressor(level=3).compress(data)
+    if codec == "lz4":
+        return _lz4.compress(data)
+    return data
+
+
+def _decompress(codec, data):
+    if codec == "zstd":
+        if _zstd is None:
+            raise FrameError("Frame is zstd-compressed but zstandard is not installed")
+        return _zstd.ZstdDecompressor().decompress(data)
+    if codec == "lz4":
+        if _lz4 is None:
+            raise FrameError("Frame is lz4-compressed but lz4 is not installed")
+        return _lz4.decompress(data)
+    return data
+
+
+def encode_frame(header, values=(), codec=None):
+    """`header` is a JSON-able dict, `values` an iterable of bytes."""
+    if codec not in _CODEC_IDS:
+        raise FrameError(f"Unknown codec '{codec}'")
+    head = json.dumps(header).encode("utf-8")
+    values = list(values)
+    parts = [_U32.pack(len(head)), head, _U32.pack(len(values))]
+    for value in values:
+        parts.append(_U32.pack(len(value)))
+        parts.append(value)
+    body = b"".join(parts)
+    return MAGIC + bytes([_CODEC_IDS[codec]]) + _compress(codec, body)
+
+
+def decode_frame(data):
+    """Returns (header dict, list of value bytes)."""
+    if len(data) < 5 or data[:4] != MAGIC:
+        raise FrameError("Not a Privagator frame")
+    codec = _CODEC_NAMES.get(data[4], "unknown")
+    if codec == "unknown":
+        raise FrameError(f"Unknown codec id {data[4]}")
+    body = memoryview(_decompress(codec, bytes(data[5:])))
+    try:
+        (head_len,) = _U32.unpack_from(body, 0)
+        offset = 4 + head_len
+        if offset > len(body):
+            raise FrameError("Truncated frame")
+        try:
+            header = json.loads(bytes(body[4:offset]))
+        except ValueError:
+            raise FrameError("Frame header is not valid JSON")
+        if not isinstance(header, dict):
+            raise FrameError("Frame header must be a JSON object")
+        (count,) = _U32.unpack_from(body, offset)
+        offset += 4
+        values = []
+        for _ in range(count):
+            (size,) = _U32.unpack_from(body, offset)
+            offset += 4
+            if offset + size > len(body):
+                raise FrameError("Truncated frame")
+            values.append(bytes(body[offset:offset + size]))
+            offset += size
+    except struct.error:
+        raise FrameError("Truncated frame")
+    return header, values
+
+
+def accepts_frames(accept_header):
+    """Content negotiation: did the peer ask for frames in its Accept header?"""
+    return CONTENT_TYPE in (accept_header or "")
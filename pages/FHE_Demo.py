@@ -1,6 +1,9 @@
 import streamlit as st
 import numpy as np
-import time
+
+from modules.sim_backend import STAGES, latency_model, profile_is_measured
+from shared_circuits import current_pool, render_pool_stats
+from theme_loader import asset
 
 # Remove the FHE server check and use simulated computations directly
 # --------------------------------
@@ -15,7 +18,7 @@ st.set_page_config(
 # --------------------------------
 # HEADER SECTION
 # --------------------------------
-st.image("https://cdn-icons-png.flaticon.com/512/3064/3064197.png", width=100)
+st.image(asset("logo"), width=100)
 st.title("🔐 Privagator — FHE Demo (Simulated Secure Computation)")
 st.markdown("Experience how encrypted computations feel — safely simulated for this live demo.")
 
@@ -40,10 +43,14 @@ st.divider()
 # --------------------------------
 # SIMULATED FHE FUNCTIONS (No server needed)
 # --------------------------------
-def simulate_fhe_operation(operation, inputs):
+# Latency replayed from the profile once it holds real measurements
+# (PRIVAGATOR_SIM_LATENCY overrides either way)
+LATENCY = latency_model(default="model" if profile_is_measured() else "zero")
+
+def simulate_fhe_operation(operation, inputs, stages=STAGES):
     """Simulate FHE operations without needing a backend server"""
-    time.sleep(1.2)  # Simulate computation time
-    
+    LATENCY.wait(operation, stages=stages)
+
     if operation == "multiply":
         return inputs[0] * inputs[1]
     elif operation == "add":
@@ -110,10 +117,13 @@ elif demo == "Aggregate Balances":
     
     if st.button("Run Secure Aggregation"):
         with st.spinner("Encrypting and computing securely (simulated)..."):
-            for progress in range(0, 101, 20):
-                st.progress(progress)
-                time.sleep(0.3)
-            result = simulate_fhe_operation("aggregate", balances)
+            # one progress step per FHE stage, each as long as the profile says
+            bar = st.progress(0)
+            for i, stage in enumerate(STAGES[:-1]):
+                LATENCY.wait("aggregate", stages=(stage,))
+                bar.progress(int(100 * (i + 1) / len(STAGES)))
+            result = simulate_fhe_operation("aggregate", balances, stages=STAGES[-1:])
+            bar.progress(100)
         st.success(f"🔢 Total: {result['total']} | ⚖️ Average: {result['average']:.2f}")
         st.balloons()
 
@@ -125,7 +135,9 @@ elif demo == "Aggregate Balances":
 
         > This live demo simulates that flow safely without heavy backend load.
         """)
-        st.image("https://cdn-icons-png.flaticon.com/512/11496/11496031.png", width=400)
+        st.image(asset("fhe_flow"), width=400)
+
+render_pool_stats(current_pool())
 
 # --------------------------------
 # FOOTER
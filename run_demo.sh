@@ -6,11 +6,11 @@ echo "🚀 Starting Privagator FHE Demo..."
 source venv310/bin/activate 2>/dev/null || source venv/bin/activate 2>/dev/null
 
 # Ensure dependencies are installed
-pip install -q streamlit flask requests concrete-python
+pip install -q -r requirements.txt concrete-python
 
 # Step 1: Launch FHE server
 echo "🧠 Launching FHE backend server..."
-python fhe_server.py > server.log 2>&1 &
+python fhe_server.py --port 8765 > server.log 2>&1 &
 SERVER_PID=$!
 sleep 3
 
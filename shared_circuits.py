@@ -0,0 +1,39 @@
+import streamlit as st
+
+import fhe_utils
+from modules import fhe_core
+from modules.circuit_pool import CircuitPool
+
+
+@st.cache_resource
+def get_pool():
+    """One CircuitPool per Streamlit process, shared by every session and page."""
+    return CircuitPool([fhe_core.CIRCUITS, fhe_utils.CIRCUITS])
+
+
+def _session_id():
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        ctx = get_script_run_ctx()
+    except Exception:
+        ctx = None
+    return ctx.session_id if ctx is not None else "local"
+
+
+def current_pool():
+    """The shared pool, with the current session counted as active."""
+    pool = get_pool()
+    pool.touch(_session_id())
+    return pool
+
+
+def render_pool_stats(pool=None):
+    """Small sidebar panel: pool hits and concurrent users."""
+    stats = (pool or get_pool()).stats()
+    with st.sidebar.expander("📊 Circuit pool"):
+        col1, col2 = st.columns(2)
+        col1.metric("Active users", stats["active_sessions"])
+        col2.metric("Pool hits", stats["hits"])
+        col1.metric("Compiled", stats["compiled_circuits"])
+        col2.metric("Waited on lock", stats["contended"])
+        st.caption(f"{stats['compiles']} compiles · {stats['in_flight']} running now")
@@ -1,7 +1,10 @@
 import streamlit as st
-import requests
-import time
 import os
+import pandas as pd
+
+from fhe_client import FHEClient, FHEClientError, FHETimeout
+from modules.health_probe import HealthProbe
+from theme_loader import asset
 
 # =========================================
 # 🔧 PAGE CONFIG
@@ -16,44 +19,77 @@ st.set_page_config(
 # 🌐 BACKEND CONNECTION
 # =========================================
 FHE_SERVER_URL = "https://privagator.onrender.com"  # Your Render backend URL
-COMPUTE_URL = f"{FHE_SERVER_URL}/compute"
-HEALTH_URL = f"{FHE_SERVER_URL}/health"
 
-def check_backend():
-    """Check if the FHE backend server is reachable."""
-    try:
-        res = requests.get(HEALTH_URL, timeout=10)
-        return res.status_code == 200
-    except Exception:
-        return False
+@st.cache_resource
+def get_client():
+    """Pooled keep-alive client: one TCP/TLS handshake instead of one per call."""
+    return FHEClient(FHE_SERVER_URL, timeout=15)
+
+@st.cache_resource
+def get_health_probe():
+    """Health checked every 15 s in a background thread; reruns only read the last result."""
+    # resolve the cached client here, on the script thread: the probe thread has no Streamlit context
+    client = get_client()
+    return HealthProbe(lambda: client.health(timeout=10), interval=15, ttl=45)
+
+@st.cache_data(ttl=300, show_spinner=False)
+def histogram_edge_sets():
+    """Bucket edge sets the server accepts, as it publishes them on /config (errors aren't cached)."""
+    return [tuple(edges) for edges in get_client().config(timeout=10)["histogram_edge_sets"]]
+
+def backend_status():
+    """
+    The probe's state dict: "ok" is True/False from the last probe, None while
+    unknown (first probe still running, or stale); also "error", "latency", "age".
+    """
+    probe = get_health_probe()
+    # only the very first render of the process waits, and briefly
+    probe.wait(timeout=2)
+    return probe.state()
 
 # =========================================
 # 🧠 APP HEADER
 # =========================================
-st.image("https://cdn-icons-png.flaticon.com/512/3064/3064197.png", width=90)
+st.image(asset("logo"), width=90)
 st.title("🔐 Privagator — FHE Demo")
 st.markdown("Interact with the encrypted computation engine below 👇")
 
-if check_backend():
+status = backend_status()
+if status["ok"]:
     st.success("✅ Connected to FHE backend on Render!")
+elif status["ok"] is None:
+    st.warning("⏳ Still checking the FHE backend — it may be waking up. Requests will wait for it.")
 else:
     st.error("❌ FHE backend not reachable. Please ensure it's running.")
+    if st.button("🔄 Check again"):
+        get_health_probe().refresh(timeout=2)
+        st.rerun()
     st.stop()
 
 # =========================================
 # ⚙️ SERVER COMMUNICATION
 # =========================================
-def call_server(op, inputs):
+STAGE_LABELS = {"encrypt": "Encrypting 🔐", "evaluate": "Computing on ciphertexts ⚙️", "decrypt": "Decrypting 🔓"}
+
+def call_server(op, inputs, **options):
+    """Submit `op` as a server job and follow its real stage progress until it finishes."""
+    bar = st.progress(0, text="Queued ⏳")
+
+    def show(status):
+        bar.progress(status["percent"], text=STAGE_LABELS.get(status["stage"], "Queued ⏳"))
+
     try:
-        r = requests.post(COMPUTE_URL, json={"op": op, "inputs": inputs}, timeout=15)
-        if r.status_code == 200 and r.json().get("ok"):
-            return r.json()["result"]
-        else:
-            st.error(r.json().get("error", "Server returned an error"))
-    except requests.exceptions.Timeout:
+        client = get_client()
+        job_id = client.submit_job(op, inputs, **options)
+        return client.wait_job(job_id, poll_interval=0.3, timeout=600, on_progress=show)
+    except FHETimeout:
         st.error("⏱️ Connection to backend timed out. Please retry.")
+    except FHEClientError as e:
+        st.error(str(e) or "Server returned an error")
     except Exception as e:
         st.error(f"Connection failed: {e}")
+    finally:
+        bar.empty()
     return None
 
 # =========================================
@@ -135,9 +171,6 @@ elif demo == "Aggregate Balances":
     
     if st.button("Run Secure Aggregation"):
         with st.spinner("Encrypting and computing securely..."):
-            for progress in range(0, 101, 20):
-                st.progress(progress)
-                time.sleep(0.4)
             result = call_server("aggregate", balances)
         if result is not None:
             total = result["total"]
@@ -145,6 +178,21 @@ elif demo == "Aggregate Balances":
             st.success(f"🔢 Total: {total} | ⚖️ Average: {avg}")
             st.balloons()
 
+    # the server only compiles histograms for its own configured sets of edges
+    try:
+        edge_sets = histogram_edge_sets()
+    except FHEClientError as e:
+        edge_sets = []
+        st.warning(f"Bucket options unavailable until the backend answers: {e}")
+    edges = st.selectbox("Distribution buckets", edge_sets,
+                         format_func=lambda e: ", ".join(str(v) for v in e))
+    if edges is not None and st.button("Show Encrypted Distribution"):
+        with st.spinner("Bucketing encrypted balances..."):
+            result = call_server("histogram", balances, edges=list(edges))
+        if result is not None:
+            labels = [f"{lo}–{hi}" for lo, hi in zip(result["edges"], result["edges"][1:])]
+            st.bar_chart(pd.DataFrame({"Wallets": result["counts"]}, index=labels))
+
     with st.expander("🧩 See how FHE protects your data"):
         st.markdown("""
         **Step 1:** Each wallet balance is encrypted — unreadable even to the server.  
@@ -153,7 +201,7 @@ elif demo == "Aggregate Balances":
 
         > The math happens *without ever seeing your actual numbers*.
         """)
-        st.image("https://cdn-icons-png.flaticon.com/512/11496/11496031.png", width=400)
+        st.image(asset("fhe_flow"), width=400)
 
 # =========================================
 # 🧾 FOOTER
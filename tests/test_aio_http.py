@@ -0,0 +1,53 @@
+"""
+Request parsing of the asyncio HTTP server.
+
+    python -m unittest discover tests
+"""
+
+import asyncio
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.aio_http import HTTPError, read_request  # noqa: E402
+
+
+def _read(raw, max_body=1024):
+    async def go():
+        reader = asyncio.StreamReader()
+        reader.feed_data(raw)
+        reader.feed_eof()
+        return await read_request(reader, max_body)
+    return asyncio.run(go())
+
+
+def _post(length, body=b""):
+    return b"POST /compute HTTP/1.1\r\nContent-Length: " + length + b"\r\n\r\n" + body
+
+
+class ReadRequestTest(unittest.TestCase):
+    def test_reads_body(self):
+        request = _read(_post(b"2", b"{}"))
+        self.assertEqual((request.method, request.body), ("POST", b"{}"))
+
+    def test_bad_content_length_is_400(self):
+        for length in (b"abc", b"-1", b"+2", b"1.5"):
+            with self.subTest(length=length), self.assertRaises(HTTPError) as raised:
+                _read(_post(length, b"{}"))
+            self.assertEqual(raised.exception.status, 400)
+
+    def test_oversized_body_is_413(self):
+        with self.assertRaises(HTTPError) as raised:
+            _read(_post(b"4096"), max_body=1024)
+        self.assertEqual(raised.exception.status, 413)
+
+    def test_truncated_body_is_400(self):
+        with self.assertRaises(HTTPError) as raised:
+            _read(_post(b"10", b"{}"))
+        self.assertEqual(raised.exception.status, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
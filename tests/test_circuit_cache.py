@@ -0,0 +1,104 @@
+"""
+CircuitCache round trips against a stub of concrete's Server, whose `save`
+archives with shutil.make_archive like the real one (it always appends ".zip").
+
+    python -m unittest discover tests
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import types
+import unittest
+import zipfile
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.circuit_cache import CachedCircuit, CircuitCache  # noqa: E402
+
+
+class StubServer:
+    def __init__(self, payload):
+        self.payload = payload
+        self.client_specs = {"payload": payload}
+
+    def save(self, path):
+        # concrete-python: strip a trailing ".zip", then make_archive adds one back
+        if path.endswith(".zip"):
+            path = path[:-len(".zip")]
+        with tempfile.TemporaryDirectory() as staging:
+            with open(os.path.join(staging, "server.txt"), "w") as f:
+                f.write(self.payload)
+            shutil.make_archive(path, "zip", staging)
+
+    @classmethod
+    def load(cls, path):
+        with zipfile.ZipFile(path) as archive:
+            return cls(archive.read("server.txt").decode())
+
+
+class StubClient:
+    def __init__(self, specs):
+        self.specs = specs
+
+
+class StubCircuit:
+    def __init__(self, payload):
+        self.server = StubServer(payload)
+        self.client = StubClient(self.server.client_specs)
+
+
+def _stub_concrete():
+    fhe = types.SimpleNamespace(Server=StubServer, Client=StubClient)
+    concrete = types.ModuleType("concrete")
+    concrete.fhe = fhe
+    return mock.patch.dict(sys.modules, {"concrete": concrete, "concrete.fhe": fhe})
+
+
+class CircuitCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.cache = CircuitCache(self.directory, max_bytes=64 * 1024 * 1024)
+        patcher = _stub_concrete()
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_store_then_load(self):
+        self.cache.store("add", "k1", StubCircuit("add-server"))
+        self.assertEqual(sorted(os.listdir(self.directory)), ["k1.json", "k1.zip"])
+        loaded = self.cache.load("add", "k1")
+        self.assertIsInstance(loaded, CachedCircuit)
+        self.assertTrue(loaded.from_cache)
+        self.assertEqual(loaded.server.payload, "add-server")
+
+    def test_get_or_build_compiles_once(self):
+        builds = []
+
+        def build():
+            builds.append(1)
+            return StubCircuit("square-server")
+
+        first = self.cache.get_or_build("square", "k2", build)
+        second = self.cache.get_or_build("square", "k2", build)
+        self.assertEqual(len(builds), 1)
+        self.assertFalse(first.from_cache)
+        self.assertTrue(second.from_cache)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_prune_keeps_entries_being_written(self):
+        partial = os.path.join(self.directory, "k3.1234.tmp.zip")
+        with open(partial, "wb") as f:
+            f.write(b"partial")
+        orphan = os.path.join(self.directory, "k4.zip")
+        with open(orphan, "wb") as f:
+            f.write(b"orphan")
+        self.cache.prune_stale()
+        self.assertTrue(os.path.exists(partial))
+        self.assertFalse(os.path.exists(orphan))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+"""
+Coalescer batching and its one-by-one fallback, with fake batch/single runners.
+
+    python -m unittest discover tests
+"""
+
+import asyncio
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.aio_http import HTTPError  # noqa: E402
+from modules.coalescer import Coalescer  # noqa: E402
+
+
+class FakeRunner:
+    """Adds up each row; rows containing a negative value are invalid input."""
+
+    def __init__(self, batch_error=None):
+        self.batch_error = batch_error
+        self.batches = []
+        self.singles = []
+
+    async def run_batch(self, op, rows):
+        self.batches.append(rows)
+        if self.batch_error is not None:
+            raise self.batch_error
+        if any(v < 0 for row in rows for v in row):
+            raise ValueError("inputs must be non-negative")
+        return [sum(row) for row in rows], 0.01
+
+    async def run_single(self, op, inputs):
+        self.singles.append(inputs)
+        if any(v < 0 for v in inputs):
+            raise ValueError("inputs must be non-negative")
+        return sum(inputs), 0.001
+
+
+def _submit_all(coalescer, rows):
+    async def go():
+        return await asyncio.gather(*(coalescer.submit("add", "add", row) for row in rows),
+                                    return_exceptions=True)
+    return asyncio.run(go())
+
+
+class CoalescerTest(unittest.TestCase):
+    def coalescer(self, runner, max_batch=64):
+        return Coalescer(runner.run_batch, window=0.01, max_batch=max_batch, run_single=runner.run_single)
+
+    def test_concurrent_requests_share_one_batch(self):
+        runner = FakeRunner()
+        results = _submit_all(self.coalescer(runner), [[1, 2], [3, 4], [5, 6]])
+        self.assertEqual(results, [(3, 0.01, 3), (7, 0.01, 3), (11, 0.01, 3)])
+        self.assertEqual(len(runner.batches), 1)
+        self.assertEqual(runner.singles, [])
+
+    def test_max_batch_flushes_early(self):
+        runner = FakeRunner()
+        _submit_all(self.coalescer(runner, max_batch=2), [[1, 1], [2, 2], [3, 3], [4, 4]])
+        self.assertEqual([len(rows) for rows in runner.batches], [2, 2])
+
+    def test_lone_request_runs_single(self):
+        runner = FakeRunner()
+        self.assertEqual(_submit_all(self.coalescer(runner), [[1, 2]]), [(3, 0.001, 1)])
+        self.assertEqual(runner.batches, [])
+
+    def test_bad_input_falls_back_to_singles(self):
+        runner = FakeRunner()
+        results = _submit_all(self.coalescer(runner), [[1, 2], [-1, 2], [3, 4]])
+        self.assertEqual(results[0], (3, 0.001, 1))
+        self.assertIsInstance(results[1], ValueError)
+        self.assertEqual(results[2], (7, 0.001, 1))
+        self.assertEqual(len(runner.singles), 3)
+
+    def test_http_400_falls_back_to_singles(self):
+        runner = FakeRunner(batch_error=HTTPError(400, "bad input"))
+        results = _submit_all(self.coalescer(runner), [[1, 2], [3, 4]])
+        self.assertEqual(results, [(3, 0.001, 1), (7, 0.001, 1)])
+
+    def test_busy_timeout_and_internal_errors_are_not_retried(self):
+        for error in (HTTPError(503, "Server busy"), HTTPError(504, "timeout"), RuntimeError("boom")):
+            with self.subTest(error=error):
+                runner = FakeRunner(batch_error=error)
+                results = _submit_all(self.coalescer(runner), [[1, 2], [3, 4], [5, 6]])
+                self.assertEqual(results, [error] * 3)
+                self.assertEqual(len(runner.batches), 1)
+                self.assertEqual(runner.singles, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
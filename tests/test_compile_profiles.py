@@ -0,0 +1,64 @@
+"""
+Bounds-based inputsets and compile profile selection.
+
+    python -m unittest discover tests
+"""
+
+import os
+import sys
+import unittest
+from unittest import mock
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.compile_profiles import DEFAULT_PROFILE, PROFILES, bounds_inputset, get_profile  # noqa: E402
+
+
+class BoundsInputsetTest(unittest.TestCase):
+    def test_scalar_corners(self):
+        self.assertEqual(sorted(bounds_inputset([(0, 15), (0, 15)])), [(0, 0), (0, 15), (15, 0), (15, 15)])
+
+    def test_zero_is_added_inside_the_range(self):
+        self.assertEqual(sorted(bounds_inputset([(-4, 4)])), [(-4,), (0,), (4,)])
+
+    def test_samples_stay_within_bounds_and_are_seeded(self):
+        first = bounds_inputset([(0, 7), (3, 9)], samples=50, seed=1)
+        self.assertEqual(len(first), 4 + 50)
+        self.assertTrue(all(0 <= a <= 7 and 3 <= b <= 9 for a, b in first))
+        self.assertEqual(first, bounds_inputset([(0, 7), (3, 9)], samples=50, seed=1))
+
+    def test_tensor_shapes(self):
+        inputset = bounds_inputset([(0, 1000)], shape=(8,), samples=3)
+        self.assertEqual(len(inputset), 2 + 3)
+        for (arr,) in inputset:
+            self.assertEqual(arr.shape, (8,))
+            self.assertTrue(np.all((arr >= 0) & (arr <= 1000)))
+        self.assertTrue(np.all(inputset[1][0] == 1000))
+
+
+class ProfileTest(unittest.TestCase):
+    def test_default_and_env_selection(self):
+        with mock.patch.dict(os.environ, {"PRIVAGATOR_COMPILE_PROFILE": ""}):
+            self.assertEqual(get_profile().name, DEFAULT_PROFILE)
+        with mock.patch.dict(os.environ, {"PRIVAGATOR_COMPILE_PROFILE": "low-latency"}):
+            self.assertEqual(get_profile().name, "low-latency")
+        self.assertEqual(get_profile("high-accuracy").name, "high-accuracy")
+
+    def test_unknown_profile(self):
+        with self.assertRaises(ValueError):
+            get_profile("fastest")
+
+    def test_wider_profiles_sample_more(self):
+        samples = [PROFILES[name].samples for name in ("low-latency", "balanced", "high-accuracy")]
+        self.assertEqual(samples, sorted(samples))
+        self.assertEqual(len(PROFILES["low-latency"].inputset([(0, 15), (0, 15)])), 4)
+
+    def test_configuration_needs_concrete(self):
+        with mock.patch("modules.compile_profiles.load_concrete", return_value=None):
+            self.assertIsNone(PROFILES["balanced"].configuration())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+"""
+Retry behaviour of FHEClient and AsyncFHEClient against a stub server that
+answers every request with one fixed status.
+
+    python -m unittest discover tests
+"""
+
+import asyncio
+import json
+import os
+import sys
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fhe_client import AsyncFHEClient, FHEClient, FHEClientError  # noqa: E402
+
+
+class StubServer:
+    def __init__(self, status, headers=None):
+        self.status = status
+        self.headers = headers or {}
+        self.hits = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _reply(self):
+                self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                stub.hits += 1
+                body = json.dumps({"ok": False, "error": f"status {stub.status}"}).encode()
+                self.send_response(stub.status)
+                for name, value in stub.headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            do_GET = do_POST = _reply
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class ClientRetryTest(unittest.TestCase):
+    def serve(self, status, headers=None):
+        server = StubServer(status, headers)
+        self.addCleanup(server.close)
+        return server
+
+    def sync_compute(self, server):
+        client = FHEClient(server.url, retries=2, backoff=0)
+        with self.assertRaises(FHEClientError) as raised:
+            client.compute_with_metrics("add", [1, 2])
+        return raised.exception.status
+
+    def async_compute(self, server):
+        async def go():
+            client = AsyncFHEClient(server.url, retries=2, backoff=0)
+            try:
+                await client.compute_with_metrics("add", [1, 2])
+            finally:
+                await client.pool.close()
+        with self.assertRaises(FHEClientError) as raised:
+            asyncio.run(go())
+        return raised.exception.status
+
+    def test_post_504_is_not_retried(self):
+        for compute in (self.sync_compute, self.async_compute):
+            with self.subTest(compute=compute.__name__):
+                server = self.serve(504)
+                self.assertEqual(compute(server), 504)
+                self.assertEqual(server.hits, 1)
+
+    def test_post_502_is_not_retried(self):
+        for compute in (self.sync_compute, self.async_compute):
+            with self.subTest(compute=compute.__name__):
+                server = self.serve(502)
+                self.assertEqual(compute(server), 502)
+                self.assertEqual(server.hits, 1)
+
+    def test_post_503_is_retried(self):
+        for compute in (self.sync_compute, self.async_compute):
+            with self.subTest(compute=compute.__name__):
+                server = self.serve(503, {"Retry-After": "0"})
+                self.assertEqual(compute(server), 503)
+                self.assertEqual(server.hits, 3)
+
+    def test_get_502_is_retried(self):
+        server = self.serve(502)
+        client = FHEClient(server.url, retries=2, backoff=0)
+        self.assertEqual(client.session.get(f"{server.url}/health").status_code, 502)
+        self.assertEqual(server.hits, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+"""
+JobStore lifecycle, progress, eviction and change notification.
+
+    python -m unittest discover tests
+"""
+
+import asyncio
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.jobs import DONE, FAILED, QUEUED, RUNNING, JobStore, JobStoreFull  # noqa: E402
+
+
+def _run(coro_fn):
+    # Job creates an asyncio.Event, so everything runs inside one loop
+    return asyncio.run(coro_fn())
+
+
+class JobStoreTest(unittest.TestCase):
+    def test_lifecycle_and_percent(self):
+        async def go():
+            store = JobStore()
+            job = store.create("compute", "aggregate")
+            self.assertEqual((job.state, job.percent()), (QUEUED, 0))
+            store.progress(job.id, "encrypt", 2, 2)
+            store.progress(job.id, "evaluate", 1, 2)
+            self.assertEqual(job.state, RUNNING)
+            self.assertEqual(job.percent(), 50)
+            store.finish(job.id, {"total": 3})
+            status = store.get(job.id).to_dict()
+            self.assertEqual((status["state"], status["percent"], status["result"]), (DONE, 100, {"total": 3}))
+            # progress after the end is ignored
+            store.progress(job.id, "decrypt", 1, 1)
+            self.assertEqual(job.state, DONE)
+        _run(go)
+
+    def test_failure_keeps_the_error(self):
+        async def go():
+            store = JobStore()
+            job = store.create("compute", "add")
+            store.fail(job.id, "boom")
+            status = store.get(job.id).to_dict()
+            self.assertEqual((status["state"], status["error"]), (FAILED, "boom"))
+            self.assertNotIn("result", status)
+        _run(go)
+
+    def test_finished_jobs_expire_after_ttl(self):
+        async def go():
+            store = JobStore(ttl=10)
+            with mock.patch("modules.jobs.time.time", return_value=1000.0):
+                job = store.create("compute", "add")
+                store.finish(job.id, 3)
+            with mock.patch("modules.jobs.time.time", return_value=1005.0):
+                self.assertIsNotNone(store.get(job.id))
+            with mock.patch("modules.jobs.time.time", return_value=1011.0):
+                self.assertIsNone(store.get(job.id))
+        _run(go)
+
+    def test_full_store_evicts_finished_first_then_refuses(self):
+        async def go():
+            store = JobStore(max_jobs=2)
+            first = store.create("compute", "add")
+            running = store.create("compute", "add")
+            store.finish(first.id, 3)
+            third = store.create("compute", "add")
+            self.assertIsNone(store.get(first.id))
+            self.assertIsNotNone(store.get(running.id))
+            self.assertIsNotNone(store.get(third.id))
+            with self.assertRaises(JobStoreFull):
+                store.create("compute", "add")
+        _run(go)
+
+    def test_wait_wakes_on_change(self):
+        async def go():
+            store = JobStore()
+            job = store.create("compute", "add")
+            seq = job.seq
+            waiter = asyncio.create_task(job.wait(seq, timeout=5))
+            await asyncio.sleep(0)
+            store.progress(job.id, "encrypt", 1, 1)
+            await asyncio.wait_for(waiter, 1)
+            self.assertGreater(job.seq, seq)
+            # no change: wait returns after the timeout
+            await job.wait(job.seq, timeout=0.01)
+        _run(go)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+"""
+Session key store budgets: the server-side KeyStore and the pool workers'
+WorkerKeyCache.
+
+    python -m unittest discover tests
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.key_store import (  # noqa: E402
+    KeyStore, KeyStoreFull, SessionNotFound, WorkerKeyCache, valid_session_id)
+
+
+class KeyStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.spill_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.spill_dir)
+
+    def test_create_then_get(self):
+        store = KeyStore(max_bytes=100)
+        session_id = store.create(b"k" * 10, {"client": "test"})
+        self.assertTrue(valid_session_id(session_id))
+        self.assertEqual(store.get(session_id), b"k" * 10)
+        self.assertEqual(store.describe(session_id)["client"], "test")
+
+    def test_over_budget_spills_least_recently_used_and_reloads(self):
+        store = KeyStore(max_bytes=100, spill_dir=self.spill_dir)
+        a = store.create(b"a" * 60)
+        b = store.create(b"b" * 30)
+        store.get(a)  # b is now the least recently used
+        c = store.create(b"c" * 30)
+        self.assertEqual(store.describe(b)["tier"], "disk")
+        self.assertTrue(os.path.exists(os.path.join(self.spill_dir, f"{b}.evk")))
+        self.assertEqual(store.get(b), b"b" * 30)
+        self.assertEqual(store.describe(b)["tier"], "memory")
+        self.assertFalse(os.path.exists(os.path.join(self.spill_dir, f"{b}.evk")))
+        self.assertLessEqual(store.stats()["memory_bytes"], 100)
+        for session_id in (a, c):
+            store.touch(session_id)
+
+    def test_over_budget_drops_without_spill_dir(self):
+        store = KeyStore(max_bytes=100)
+        a = store.create(b"a" * 60)
+        store.create(b"b" * 60)
+        with self.assertRaises(SessionNotFound):
+            store.get(a)
+
+    def test_keys_over_the_per_session_limit_are_refused(self):
+        store = KeyStore(max_bytes=100, max_key_bytes=50)
+        with self.assertRaises(KeyStoreFull):
+            store.create(b"k" * 51)
+
+    def test_unused_sessions_expire(self):
+        store = KeyStore(max_bytes=100, ttl=60, spill_dir=self.spill_dir)
+        with mock.patch("modules.key_store.time.time", return_value=1000.0):
+            spilled = store.create(b"s" * 80)
+            kept = store.create(b"k" * 80)
+        with mock.patch("modules.key_store.time.time", return_value=1030.0):
+            store.touch(kept)
+        with mock.patch("modules.key_store.time.time", return_value=1070.0):
+            with self.assertRaises(SessionNotFound):
+                store.touch(spilled)
+            self.assertEqual(store.get(kept), b"k" * 80)
+        self.assertEqual(os.listdir(self.spill_dir), [])
+
+    def test_close_forgets_the_session(self):
+        store = KeyStore(max_bytes=100, spill_dir=self.spill_dir)
+        session_id = store.create(b"k" * 10)
+        store.close(session_id)
+        with self.assertRaises(SessionNotFound):
+            store.touch(session_id)
+        with self.assertRaises(SessionNotFound):
+            store.close(session_id)
+
+    def test_session_ids_are_validated(self):
+        self.assertFalse(valid_session_id("../etc/passwd"))
+        self.assertFalse(valid_session_id(None))
+
+
+class WorkerKeyCacheTest(unittest.TestCase):
+    def test_bounded_by_bytes_not_count(self):
+        cache = WorkerKeyCache(max_bytes=100)
+        cache.put("a", "keys-a", 40)
+        cache.put("b", "keys-b", 40)
+        cache.put("c", "keys-c", 40)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual((cache.get("b"), cache.get("c")), ("keys-b", "keys-c"))
+        self.assertEqual(cache.stats()["bytes"], 80)
+
+    def test_evicts_least_recently_used(self):
+        cache = WorkerKeyCache(max_bytes=100)
+        cache.put("a", "keys-a", 50)
+        cache.put("b", "keys-b", 50)
+        cache.get("a")
+        cache.put("c", "keys-c", 50)
+        self.assertEqual(cache.get("a"), "keys-a")
+        self.assertIsNone(cache.get("b"))
+
+    def test_oversized_keys_are_not_kept(self):
+        cache = WorkerKeyCache(max_bytes=100)
+        cache.put("a", "keys-a", 60)
+        cache.put("big", "keys-big", 101)
+        self.assertIsNone(cache.get("big"))
+        self.assertEqual(cache.get("a"), "keys-a")
+
+    def test_replacing_a_session_recounts_its_size(self):
+        cache = WorkerKeyCache(max_bytes=100)
+        cache.put("a", "old", 60)
+        cache.put("a", "new", 30)
+        self.assertEqual(cache.get("a"), "new")
+        self.assertEqual(cache.stats(), {"sessions": 1, "bytes": 30, "max_bytes": 100})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+"""
+Metrics registry: observations, Prometheus rendering, and the capture/replay
+path that carries pool workers' metrics to the server process.
+
+    python -m unittest discover tests
+"""
+
+import os
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules import metrics  # noqa: E402
+
+
+def _registry():
+    registry = metrics.MetricsRegistry()
+    counter = registry.counter("test_requests_total", "Requests", ("op",))
+    gauge = registry.gauge("test_bytes", "Bytes held", ("tier",))
+    histogram = registry.histogram("test_seconds", "Latency", ("op",), buckets=(0.1, 1.0))
+    return registry, counter, gauge, histogram
+
+
+def _series(registry, name):
+    return {tuple(sorted(s["labels"].items())): s for s in registry.snapshot()[name]["series"]}
+
+
+class MetricsTest(unittest.TestCase):
+    def test_counter_gauge_histogram(self):
+        registry, counter, gauge, histogram = _registry()
+        counter.inc(op="add")
+        counter.inc(2, op="add")
+        gauge.set(10, tier="memory")
+        gauge.set(4, tier="memory")
+        histogram.observe(0.05, op="add")
+        histogram.observe(0.5, op="add")
+        histogram.observe(5.0, op="add")
+        self.assertEqual(_series(registry, "test_requests_total")[(("op", "add"),)]["value"], 3)
+        self.assertEqual(_series(registry, "test_bytes")[(("tier", "memory"),)]["value"], 4)
+        latency = _series(registry, "test_seconds")[(("op", "add"),)]
+        self.assertEqual(latency["count"], 3)
+        self.assertEqual(latency["buckets"], {"0.1": 1, "1.0": 1, "+Inf": 1})
+
+    def test_labels_must_match(self):
+        _, counter, _, _ = _registry()
+        with self.assertRaises(ValueError):
+            counter.inc(kind="add")
+
+    def test_render_is_cumulative_prometheus_text(self):
+        registry, counter, _, histogram = _registry()
+        counter.inc(op='say "hi"')
+        histogram.observe(0.05, op="add")
+        histogram.observe(0.5, op="add")
+        text = registry.render()
+        self.assertIn('test_requests_total{op="say \\"hi\\""} 1', text)
+        self.assertIn('test_seconds_bucket{op="add",le="0.1"} 1', text)
+        self.assertIn('test_seconds_bucket{op="add",le="1.0"} 2', text)
+        self.assertIn('test_seconds_bucket{op="add",le="+Inf"} 2', text)
+        self.assertIn('test_seconds_count{op="add"} 2', text)
+
+    def test_capture_then_replay_reproduces_observations(self):
+        worker, w_counter, w_gauge, w_histogram = _registry()
+        with metrics.capture() as events:
+            w_counter.inc(op="add")
+            w_gauge.set(7, tier="disk")
+            w_histogram.observe(0.5, op="add")
+        # outside the block nothing more is captured
+        w_counter.inc(op="add")
+        self.assertEqual(len(events), 3)
+
+        parent, *_ = _registry()
+        parent.replay(events)
+        parent.replay(events)
+        self.assertEqual(_series(parent, "test_requests_total")[(("op", "add"),)]["value"], 2)
+        self.assertEqual(_series(parent, "test_bytes")[(("tier", "disk"),)]["value"], 7)
+        self.assertEqual(_series(parent, "test_seconds")[(("op", "add"),)]["count"], 2)
+
+    def test_replay_ignores_unknown_metrics(self):
+        parent, *_ = _registry()
+        parent.replay([("not_registered", {"op": "add"}, 1)])
+        parent.replay(None)
+        self.assertEqual(parent.snapshot()["test_requests_total"]["series"], [])
+
+    def test_nested_capture_reaches_the_outer_list(self):
+        _, counter, _, _ = _registry()
+        with metrics.capture() as outer:
+            counter.inc(op="a")
+            with metrics.capture() as inner:
+                counter.inc(op="b")
+        self.assertEqual([labels["op"] for _, labels, _ in inner], ["b"])
+        self.assertEqual([labels["op"] for _, labels, _ in outer], ["a", "b"])
+
+    def test_capture_is_per_thread(self):
+        _, counter, _, _ = _registry()
+        with metrics.capture() as events:
+            thread = threading.Thread(target=counter.inc, kwargs={"op": "other"})
+            thread.start()
+            thread.join()
+        self.assertEqual(events, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+"""
+PVF1 frame round trips and rejection of malformed frames.
+
+    python -m unittest discover tests
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules import wire  # noqa: E402
+
+
+class FrameTest(unittest.TestCase):
+    def test_round_trip(self):
+        values = [b"", b"\x00\x01\x02", os.urandom(4096)]
+        frame = wire.encode_frame({"op": "add", "session": "s"}, values)
+        self.assertEqual(frame[:4], wire.MAGIC)
+        self.assertEqual(wire.decode_frame(frame), ({"op": "add", "session": "s"}, values))
+
+    def test_round_trip_without_values(self):
+        self.assertEqual(wire.decode_frame(wire.encode_frame({"ok": True})), ({"ok": True}, []))
+
+    def test_round_trip_with_each_available_codec(self):
+        for codec in wire.available_codecs():
+            with self.subTest(codec=codec):
+                values = [b"ciphertext" * 500]
+                frame = wire.encode_frame({"op": "add"}, values, codec)
+                self.assertLess(len(frame), len(values[0]))
+                self.assertEqual(wire.decode_frame(frame), ({"op": "add"}, values))
+
+    def test_rejects_other_payloads(self):
+        for data in (b"", b"PVF", b"{\"op\": \"add\"}", b"XXXX\x00rest"):
+            with self.subTest(data=data), self.assertRaises(wire.FrameError):
+                wire.decode_frame(data)
+
+    def test_rejects_unknown_codecs(self):
+        with self.assertRaises(wire.FrameError):
+            wire.encode_frame({}, [], codec="brotli")
+        with self.assertRaises(wire.FrameError):
+            wire.decode_frame(wire.MAGIC + b"\x07" + b"\x00" * 8)
+
+    def test_rejects_truncated_frames(self):
+        frame = wire.encode_frame({"op": "add"}, [b"x" * 100])
+        # inside the lengths, inside the header, inside the value
+        for cut in (8, 15, len(frame) - 50):
+            with self.subTest(cut=cut), self.assertRaises(wire.FrameError):
+                wire.decode_frame(frame[:cut])
+
+    def test_rejects_bad_headers(self):
+        for head in (b"{not json", b"[1, 2]", b"\xff\xfe"):
+            body = len(head).to_bytes(4, "big") + head + (0).to_bytes(4, "big")
+            with self.subTest(head=head), self.assertRaises(wire.FrameError):
+                wire.decode_frame(wire.MAGIC + b"\x00" + body)
+
+    def test_frame_errors_are_value_errors(self):
+        # an input error like any other, for callers that catch ValueError
+        self.assertTrue(issubclass(wire.FrameError, ValueError))
+
+    def test_codec_negotiation(self):
+        self.assertIsNone(wire.pick_codec(None))
+        self.assertIsNone(wire.pick_codec(["brotli"]))
+        for codec in wire.available_codecs():
+            self.assertEqual(wire.pick_codec(["brotli", codec]), codec)
+        self.assertTrue(wire.accepts_frames(f"{wire.CONTENT_TYPE}, application/json"))
+        self.assertFalse(wire.accepts_frames(None))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,11 +1,47 @@
+import os
+import threading
+
 import streamlit as st
 
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ASSET_DIR = os.path.join(BASE_DIR, "assets")
+
+# Streamlit re-executes pages on every interaction but keeps imported modules,
+# so these caches live for the whole process.
+_css = {}  # path -> (mtime_ns, css)
+_assets = {}  # name -> svg markup
+_lock = threading.Lock()
+
+
+def load_css(path=os.path.join(BASE_DIR, "styles.css")):
+    """Stylesheet contents, read from disk again only after the file changes."""
+    mtime = os.stat(path).st_mtime_ns
+    cached = _css.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    with open(path) as f:
+        css = f.read()
+    with _lock:
+        _css[path] = (mtime, css)
+    return css
+
+
+def asset(name):
+    """SVG markup of the bundled image `assets/<name>.svg`, kept in memory after the first read."""
+    svg = _assets.get(name)
+    if svg is None:
+        with open(os.path.join(ASSET_DIR, f"{name}.svg")) as f:
+            svg = f.read()
+        with _lock:
+            _assets[name] = svg
+    return svg
+
+
 def load_theme():
     """Loads the global CSS and branding for Privagator"""
-    with open("styles.css") as f:
-        st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
+    st.markdown(f"<style>{load_css()}</style>", unsafe_allow_html=True)
 
-    st.sidebar.image("https://cdn-icons-png.flaticon.com/512/2910/2910791.png", width=60)
+    st.sidebar.image(asset("brand"), width=60)
     st.sidebar.markdown("<h2 style='color:#e5e5e5;'>Privagator</h2>", unsafe_allow_html=True)
     st.sidebar.markdown(
         "<p style='font-size:13px;color:#999;'>Fully Homomorphic Encryption Playground</p>",